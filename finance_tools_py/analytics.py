@@ -0,0 +1,249 @@
+"""回测结果的绩效统计。
+
+所有计算都基于 :py:mod:`numpy` 的向量运算和累积运算，没有按日期或按成交的 Python 循环。
+资产曲线相关的函数既可以传入单条资产曲线（ :py:class:`pandas.Series` ），
+也可以传入以列区分的多条资产曲线（ :py:class:`pandas.DataFrame` ），后者会一次计算所有列，
+便于对参数扫描的大量结果打分。
+
+Example:
+    >>> from finance_tools_py import analytics
+    >>> bt.calc_trade_history()
+    >>> print(analytics.summary(bt))
+    annualized_return         0.0312
+    annualized_volatility     0.1045
+    sharpe_ratio              0.3497
+    ...
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _as_2d(equity):
+    """转换为（日期 x 曲线）的二维数组。"""
+    values = np.asarray(equity, dtype=np.float64)
+    return values.reshape(len(values), -1)
+
+
+def _wrap(equity, values, name=None):
+    """按输入类型包装计算结果。 :py:class:`pandas.DataFrame` 返回 :py:class:`pandas.Series` ，否则返回数值。"""
+    if isinstance(equity, pd.DataFrame):
+        return pd.Series(values, index=equity.columns, name=name)
+    return values[0]
+
+
+def returns(equity):
+    """每期收益率。
+
+    Args:
+        equity (:py:class:`pandas.Series` or :py:class:`pandas.DataFrame`): 资产曲线。
+
+    Returns:
+        :py:class:`numpy.ndarray`: （期数-1 x 曲线数）的收益率。
+    """
+    values = _as_2d(equity)
+    return values[1:] / values[:-1] - 1
+
+
+def annualized_return(equity, periods=252):
+    """年化收益率。
+
+    Args:
+        equity (:py:class:`pandas.Series` or :py:class:`pandas.DataFrame`): 资产曲线。
+        periods (int): 每年的期数。日线数据默认为 `252` 。
+    """
+    values = _as_2d(equity)
+    n = len(values) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = (values[-1] / values[0]) ** (periods / n) - 1 if n > 0 else np.full(values.shape[1], np.nan)
+    return _wrap(equity, result, 'annualized_return')
+
+
+def annualized_volatility(equity, periods=252):
+    """年化波动率。
+
+    Args:
+        equity (:py:class:`pandas.Series` or :py:class:`pandas.DataFrame`): 资产曲线。
+        periods (int): 每年的期数。日线数据默认为 `252` 。
+    """
+    r = returns(equity)
+    with np.errstate(invalid='ignore'):
+        result = r.std(axis=0, ddof=1) * np.sqrt(periods) if len(r) > 1 else np.full(r.shape[1], np.nan)
+    return _wrap(equity, result, 'annualized_volatility')
+
+
+def sharpe_ratio(equity, risk_free=0.0, periods=252):
+    """夏普比率。
+
+    Args:
+        equity (:py:class:`pandas.Series` or :py:class:`pandas.DataFrame`): 资产曲线。
+        risk_free (float): 年化无风险利率。默认为 `0` 。
+        periods (int): 每年的期数。日线数据默认为 `252` 。
+    """
+    excess = returns(equity) - risk_free / periods
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = excess.mean(axis=0) / excess.std(axis=0, ddof=1) * np.sqrt(periods)
+    return _wrap(equity, result, 'sharpe_ratio')
+
+
+def sortino_ratio(equity, risk_free=0.0, periods=252):
+    """索提诺比率。只使用低于无风险收益的部分计算波动。
+
+    Args:
+        equity (:py:class:`pandas.Series` or :py:class:`pandas.DataFrame`): 资产曲线。
+        risk_free (float): 年化无风险利率。默认为 `0` 。
+        periods (int): 每年的期数。日线数据默认为 `252` 。
+    """
+    excess = returns(equity) - risk_free / periods
+    with np.errstate(divide='ignore', invalid='ignore'):
+        downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2, axis=0))
+        result = excess.mean(axis=0) / downside * np.sqrt(periods)
+    return _wrap(equity, result, 'sortino_ratio')
+
+
+def drawdown(equity):
+    """回撤曲线。当前资产相对之前最高资产的跌幅（负数）。
+
+    Args:
+        equity (:py:class:`pandas.Series` or :py:class:`pandas.DataFrame`): 资产曲线。
+
+    Returns:
+        与 `equity` 类型相同的回撤曲线。
+    """
+    values = _as_2d(equity)
+    result = values / np.maximum.accumulate(values, axis=0) - 1
+    if isinstance(equity, pd.DataFrame):
+        return pd.DataFrame(result, index=equity.index, columns=equity.columns)
+    if isinstance(equity, pd.Series):
+        return pd.Series(result[:, 0], index=equity.index, name='drawdown')
+    return result[:, 0]
+
+
+def max_drawdown(equity):
+    """最大回撤及其开始、结束日期。
+
+    Args:
+        equity (:py:class:`pandas.Series` or :py:class:`pandas.DataFrame`): 资产曲线。
+
+    Returns:
+        (float, peak, trough): 最大回撤（负数）、回撤开始（最高点）日期、回撤结束（最低点）日期。
+        传入 :py:class:`pandas.DataFrame` 时返回以 `drawdown` 、 `peak` 、 `trough` 为列的 :py:class:`pandas.DataFrame` 。
+    """
+    values = _as_2d(equity)
+    dd = values / np.maximum.accumulate(values, axis=0) - 1
+    trough = dd.argmin(axis=0)
+    rows = np.arange(len(values))[:, None]
+    # 最低点之前最后一次出现最高值的位置
+    peak = np.where((rows <= trough) & (dd == 0), rows, -1).max(axis=0)
+    peak = np.maximum(peak, 0)
+    result = dd[trough, np.arange(values.shape[1])]
+    index = equity.index if isinstance(equity, (pd.Series, pd.DataFrame)) else pd.RangeIndex(len(values))
+    if isinstance(equity, pd.DataFrame):
+        return pd.DataFrame({'drawdown': result, 'peak': index[peak], 'trough': index[trough]},
+                            index=equity.columns)
+    return result[0], index[peak[0]], index[trough[0]]
+
+
+def turnover(history_df, equity, periods=252):
+    """年化换手率。成交金额之和 / 平均总资产，再按期数年化。
+
+    Args:
+        history_df (:py:class:`pandas.DataFrame`): 成交历史。参考 :py:attr:`finance_tools_py.backtest.BackTest.history_df` 。
+        equity (:py:class:`pandas.Series`): 资产曲线。
+        periods (int): 每年的期数。日线数据默认为 `252` 。
+    """
+    if history_df.empty or len(equity) == 0:
+        return 0.0
+    traded = np.abs(history_df['price'].to_numpy(dtype=np.float64) *
+                    history_df['amount'].to_numpy(dtype=np.float64)).sum()
+    return traded / np.mean(np.asarray(equity, dtype=np.float64)) * periods / len(equity)
+
+
+def round_trips(history_df):
+    """把成交历史按股票拆分为从空仓到空仓的完整交易。
+
+    同一股票的成交按发生顺序累计持仓数量，持仓回到 `0` 时视为一次交易结束。
+
+    Args:
+        history_df (:py:class:`pandas.DataFrame`): 成交历史。
+
+    Returns:
+        :py:class:`pandas.DataFrame`: 每次交易一行。包含 `code` 、 `open` （开仓时间）、 `close` （平仓时间）、
+        `pnl` （包含手续费和印花税的盈亏）、 `holding` （持仓时间）、 `closed` （是否已平仓）列。
+    """
+    columns = ['code', 'open', 'close', 'pnl', 'holding', 'closed']
+    if history_df.empty:
+        return pd.DataFrame(columns=columns)
+    code_ids, codes = pd.factorize(history_df['code'])
+    order = np.argsort(code_ids, kind='mergesort')  # 同一股票内保持成交顺序
+    code_ids = code_ids[order]
+    amount = history_df['amount'].to_numpy(dtype=np.float64)[order]
+    price = history_df['price'].to_numpy(dtype=np.float64)[order]
+    fees = (history_df['commission'].to_numpy(dtype=np.float64) + history_df['tax'].to_numpy(dtype=np.float64))[order]
+    dates = pd.to_datetime(history_df['datetime']).to_numpy()[order]
+    flow = -price * amount - fees
+
+    n = len(amount)
+    first = np.ones(n, dtype=bool)
+    first[1:] = code_ids[1:] != code_ids[:-1]
+    # 每只股票单独累计持仓，不能用全局累计值相减，否则非整数的成交数量会因为舍入误差无法回到 0
+    position = pd.Series(amount).groupby(code_ids).cumsum().to_numpy()
+    flat = position == 0
+    start = first.copy()
+    start[1:] |= flat[:-1]
+    starts = np.flatnonzero(start)
+    ends = np.r_[starts[1:], n] - 1
+    return pd.DataFrame({
+        'code': codes[code_ids[starts]],
+        'open': dates[starts],
+        'close': np.where(flat[ends], dates[ends], np.datetime64('NaT')),
+        'pnl': np.add.reduceat(flow, starts),
+        'holding': dates[ends] - dates[starts],
+        'closed': flat[ends],
+    }, columns=columns)
+
+
+def win_rate(history_df):
+    """胜率。已平仓的交易中盈利（ `pnl` > 0 ）的比例。没有已平仓的交易时返回 `nan` 。"""
+    trips = round_trips(history_df)
+    closed = trips[trips['closed'].astype(bool)]
+    if closed.empty:
+        return np.nan
+    return float((closed['pnl'] > 0).mean())
+
+
+def average_holding_period(history_df):
+    """已平仓交易的平均持仓时间。没有已平仓的交易时返回 `NaT` 。"""
+    trips = round_trips(history_df)
+    closed = trips[trips['closed'].astype(bool)]
+    if closed.empty:
+        return pd.NaT
+    return pd.to_timedelta(closed['holding']).mean()
+
+
+def summary(bt, risk_free=0.0, periods=252):
+    """计算回测的全部统计指标。
+
+    Args:
+        bt (:py:class:`finance_tools_py.backtest.BackTest`): 已经完成计算的回测。
+        risk_free (float): 年化无风险利率。默认为 `0` 。
+        periods (int): 每年的期数。日线数据默认为 `252` 。
+
+    Returns:
+        :py:class:`pandas.Series`
+    """
+    equity = bt.equity_curve()['total']
+    history = bt.history_df
+    dd, peak, trough = max_drawdown(equity)
+    return pd.Series({
+        'annualized_return': annualized_return(equity, periods),
+        'annualized_volatility': annualized_volatility(equity, periods),
+        'sharpe_ratio': sharpe_ratio(equity, risk_free, periods),
+        'sortino_ratio': sortino_ratio(equity, risk_free, periods),
+        'max_drawdown': dd,
+        'max_drawdown_peak': peak,
+        'max_drawdown_trough': trough,
+        'turnover': turnover(history, equity, periods),
+        'win_rate': win_rate(history),
+        'average_holding_period': average_holding_period(history),
+    })
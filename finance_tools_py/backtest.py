@@ -2,10 +2,37 @@ import numpy as np
 import pandas as pd
 import datetime
 import abc
-from tqdm.auto import tqdm
+import bisect
+import contextlib
+import gzip
+import itertools
+import pickle
+import time
+
+from finance_tools_py.cache import fingerprint
+from finance_tools_py.cache import get_cache
+from finance_tools_py.events import TradeEvent
+from finance_tools_py.events import get_sink
+from finance_tools_py.market import to_frame
+from finance_tools_py.progress import get_progress
+
+
+def _chunks(n, step):
+    """把 `range(n)` 按 `step` 拆分为 (begin, end) 的列表。 `step` 为 `None` 时不拆分。"""
+    step = step or n or 1
+    return [(begin, min(begin + step, n)) for begin in range(0, n, step)]
+
 
 class CallBack():
-    """回测时的回调。"""
+    """回测时的回调。
+
+    Attributes:
+        supports_array_engine (bool): 是否可以使用 `array` 引擎计算。
+            `array` 引擎按列读取数据，传入回调的参数与 `iterrows` 引擎相同。
+            如果回调依赖逐行读取时的行为，可以设置为 `False` ，回测时将默认使用 `iterrows` 引擎。默认为 `True` 。
+    """
+
+    supports_array_engine = True
 
     def __init__(self):
         pass
@@ -52,6 +79,55 @@ class CallBack():
         """
         return False
 
+    def on_check_buy_batch(self, dates, codes, prices):
+        """批量检查是否需要买入。
+
+        回测开始前调用一次，传入全部行情数据。返回的结果会直接作为每一行的买入判断，
+        回测时不再对这个回调逐行调用 :py:meth:`on_check_buy` ，并且会跳过所有回调都没有信号的行。
+        因此只有不依赖现金和持仓的判断才可以使用批量判断。
+
+        Args:
+            dates (:py:class:`numpy.ndarray`): 时间。
+            codes (:py:class:`numpy.ndarray`): 股票代码。
+            prices (:py:class:`numpy.ndarray`): 价格。
+
+        Returns:
+            :py:class:`numpy.ndarray`: 与参数等长的 `bool` 数组，表示每一行是否买入。
+            返回 `None` 表示不支持批量判断，回测时逐行调用 :py:meth:`on_check_buy` 。默认返回 `None` 。
+        """
+        return None
+
+    def on_check_sell_batch(self, dates, codes, prices):
+        """批量检查是否需要卖出。
+
+        与 :py:meth:`on_check_buy_batch` 相同，返回 `None` 表示逐行调用 :py:meth:`on_check_sell` 。默认返回 `None` 。
+
+        Args:
+            dates (:py:class:`numpy.ndarray`): 时间。
+            codes (:py:class:`numpy.ndarray`): 股票代码。
+            prices (:py:class:`numpy.ndarray`): 价格。
+
+        Returns:
+            :py:class:`numpy.ndarray`: 与参数等长的 `bool` 数组，表示每一行是否卖出。
+        """
+        return None
+
+    def on_rank_buy(self, date, codes, prices):
+        """对同一天的所有买入候选排序。只在 `cross` 计算引擎中调用。
+
+        可用资金不足以买入全部候选时，先买入分数高的股票。可以使用向量运算一次计算所有候选的分数。
+        默认返回 `None` ，按行情数据中的顺序买入。有多个回调时使用第一个不为 `None` 的结果。
+
+        Args:
+            date: 日期。
+            codes (:py:class:`numpy.ndarray`): 当天有买入信号的股票代码。
+            prices (:py:class:`numpy.ndarray`): 对应的价格。
+
+        Returns:
+            :py:class:`numpy.ndarray`: 与参数等长的分数，分数高的先买入，分数相同时保持原有顺序。
+        """
+        return None
+
     @abc.abstractmethod
     def on_calc_buy_amount(self,
                            date: datetime.datetime.timestamp,
@@ -94,10 +170,28 @@ class CallBack():
         """
         return 0
 
+    def cache_key(self):
+        """回调配置的标识。 :py:class:`finance_tools_py.cache.ResultCache` 用它区分不同配置的计算结果。
+
+        默认为类名及所有属性。如果回调的行为还依赖属性以外的状态（例如全局变量或文件），
+        需要在派生类中重写此方法；返回 `None` 表示结果不能被缓存。
+        属性中包含函数或其他无法确定哈希值的对象时同样不会缓存。
+
+        Returns:
+            配置相同时相等的值。可以由数值、字符串、列表、字典、集合及 :py:mod:`numpy` / :py:mod:`pandas` 的数组组成。
+        """
+        return type(self).__module__, type(self).__qualname__, vars(self)
+
 
 class AHundredChecker(CallBack):
     """每次买入和卖出数量都是100股的回调
 
+    初始化时会把 :py:attr:`buy_dict` 和 :py:attr:`sell_dict` 转换为 (股票代码, 时间) 的哈希索引，
+    检查买入卖出时只需要一次集合查找。使用 `array` 引擎回测时，信号会预先与行情数据连接，
+    只处理有信号的行，计算时间与信号数量而不是行情数据的行数相关。其中的日期可以是 `datetime.date` 、 `datetime.datetime` 、
+    :py:class:`pandas.Timestamp` 或 `numpy.datetime64` ，会被统一为同一种时间再比较。
+    重新给 :py:attr:`buy_dict` 或 :py:attr:`sell_dict` 赋值会重建索引；直接修改字典内容则不会。
+
     Attributes:
         buy_dict ({str,[datetime.datetime]}): 购买日期字典。key值为股票代码，value值为日期集合。
         sell_dict ({str,[datetime.datetime]}): 卖出日期字典。key值为股票代码，value值为日期集合。
@@ -119,6 +213,7 @@ class AHundredChecker(CallBack):
             min_amount (float): 每次交易最小交易数量。默认为 `100` （股）。
 
         """
+        self._date_keys = {}  # 日期 -> 统一后的时间，避免重复转换
         self.buy_dict = buy_dict
         self.sell_dict = sell_dict
         self.tax_coeff = kwargs.pop('tax_coeff', 0.001)
@@ -126,16 +221,103 @@ class AHundredChecker(CallBack):
         self.min_commission = kwargs.pop('min_commission', 5)
         self.min_amount = kwargs.pop('min_amount', 100)
 
+    @property
+    def buy_dict(self):
+        return self._buy_dict
+
+    @buy_dict.setter
+    def buy_dict(self, value):
+        self._buy_dict = value
+        self._buy_index = self._build_index(value)
+        self._buy_keys = None
+
+    @property
+    def sell_dict(self):
+        return self._sell_dict
+
+    @sell_dict.setter
+    def sell_dict(self, value):
+        self._sell_dict = value
+        self._sell_index = self._build_index(value)
+        self._sell_keys = None
+
+    def cache_key(self):
+        """类名、交易参数及统一为 (股票代码, 时间) 的买入、卖出信号。不包含计算过程中生成的缓存。"""
+        params = {k: v for k, v in vars(self).items() if not k.startswith('_')}
+        return (type(self).__module__, type(self).__qualname__, params,
+                self._index_frame(self._buy_index), self._index_frame(self._sell_index))
+
+    @staticmethod
+    def _index_frame(index):
+        """把信号索引转换为排序后的 :py:class:`pandas.DataFrame` ，按列计算哈希比逐个元素快得多。"""
+        codes, keys = zip(*index) if index else ((), ())
+        # 股票代码的类型单独保存，`1` 和 `'1'` 是不同的代码
+        return pd.DataFrame({'type': [type(code).__name__ for code in codes],
+                             'code': [str(code) for code in codes],
+                             'key': np.asarray(keys, dtype=np.int64)}).sort_values(['type', 'code', 'key'],
+                                                                                    ignore_index=True)
+
+    @staticmethod
+    def _build_index(signal_dict):
+        """把 {股票代码: 日期集合} 转换为 {(股票代码, 时间)} 集合。时间统一为纳秒整数。"""
+        index = set()
+        for code, dates in signal_dict.items():
+            dates = list(dates)
+            if dates:
+                index.update((code, key) for key in pd.to_datetime(dates).asi8.tolist())
+        return index
+
+    @staticmethod
+    def _batch_mask(index, keys, dates, codes):
+        """把行情数据的 (股票代码, 时间) 与信号索引做一次哈希连接，返回有信号的行。"""
+        if not index:
+            return np.zeros(len(codes), dtype=bool), keys
+        if keys is None:
+            signal_codes, signal_dates = zip(*index)
+            keys = (pd.Index(signal_codes), np.asarray(signal_dates, dtype=np.int64))
+        signal_codes, signal_dates = keys
+        # 股票代码和时间分别编码为整数后合并为一个 int64 ，再做一次哈希查找。
+        code_ids, code_uniques = pd.factorize(codes)
+        date_ids, date_uniques = pd.factorize(pd.to_datetime(dates).asi8)
+        signal_code_ids = pd.Index(code_uniques).get_indexer(signal_codes)
+        signal_date_ids = pd.Index(date_uniques).get_indexer(signal_dates)
+        found = (signal_code_ids >= 0) & (signal_date_ids >= 0)
+        width = np.int64(len(date_uniques))
+        signal_rows = signal_code_ids[found].astype(np.int64) * width + signal_date_ids[found]
+        rows = np.where((code_ids >= 0) & (date_ids >= 0), code_ids.astype(np.int64) * width + date_ids, -1)
+        return pd.Series(rows).isin(signal_rows).to_numpy(), keys
+
+    def on_check_buy_batch(self, dates, codes, prices):
+        """一次性找出 :py:attr:`buy_dict` 中的买入信号对应的行。
+
+        派生类重写了 :py:meth:`on_check_buy` 时返回 `None` ，仍然逐行调用。"""
+        if type(self).on_check_buy is not AHundredChecker.on_check_buy:
+            return None
+        mask, self._buy_keys = self._batch_mask(self._buy_index, self._buy_keys, dates, codes)
+        return mask
+
+    def on_check_sell_batch(self, dates, codes, prices):
+        """一次性找出 :py:attr:`sell_dict` 中的卖出信号对应的行。
+
+        派生类重写了 :py:meth:`on_check_sell` 时返回 `None` ，仍然逐行调用。"""
+        if type(self).on_check_sell is not AHundredChecker.on_check_sell:
+            return None
+        mask, self._sell_keys = self._batch_mask(self._sell_index, self._sell_keys, dates, codes)
+        return mask
+
+    def _date_key(self, date):
+        key = self._date_keys.get(date)
+        if key is None:
+            key = self._date_keys[date] = pd.Timestamp(date).value
+        return key
+
     def on_check_buy(self,
                      date: datetime.datetime.timestamp,
                      code: str,
                      price: float,
                      cash: float) -> bool:
         """当 `date` 及 `code` 包含在参数 :py:attr:`buy_dict` 中时返回 `True` 。否则返回 `False` 。"""
-        if code in self.buy_dict.keys() and date in self.buy_dict[code]:
-            return True
-        else:
-            return False
+        return (code, self._date_key(date)) in self._buy_index
 
     def on_check_sell(self,
                       date: datetime.datetime.timestamp,
@@ -145,10 +327,7 @@ class AHundredChecker(CallBack):
                       hold_amount: float,
                       hold_price: float) -> bool:
         """当 `date` 及 `code` 包含在参数 :py:attr:`sell_dict` 中时返回 `True` 。否则返回 `False` 。"""
-        if code in self.sell_dict.keys() and date in self.sell_dict[code]:
-            return True
-        else:
-            return False
+        return (code, self._date_key(date)) in self._sell_index
 
     def _calc_commission(self,
                          price: float,
@@ -162,6 +341,12 @@ class AHundredChecker(CallBack):
         """计算印花税"""
         return price * amount * self.tax_coeff
 
+    def _calc_buy_cost(self,
+                       price: float,
+                       amount: int) -> float:
+        """计算买入时实际花费的金额（含手续费和印花税）"""
+        return price * amount + self._calc_commission(price, amount) + self._calc_tax(price, amount)
+
     def on_calc_buy_amount(self,
                            date: datetime.datetime.timestamp,
                            code: str,
@@ -169,7 +354,7 @@ class AHundredChecker(CallBack):
                            cash: float) -> float:
         """计算买入数量。当交易实际花费金额小于 `cash` （可用现金） 时，返回参数 :py:attr:`min_amount` （每次交易数量）。"""
         amount = self.min_amount
-        if price * amount + self._calc_commission(price, amount) + self._calc_tax(price, amount) <= cash:
+        if self._calc_buy_cost(price, amount) <= cash:
             return amount
         return 0
 
@@ -199,12 +384,62 @@ class AllInChecker(AHundredChecker):
         """计算买入数量。
         根据 `cash` （可用现金）及 `price` （当前价格）计算实际可以买入的数量（参数 :py:attr:`min_amount` 的倍数）
             （计算时包含考虑了交易时可能产生的印花税和手续费）
+
+        花费金额为 `price*amount*(1+tax_coeff) + max(price*amount*commission_coeff, min_commission)` ，
+        先按两段线性函数直接求出手数，再用与逐手累加相同的算式校正边界，结果与逐手累加完全一致。
         """
-        amount = self.min_amount
-        while price * amount + self._calc_commission(price, amount) + self._calc_tax(price, amount) <= cash:
-            amount = amount + self.min_amount
-        amount = amount - self.min_amount
-        return amount
+        min_amount = self.min_amount
+        if not price > 0 or not min_amount > 0:
+            return 0
+        lots = self._estimate_lots(price, cash)
+        while lots > 0 and self._calc_buy_cost(price, lots * min_amount) > cash:
+            lots = lots - 1
+        while self._calc_buy_cost(price, (lots + 1) * min_amount) <= cash:
+            lots = lots + 1
+        return lots * min_amount
+
+    def _estimate_lots(self, price, cash):
+        """按 `花费金额 <= cash` 直接估算可以买入的手数。结果可能因浮点误差与实际相差 1 手。"""
+        unit = price * self.min_amount
+        lots = min((cash - self.min_commission) / (unit * (1 + self.tax_coeff)),
+                   cash / (unit * (1 + self.commission_coeff + self.tax_coeff)))
+        return max(int(np.floor(lots)), 0) if np.isfinite(lots) else 0
+
+    def calc_buy_amounts(self, prices, cash):
+        """批量计算买入数量。结果与逐个调用 :py:meth:`on_calc_buy_amount` 相同。
+
+        Args:
+            prices (array_like): 价格。
+            cash (array_like): 可用现金。可以是与 `prices` 等长的数组，也可以是一个数值。
+
+        Returns:
+            :py:class:`numpy.ndarray`: 买入数量。
+        """
+        min_amount = self.min_amount
+        prices, cash = np.broadcast_arrays(np.asarray(prices, dtype=np.float64),
+                                           np.asarray(cash, dtype=np.float64))
+
+        def cost(lots):
+            value = prices * (lots * min_amount)
+            return value + np.maximum(value * self.commission_coeff, self.min_commission) + value * self.tax_coeff
+
+        valid = (prices > 0) & (min_amount > 0)
+        unit = np.where(valid, prices, 1.0) * min_amount
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lots = np.minimum((cash - self.min_commission) / (unit * (1 + self.tax_coeff)),
+                              cash / (unit * (1 + self.commission_coeff + self.tax_coeff)))
+        lots = np.where(valid & np.isfinite(lots), np.maximum(np.floor(lots), 0), 0).astype(np.int64)
+        while True:
+            over = (lots > 0) & (cost(lots) > cash)
+            if not over.any():
+                break
+            lots[over] -= 1
+        while True:
+            under = valid & (cost(lots + 1) <= cash)
+            if not under.any():
+                break
+            lots[under] += 1
+        return lots * min_amount
 
     def on_calc_sell_amount(self,
                             date: datetime.datetime.timestamp,
@@ -218,6 +453,405 @@ class AllInChecker(AHundredChecker):
         return hold_amount
 
 
+class _Dictionary():
+    """把值映射为从 `0` 开始的连续编号（按首次出现的顺序），解码时返回首次写入的原始对象。"""
+
+    def __init__(self):
+        self.values = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        """获取值的编号。新的值会被追加到字典中。"""
+        i = self._ids.get(value)
+        if i is None:
+            i = self._ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+    def array(self):
+        """所有值组成的 `object` 数组，下标为编号。"""
+        values = np.empty(len(self.values), dtype=object)
+        values[:] = self.values
+        return values
+
+    def __getstate__(self):
+        return {'values': self.values}
+
+    def __setstate__(self, state):
+        self.values = state['values']
+        self._ids = {value: i for i, value in enumerate(self.values)}
+
+
+class TradeHistory():
+    """按列存储的成交历史。
+
+    每一列使用一个 :py:class:`numpy.ndarray` 作为缓冲区，容量不足时按倍数扩容。
+    数值列的类型根据写入的数据自动提升（例如写入过浮点数后整数列会转换为浮点列），
+    因此转换得到的 :py:class:`pandas.DataFrame` 与使用列表创建的结果一致。
+    `datetime` 和 `code` 列使用字典编码，只保存 `int32` 编号，每个不同的时间和股票代码只保存一次，
+    在 :py:meth:`to_frame` 、按行读取及 :py:meth:`column` 时才解码为原始值。
+    同时维护手续费和印花税的累计值。
+
+    Attributes:
+        headers ([str]): 列名。
+        total_commission (float): 累计手续费。
+        total_tax (float): 累计印花税。
+    """
+
+    _encoded_columns = ('datetime', 'code')
+
+    def __init__(self, headers, capacity=64):
+        """初始化
+
+        Args:
+            headers ([str]): 列名。
+            capacity (int): 初始容量。默认为 `64` 。
+        """
+        self.headers = list(headers)
+        self._capacity = max(int(capacity), 1)
+        self._size = 0
+        self._dictionaries = [_Dictionary() if h in self._encoded_columns else None for h in self.headers]
+        self._columns = self._empty_columns()
+        self._commission_index = self.headers.index('commission')
+        self._tax_index = self.headers.index('tax')
+        self.total_commission = 0
+        self.total_tax = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        """按行获取成交记录。"""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index = index + self._size
+        if not 0 <= index < self._size:
+            raise IndexError('history index out of range')
+        return [col[index].item() if d is None else d.values[col[index]]
+                for col, d in zip(self._columns, self._dictionaries)]
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def tolist(self):
+        """转换为行的列表。"""
+        return list(self)
+
+    def __getstate__(self):
+        # 序列化时只保存已写入的部分
+        state = self.__dict__.copy()
+        state['_columns'] = [col[:self._size].copy() if col is not None else None for col in self._columns]
+        state['_capacity'] = max(self._size, 1)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._size == 0:
+            self._columns = self._empty_columns()
+
+    def _empty_columns(self):
+        return [np.empty(self._capacity, dtype=np.int32) if d is not None else None for d in self._dictionaries]
+
+    @staticmethod
+    def _value_dtype(value):
+        dtype = np.asarray(value).dtype
+        return dtype if dtype.kind in 'biuf' else np.dtype(object)
+
+    def _grow(self):
+        self._capacity = self._capacity * 2
+        for i, col in enumerate(self._columns):
+            if col is not None:
+                buffer = np.empty(self._capacity, dtype=col.dtype)
+                buffer[:self._size] = col[:self._size]
+                self._columns[i] = buffer
+
+    def append(self, row):
+        """追加一行成交记录。
+
+        Args:
+            row (list): 与 :py:attr:`headers` 对应的数据。
+        """
+        if self._size == self._capacity:
+            self._grow()
+        for i, value in enumerate(row):
+            col = self._columns[i]
+            dictionary = self._dictionaries[i]
+            if dictionary is not None:
+                col[self._size] = dictionary.encode(value)
+                continue
+            if col is None:
+                col = self._columns[i] = np.empty(self._capacity, dtype=self._value_dtype(value))
+            elif col.dtype != object:
+                dtype = self._value_dtype(value)
+                if dtype != col.dtype:
+                    dtype = np.result_type(col.dtype, dtype)
+                    if dtype != col.dtype:
+                        col = self._columns[i] = col.astype(dtype)
+            col[self._size] = value
+        self._size = self._size + 1
+        self.total_commission = self.total_commission + row[self._commission_index]
+        self.total_tax = self.total_tax + row[self._tax_index]
+
+    def column(self, name):
+        """获取某一列已写入的数据。数值列为只读视图，字典编码的列返回解码后的 `object` 数组。"""
+        i = self.headers.index(name)
+        col = self._columns[i]
+        if col is None:
+            return np.empty(0)
+        view = col[:self._size]
+        if self._dictionaries[i] is not None:
+            return self._dictionaries[i].array()[view]
+        view.flags.writeable = False
+        return view
+
+    def encoded(self, name):
+        """获取字典编码的列。
+
+        Args:
+            name (str): `datetime` 或 `code` 。
+
+        Returns:
+            (:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`): 每行的 `int32` 编号（只读视图）及
+            以编号为下标的原始值。
+        """
+        i = self.headers.index(name)
+        view = self._columns[i][:self._size]
+        view.flags.writeable = False
+        return view, self._dictionaries[i].array()
+
+    def to_frame(self):
+        """转换为 :py:class:`pandas.DataFrame` 。"""
+        return pd.DataFrame({h: (self.column(h).copy() if col is not None else [])
+                             for h, col in zip(self.headers, self._columns)},
+                            columns=self.headers)
+
+
+class PositionLedger():
+    """按股票代码记录的持仓账本。
+
+    每次成交时以 O(1) 的代价更新持仓数量，并记录最近一次空仓之后的成交。持仓成本采用加权平均：
+    从最近一次空仓之后的所有成交（卖出数量为负数）按成交量加权计算。成本使用 :py:func:`numpy.average` 计算，
+    浮点数的求和顺序与按成交历史重新计算时相同，结果完全一致；代价是读取成本需要 O(k) ，k 为该股票最近一次空仓之后的成交次数。
+    成本在读取时计算并缓存到该股票的下一次成交。持仓数量回到 `0` 时该股票从账本中移除。
+    """
+
+    def __init__(self):
+        self._positions = {}  # code: [持仓数量, [成交价], [成交量], 缓存的 (持仓成本, 持仓数量)]
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, code):
+        return code in self._positions
+
+    @property
+    def codes(self):
+        """当前持有的股票代码（已排序）。"""
+        return sorted(self._positions.keys())
+
+    def update(self, code, price, amount):
+        """记录一次成交。
+
+        Args:
+            code: 股票代码。
+            price (float): 成交价。
+            amount (float): 成交量。买入为正数，卖出为负数。
+        """
+        position = self._positions.get(code)
+        if position is None:
+            position = self._positions[code] = [0, [], [], None]
+        position[0] = position[0] + amount
+        if position[0] == 0:
+            del self._positions[code]
+            return
+        position[1].append(price)
+        position[2].append(amount)
+        position[3] = None
+
+    def get(self, code):
+        """获取持仓。
+
+        Returns:
+            (float, float): 持仓成本及持仓数量。未持有时返回 `None` 。
+        """
+        position = self._positions.get(code)
+        if position is None:
+            return None
+        if position[3] is None:
+            position[3] = np.average(np.asarray(position[1], dtype=np.float64),
+                                     weights=np.asarray(position[2]), returned=True)
+        return position[3]
+
+    def amounts(self):
+        """获取当前持仓数量。
+
+        Returns:
+            :py:class:`pandas.Series`: 索引为 `code` ，值为持仓数量。
+        """
+        codes = self.codes
+        return pd.Series([self._positions[code][0] for code in codes],
+                         index=pd.Index(codes, name='code'),
+                         name='amount')
+
+    def to_series(self):
+        """获取当前持仓成本。
+
+        Returns:
+            :py:class:`pandas.Series`: 索引为 `code` ，值为 (持仓成本, 持仓数量) 。
+        """
+        codes = self.codes
+        return pd.Series([self.get(code) for code in codes],
+                         index=pd.Index(codes, name='code'),
+                         dtype=object)
+
+
+class TradeMatrix():
+    """按 (日期, 股票代码) 汇总的成交矩阵，以坐标（COO）格式保存。
+
+    只保存有成交的位置，占用的内存与成交数量相关，而不是日期数量 x 股票数量。
+    同一天同一股票的多笔成交会被合并，合并后为 `0` 的位置不保存。
+
+    Attributes:
+        dates (:py:class:`pandas.DatetimeIndex`): 行索引（已排序）。
+        codes (:py:class:`pandas.Index`): 列索引（已排序）。
+        row (:py:class:`numpy.ndarray`): 每个值所在行的序号。
+        col (:py:class:`numpy.ndarray`): 每个值所在列的序号。
+        data (:py:class:`numpy.ndarray`): 值。
+    """
+
+    def __init__(self, dates, codes, row, col, data):
+        self.dates = dates
+        self.codes = codes
+        self.row = row
+        self.col = col
+        self.data = data
+
+    @property
+    def shape(self):
+        """(日期数量, 股票数量)"""
+        return len(self.dates), len(self.codes)
+
+    @property
+    def nnz(self):
+        """保存的值的数量。"""
+        return len(self.data)
+
+    def abs(self):
+        """返回值取绝对值后的矩阵。"""
+        return TradeMatrix(self.dates, self.codes, self.row, self.col, np.abs(self.data))
+
+    def sum(self, axis=0):
+        """按行或按列求和。
+
+        Args:
+            axis (int): `0` 按日期汇总（返回以股票代码为索引的 :py:class:`pandas.Series` ），
+                `1` 按股票汇总（返回以日期为索引的 :py:class:`pandas.Series` ）。
+        """
+        if axis == 0:
+            return pd.Series(np.bincount(self.col, weights=self.data, minlength=len(self.codes)), index=self.codes)
+        return pd.Series(np.bincount(self.row, weights=self.data, minlength=len(self.dates)), index=self.dates)
+
+    def to_dense(self):
+        """转换为 :py:class:`pandas.DataFrame` 。没有成交的位置为 `0` 。"""
+        values = np.zeros(self.shape)
+        values[self.row, self.col] = self.data
+        return pd.DataFrame(values, index=self.dates, columns=self.codes)
+
+    def to_scipy(self, format='coo'):
+        """转换为 :py:mod:`scipy.sparse` 的稀疏矩阵。需要安装 :py:mod:`scipy` 。
+
+        Args:
+            format (str): 稀疏矩阵的格式。例如 `coo` 、 `csr` 、 `csc` 。默认为 `coo` 。
+        """
+        from scipy import sparse
+        return sparse.coo_matrix((self.data, (self.row, self.col)), shape=self.shape).asformat(format)
+
+
+class BackTestStats():
+    """回测的耗时统计。
+
+    记录每个回调方法及回测内部各阶段的调用次数和累计耗时（秒）。阶段包括：
+
+    * `run` : 一次计算的总耗时。
+    * `prepare` : 计算前取出数据列及调用回调批量判断的耗时。
+    * `process_row` : 处理行情数据的耗时。包含回调、 `ledger` 及 `history` 的耗时。 `cross` 计算引擎按天计数。
+    * `ledger` : 更新持仓账本的耗时。
+    * `history` : 记录成交历史的耗时。
+    * `progress` : `run` 中除去 `prepare` 和 `process_row` 的部分，主要是遍历数据及进度条的耗时。
+    * `history_df` : 生成 :py:attr:`BackTest.history_df` 的耗时。
+    * `回调类名[序号].方法名` : 回调方法的耗时。
+
+    Attributes:
+        calls ({str: int}): 调用次数。
+        seconds ({str: float}): 累计耗时。
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+
+    def add(self, name, seconds, calls=1):
+        """累加一项耗时。"""
+        self.calls[name] = self.calls.get(name, 0) + calls
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def wrap(self, func, name):
+        """返回记录耗时的 `func` 。"""
+        calls, totals, perf_counter = self.calls, self.seconds, time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                totals[name] = totals.get(name, 0.0) + perf_counter() - start
+                calls[name] = calls.get(name, 0) + 1
+
+        return timed
+
+    def reset(self):
+        """清空统计。"""
+        self.calls.clear()
+        self.seconds.clear()
+
+    def to_frame(self):
+        """转换为 :py:class:`pandas.DataFrame` 。
+
+        Returns:
+            :py:class:`pandas.DataFrame`: 以名称为索引，包含 `calls` （调用次数）、 `seconds` （累计耗时）、
+            `mean` （平均耗时）列，按累计耗时倒序排列。
+        """
+        names = list(self.seconds.keys())
+        frame = pd.DataFrame({'calls': [self.calls[n] for n in names],
+                              'seconds': [self.seconds[n] for n in names]},
+                             index=pd.Index(names, name='name'),
+                             columns=['calls', 'seconds'])
+        frame['mean'] = frame['seconds'] / frame['calls']
+        return frame.sort_values('seconds', ascending=False)
+
+
+class _TimedCallBack():
+    """记录回调方法耗时的代理。其他属性直接读取原回调。"""
+
+    _methods = ('on_check_buy', 'on_check_sell', 'on_calc_buy_amount', 'on_calc_sell_amount',
+                'on_check_buy_batch', 'on_check_sell_batch', 'on_rank_buy')
+
+    def __init__(self, callback, stats, name):
+        self._callback = callback
+        for method in self._methods:
+            func = getattr(callback, method, None)
+            if func is not None:
+                setattr(self, method, stats.wrap(func, '{}.{}'.format(name, method)))
+
+    def __getattr__(self, item):
+        return getattr(self._callback, item)
+
+
 class BackTest():
     """简单的回测系统。根据传入的购买日期和卖出日期，计算收益。
 
@@ -263,12 +897,16 @@ class BackTest():
                  commission_coeff=0.001,
                  min_commission=5,
                  col_name='close',
-                 callbacks=[CallBack()]):
+                 callbacks=[CallBack()],
+                 instrument=False):
         """初始化
 
         Args:
             data (:py:class:`pandas.DataFrame`): 完整的日线数据。数据中需要包含 `date` 列，用来标记日期。
                 数据中至少需要包含 `date` 列、 `code` 列和 `close` 列，其中 `close` 列可以由参数 `colname` 参数指定。
+                使用 :py:meth:`calc_trade_history_stream` 分块计算时可以为 `None` 。
+                也可以是数组字典、 :py:mod:`numpy` 结构化数组或 Arrow 表，会尽量不复制数据地转换为 :py:class:`pandas.DataFrame` 。
+                参考 :py:func:`finance_tools_py.market.to_frame` 。
             init_cash (float): 初始资金。
             tax_coeff (float): 印花税费率。默认0.001。
             commission_coeff (float): 手续费率。默认0.001。
@@ -276,21 +914,20 @@ class BackTest():
             col_name (str): 计算用的列名。默认为 `close` 。
                 这个列名必须包含在参数 `data` 中。是用来进行回测计算的列，用来标记回测时使用的价格数据。
             callbacks ([:py:class:`finance_tools_py.backtest.CallBack`]): 回调函数集合。
+            instrument (bool): 是否统计回调及各计算阶段的耗时。统计结果保存在 :py:attr:`stats` 中，
+                并显示在 :py:meth:`report` 的结果中。默认为 `False` ，不统计时没有额外开销。
         """
         self._min_buy_amount = 100  # 单次可买最小数量
+        if data is not None and not isinstance(data, pd.DataFrame):
+            data = to_frame(data, col_name)
         self.data = data
+        self._data_info = None  # 分块计算时记录的数据范围
+        self._last_date = None  # 已经计算过的最后时间
         self.init_cash = init_cash
         self.cash = [init_cash]  # 资金明细
         self.tax_coeff = tax_coeff
         self.commission_coeff = commission_coeff
         self.min_commission = min_commission
-        self.history = []  # 交易历史
-        self._init_hold = pd.Series([], name='amount')
-        self._init_hold.index.name = 'code'
-        self._calced = False
-        self._colname = col_name
-        self._calbacks = callbacks
-        self._hold_price_cur = pd.DataFrame()
         self._history_headers = [
             'datetime',  # 时间
             'code',  # 代码
@@ -302,21 +939,36 @@ class BackTest():
             'total',  # 总金额
             'toward',  # 方向
         ]
+        self.history = TradeHistory(self._history_headers)  # 交易历史
+        self._history_df = None
+        self._fills = None  # snapshot 使用的成交索引
+        self._init_hold = pd.Series([], name='amount')
+        self._init_hold.index.name = 'code'
+        self._calced = False
+        self._colname = col_name
+        self._calbacks = callbacks
+        self._clear_batch()
+        self._ledger = PositionLedger()  # 当前持仓
+        self._hold_price_cur = None
+        self._last_fills = {}  # code: 最后一次成交的时间
+        self._unordered_fills = {}  # code: [按时间排序的成交, 缓存的持仓]。只包含成交时间乱序的股票
+        self.stats = BackTestStats() if instrument else None  # 耗时统计
+        self._sink = None  # 交易事件的处理对象，计算时由 `sink` 参数设置
         # self.hold_amount=[]#当前持仓数量
         # self.hold_price=[]#当前持仓金额
 
     @property
     def history_df(self):
-        """获取成交历史的 :py:class:`pandas.DataFrame` 格式。"""
-        if len(self.history) > 0:
-            lens = len(self.history[0])
-        else:
-            lens = len(self._history_headers)
+        """获取成交历史的 :py:class:`pandas.DataFrame` 格式。
 
-        return pd.DataFrame(
-            data=self.history,
-            columns=self._history_headers[:lens]
-        ).sort_index()
+        结果会被缓存，直到产生新的成交。请不要直接修改返回的数据。
+        """
+        if self._history_df is None:
+            if self.stats is not None:
+                self._history_df = self.stats.wrap(self.history.to_frame, 'history_df')()
+            else:
+                self._history_df = self.history.to_frame()
+        return self._history_df
 
     @property
     def available_hold_df(self):
@@ -325,86 +977,118 @@ class BackTest():
         Returns:
             :py:class:`pandas.Series`
         """
-        return self.history_df.groupby('code').amount.sum().replace(
-            0,
-            np.nan
-        ).dropna().sort_index()
-
-    # @property
-    # def trade(self):
-    #     """每次交易的pivot表
-    #     Returns:
-    #         pd.DataFrame
-    #         此处的pivot_table一定要用np.sum
-    #     """
-    #
-    #     return self.history_df.pivot_table(
-    #         index=['datetime'],
-    #         columns='code',
-    #         values='amount',
-    #         aggfunc=np.sum
-    #     ).fillna(0).sort_index()
-
-    def __hold_price_cur(self):
-        """计算目前持仓的成本。
-
-        因为这个属性可能会频繁调用apply，造成性能极低。所以改为内部属性。
+        return self._ledger.amounts()
 
-        Returns:
-            :py:class:`pandas.Series`
-        """
+    def trade_matrix(self, values='amount'):
+        """按日期和股票代码汇总的成交矩阵。
 
-        def weights(x):
-            n = len(x)
-            res = 1
-            while res > 0 or res < 0:
-                res = sum(x[:n]['amount'])
-                n = n - 1
+        Example:
+            >>> m = bt.trade_matrix('value')
+            >>> m.abs().sum(axis=1)  # 每日成交金额
+            >>> m.to_dense()  # 与 history_df.pivot_table(index='datetime', columns='code', aggfunc=np.sum) 相同
 
-            x = x[n + 1:]
-
-            if sum(x['amount']) != 0:
-                return np.average(x['price'], weights=x['amount'], returned=True)
-            else:
-                return np.nan
+        Args:
+            values (str): 汇总的列。可以是 :py:attr:`history_df` 中的数值列，默认为 `amount` （成交量，卖出为负数）；
+                或者 `value` （成交金额，即成交价 x 成交量，卖出为负数）。
 
-        return self.history_df.set_index('datetime', drop=False).sort_index().groupby('code').apply(weights).dropna()
+        Returns:
+            :py:class:`TradeMatrix`
+        """
+        if values == 'value':
+            weights = self.history.column('price').astype(np.float64) * self.history.column('amount')
+        else:
+            weights = self.history.column(values).astype(np.float64)
+        date_ids, dates = pd.factorize(self._fill_times(), sort=True)
+        code_ids, codes = self._fill_codes()
+        width = max(len(codes), 1)
+        keys, inverse = np.unique(date_ids.astype(np.int64) * width + code_ids, return_inverse=True)
+        data = np.bincount(inverse, weights=weights, minlength=len(keys))
+        nonzero = data != 0
+        keys = keys[nonzero]
+        return TradeMatrix(pd.DatetimeIndex(dates.astype('datetime64[ns]'), name='datetime'),
+                           pd.Index(codes, name='code'),
+                           (keys // width).astype(np.int32),
+                           (keys % width).astype(np.int32),
+                           data[nonzero])
 
     @property
     def hold_price_cur(self):
-        """目前持仓的成本。是 :py:class: `pandas.Series` 类型或 :py:class: `pandas.DataFrame` 类型。
+        """目前持仓的成本。是 :py:class: `pandas.Series` 类型。
             其中 `code` 是索引，通过索引访问会返回一个数组（price,amount）"""
+        if self._hold_price_cur is None:
+            if not self._unordered_fills:
+                self._hold_price_cur = self._ledger.to_series()
+            else:
+                codes = self._ledger.codes
+                self._hold_price_cur = pd.Series([self._hold(code) for code in codes],
+                                                 index=pd.Index(codes, name='code'),
+                                                 dtype=object)
         return self._hold_price_cur
 
-    def _update_hold_price_cur(self):
-        self._hold_price_cur = self.__hold_price_cur()
+    def _hold(self, code):
+        """获取持仓成本及持仓数量。未持有时返回 `None` 。
+
+        同一股票的成交按时间先后发生时直接读取持仓账本。行情数据没有按时间排序（例如随机顺序）时，
+        与逐笔重新计算的结果保持一致：该股票的成交按时间排序（相同时间保持成交顺序）后，
+        取最后一次空仓之后的成交计算加权平均成本。结果缓存到该股票的下一次成交。
+        """
+        hold = self._ledger.get(code)
+        entry = self._unordered_fills.get(code)
+        if hold is None or entry is None:
+            return hold
+        if entry[1] is None:
+            fills = entry[0]
+            prices = np.array([fill[2] for fill in fills], dtype=np.float64)
+            amounts = np.array([fill[3] for fill in fills])
+            flat = np.flatnonzero(np.cumsum(amounts)[:-1] == 0)
+            start = flat[-1] + 1 if len(flat) else 0
+            entry[1] = np.average(prices[start:], weights=amounts[start:], returned=True)
+        return entry[1]
+
+    def _track_fill(self, seq, date, code, price, amount):
+        """记录成交时间的先后。某只股票第一次出现早于之前成交的时间时，开始为它单独保存按时间排序的成交。
+
+        Args:
+            seq (int): 成交在成交历史中的序号。相同时间的成交按序号排序。
+        """
+        entry = self._unordered_fills.get(code)
+        if entry is None:
+            last = self._last_fills.get(code)
+            if last is None or not date < last:
+                self._last_fills[code] = date
+                return
+            codes = self.history.column('code')[:seq]
+            rows = np.flatnonzero(codes == code).tolist()
+            dates = self.history.column('datetime')
+            prices = self.history.column('price')
+            amounts = self.history.column('amount')
+            entry = self._unordered_fills[code] = [sorted((dates[i], i, prices[i], amounts[i]) for i in rows), None]
+        bisect.insort(entry[0], (date, seq, price, amount))
+        entry[1] = None
+
+    def _restore_fill_order(self):
+        """根据成交历史恢复成交时间的状态。读取保存的计算状态后调用。"""
+        self._last_fills = {}
+        self._unordered_fills = {}
+        for seq, fill in enumerate(self.history):
+            self._track_fill(seq, fill[0], fill[1], fill[2], fill[3])
+
+    def _update_hold(self, code, price, amount):
+        """成交后更新持仓账本。"""
+        self._ledger.update(code, price, amount)
+        self._hold_price_cur = None
 
     def hold_time(self, dt=None):
-        """持仓时间。根据参数 `dt` 查询截止时间之前的交易，并与当前时间计算差异。
+        """持仓时间。根据参数 `dt` 查询截止时间之前的交易，计算当前时间与每只持仓股票最后一次成交时间的差异。
 
         Args:
             dt (datetime): 交易截止时间。如果为 `None` 则表示计算所有交易。默认为 `None` 。
 
         Returns:
-            :py:class:`pandas.DataFrame`
+            :py:class:`pandas.Series`: 索引为 `code` ，只包含截止时间持有的股票。
         """
-
-        def weights(x):
-            if sum(x['amount']) != 0:
-                return pd.Timestamp(datetime.datetime.today()) - pd.to_datetime(x.datetime.max())
-            else:
-                return np.nan
-
-        if datetime is None:
-            return self.history_df.set_index(
-                'datetime',
-                drop=False
-            ).sort_index().groupby('code').apply(weights).dropna()
-        else:
-            return self.history_df.set_index(
-                'datetime',
-                drop=False
-            ).sort_index().loc[:dt].groupby('code').apply(weights).dropna()
+        last_trade = self.snapshot(dt)['last_trade']
+        return (pd.Timestamp(datetime.datetime.today()) - last_trade).rename(None)
 
     @property
     def total_assets_cur(self) -> float:
@@ -414,20 +1098,141 @@ class BackTest():
         """
         return self.available_cash + sum([x[0] * x[1] for x in self.hold_price_cur])
 
-    # def hold_table(self, datetime=None):
-    #     """到某一个时刻的持仓 如果给的是日期,则返回当日开盘前的持仓"""
-    #     if datetime is None:
-    #         hold_available = self.history_df.set_index(
-    #             'datetime'
-    #         ).sort_index().groupby('code').amount.sum().sort_index()
-    #     else:
-    #         hold_available = self.history_df.set_index(
-    #             'datetime'
-    #         ).sort_index().loc[:datetime].groupby('code').amount.sum().sort_index()
-    #
-    #     return pd.concat([self._init_hold,
-    #                       hold_available]).groupby('code').sum().sort_index(
-    #     )
+    def _fill_times(self):
+        """每笔成交的时间（纳秒整数）。只对不同的时间调用一次 :py:func:`pandas.to_datetime` 。"""
+        ids, values = self.history.encoded('datetime')
+        return pd.to_datetime(values).asi8[ids] if len(values) else np.empty(0, dtype=np.int64)
+
+    def _fill_codes(self):
+        """每笔成交的股票编号（按股票代码排序后的序号）及排序后的股票代码。"""
+        ids, values = self.history.encoded('code')
+        used = np.unique(ids)
+        order = used[np.argsort(values[used], kind='mergesort')]
+        rank = np.zeros(len(values), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        return rank[ids], values[order]
+
+    def _fill_index(self):
+        """按 (股票代码, 成交时间) 排序的成交索引。成交历史变化后重新生成。
+
+        Returns:
+            (codes, times, width, keys, qty, cost, fill_times): 已排序的股票代码、已排序的成交时间（去重）、
+            编码宽度、每笔成交的编码（ ``股票序号 * width + 时间序号 + 1`` ，升序）、
+            成交后的持仓数量、成交后的持仓金额（从最近一次空仓之后累计）、成交时间。
+        """
+        if self._fills is None:
+            code_ids, codes = self._fill_codes()
+            fill_times = self._fill_times()
+            order = np.lexsort((fill_times, code_ids))  # 同一时间保持成交顺序
+            code_ids = code_ids[order]
+            fill_times = fill_times[order]
+            amount = self.history.column('amount').astype(np.float64)[order]
+            price = self.history.column('price').astype(np.float64)[order]
+            times = np.unique(fill_times)
+            width = len(times) + 1
+            keys = code_ids.astype(np.int64) * width + np.searchsorted(times, fill_times) + 1
+            qty = pd.Series(amount).groupby(code_ids).cumsum().to_numpy()
+            # 每只股票的第一笔成交及空仓后的第一笔成交开始新的一段，持仓金额按段累计
+            start = np.ones(len(order), dtype=bool)
+            start[1:] = (code_ids[1:] != code_ids[:-1]) | (qty[:-1] == 0)
+            cost = pd.Series(price * amount).groupby(np.cumsum(start)).cumsum().to_numpy()
+            self._fills = (codes, times, width, keys, qty, cost, fill_times)
+        return self._fills
+
+    def snapshot(self, dt=None):
+        """某一时刻的持仓。
+
+        按股票代码和成交时间建立累计持仓数量及持仓金额的索引（成交历史变化后才会重建），
+        每次查询对每只股票二分查找截止时间之前的最后一笔成交，耗时为 O(股票数量 * log(成交数量)) 。
+        传入多个时间时一次完成所有查询。
+
+        Example:
+            >>> bt.snapshot('2019-06-30')
+                    amount      price last_trade
+            code
+            000001   100.0  12.340000 2019-06-12
+            >>> bt.snapshot(pd.date_range('2019-01-31', periods=12, freq='M'))
+
+        Args:
+            dt: 截止时间（包含当时的成交）。为 `None` 时返回当前持仓。也可以是多个时间组成的列表、
+                :py:class:`pandas.DatetimeIndex` 等。
+
+        Returns:
+            :py:class:`pandas.DataFrame`: 只包含持有的股票。列为 `amount` （持仓数量）、 `price` （持仓成本）、
+            `last_trade` （最后一次成交时间）。 `dt` 为单个时间时以 `code` 为索引；
+            为多个时间时以 ( `date` , `code` ) 为索引。
+        """
+        single = dt is None or np.ndim(dt) == 0
+        dates = pd.DatetimeIndex([] if dt is None else pd.to_datetime([dt] if single else list(dt)), name='date')
+        codes, times, width, keys, qty, cost, fill_times = self._fill_index()
+        # 每个查询时间之前（含）的成交时间数量
+        counts = np.full(1, len(times)) if dt is None else np.searchsorted(times, dates.asi8, side='right')
+        code_ids = np.arange(len(codes))
+        pos = np.searchsorted(keys, code_ids * width + counts[:, None], side='right') - 1  # (时间 x 股票)
+        found = pos >= 0
+        pos = np.where(found, pos, 0)
+        if len(keys):
+            found &= keys[pos] // width == code_ids
+            found &= qty[pos] != 0
+        date_ids, code_ids = np.nonzero(found)
+        pos = pos[date_ids, code_ids]
+        if single:
+            index = pd.Index(codes[code_ids], name='code')
+        else:
+            index = pd.MultiIndex.from_arrays([dates[date_ids], codes[code_ids]], names=['date', 'code'])
+        return pd.DataFrame({'amount': qty[pos],
+                             'price': cost[pos] / qty[pos],
+                             'last_trade': pd.to_datetime(fill_times[pos])},
+                            index=index,
+                            columns=['amount', 'price', 'last_trade'])
+
+    def equity_curve(self):
+        """每日资产曲线。
+
+        根据成交历史和 :py:attr:`data` 中的价格，计算每个交易日收盘后的可用资金、持仓市值及总资产。
+        持仓数量和资金变动按日期累加，价格按股票向前填充，所有日期一次计算完成。
+        只有发生过交易的股票会参与计算，因此即使行情数据包含大量股票，占用的内存也只与交易过的股票数量相关。
+
+        Returns:
+            :py:class:`pandas.DataFrame`: 以日期为索引，包含 `cash` （可用资金）、 `holdings` （持仓市值）、
+            `total` （总资产）列。
+        """
+        data = self.data
+        if data is None:
+            raise ValueError('equity_curve requires the full price data; it is not available for streamed runs.')
+        calendar = pd.DatetimeIndex(pd.to_datetime(data['date']).unique()).sort_values()
+        calendar.name = 'date'
+        n_days = len(calendar)
+        history = self.history_df
+        cash = np.full(n_days, float(self.init_cash))
+        holdings = np.zeros(n_days)
+        if not history.empty:
+            fill_days = calendar.get_indexer(pd.to_datetime(history['datetime']))
+            fill_codes, codes = pd.factorize(history['code'])
+            # 资金变动：买入为 -total ，卖出为 price*amount-commission-tax 。
+            amount = history['amount'].to_numpy(dtype=np.float64)
+            price = history['price'].to_numpy(dtype=np.float64)
+            flow = np.where(history['toward'].to_numpy() > 0,
+                            -history['total'].to_numpy(dtype=np.float64),
+                            -price * amount - history['commission'].to_numpy(dtype=np.float64) -
+                            history['tax'].to_numpy(dtype=np.float64))
+            cash = cash + np.cumsum(np.bincount(fill_days, weights=flow, minlength=n_days))
+            # 持仓数量矩阵（日期 x 股票）
+            positions = np.zeros((n_days, len(codes)))
+            np.add.at(positions, (fill_days, fill_codes), amount)
+            positions = np.cumsum(positions, axis=0)
+            # 价格矩阵（日期 x 股票），只取交易过的股票并向前填充
+            traded = data[data['code'].isin(codes)]
+            prices = np.full((n_days, len(codes)), np.nan)
+            prices[calendar.get_indexer(pd.to_datetime(traded['date'])),
+                   pd.Index(codes).get_indexer(traded['code'])] = traded[self._colname].to_numpy(dtype=np.float64)
+            last = np.where(np.isnan(prices), 0, np.arange(n_days)[:, None])
+            np.maximum.accumulate(last, axis=0, out=last)
+            prices = prices[last, np.arange(len(codes))]
+            holdings = np.where(positions != 0, positions * prices, 0).sum(axis=1)
+        return pd.DataFrame({'cash': cash, 'holdings': holdings, 'total': cash + holdings},
+                            index=calendar,
+                            columns=['cash', 'holdings', 'total'])
 
     @property
     def available_cash(self) -> float:
@@ -442,18 +1247,25 @@ class BackTest():
         """计算印花税"""
         return price * amount * self.tax_coeff
 
-    def _check_callback_buy(self, date, code, price) -> bool:
-        for cb in self._calbacks:
-            if cb.on_check_buy(date, code, price, self.available_cash):
+    def _check_callback_buy(self, date, code, price, row=None) -> bool:
+        for cb, mask in zip(self._calbacks, self._buy_masks):
+            if mask is not None and row is not None:
+                if mask[row]:
+                    return True
+            elif cb.on_check_buy(date, code, price, self.available_cash):
                 return True
         return False
 
-    def _check_callback_sell(self, date, code, price) -> bool:
-        for cb in self._calbacks:
-            hold_amount, hold_price = 0, 0
-            if not self.hold_price_cur.empty and code in self.hold_price_cur.index:
-                hold_price, hold_amount = self.hold_price_cur[code]
-            if cb.on_check_sell(date, code, price, self.available_cash, hold_amount, hold_price):
+    def _check_callback_sell(self, date, code, price, row=None) -> bool:
+        hold_amount, hold_price = 0, 0
+        hold = self._hold(code)
+        if hold is not None:
+            hold_price, hold_amount = hold
+        for cb, mask in zip(self._calbacks, self._sell_masks):
+            if mask is not None and row is not None:
+                if mask[row]:
+                    return True
+            elif cb.on_check_sell(date, code, price, self.available_cash, hold_amount, hold_price):
                 return True
         return False
 
@@ -465,93 +1277,462 @@ class BackTest():
         return 0
 
     def _calc_sell_amount(self, date, code, price) -> float:
+        hold = self._hold(code)
+        if hold is None:
+            return 0
+        hold_price, hold_amount = hold
         for cb in self._calbacks:
-            if not self.hold_price_cur.empty and code in self.hold_price_cur.index:
-                hold_price, hold_amount = self.hold_price_cur[code]
-                amount = cb.on_calc_sell_amount(date, code, price, self.available_cash, hold_amount, hold_price)
-                if amount:
-                    return amount
+            amount = cb.on_calc_sell_amount(date, code, price, self.available_cash, hold_amount, hold_price)
+            if amount:
+                return amount
         return 0
 
-    def calc_trade_history(self, verbose=0):
+    def _update_history(self, date, code, price, amount, available_cash, commission, tax, toward):
+        self._history_df = None
+        self._fills = None
+        self._track_fill(len(self.history), date, code, price, amount * toward)
+        self.history.append([
+            date,  # 时间
+            code,  # 代码
+            price,  # 成交价
+            amount * toward,  # 成交量
+            available_cash,  # 剩余现金
+            commission,  # 手续费
+            tax,  # 印花税
+            price * amount + commission + tax,  # 总金额
+            toward,  # 方向
+        ])
+
+    def _process_row(self, date, code, price, verbose=0, row=None):
+        """处理一行行情数据：依次检查买入和卖出，并记录成交。
+
+        Args:
+            row (int): 行号。用来读取回调批量判断的结果。为 `None` 时逐行调用回调判断。
+        """
+        if self._check_callback_buy(date, code, price, row):
+            self._buy(date, code, price, verbose)
+        if self._check_callback_sell(date, code, price, row):
+            self._sell(date, code, price, verbose)
+
+    def _buy(self, date, code, price, verbose=0):
+        """按回调计算的数量买入。可用资金不足时跳过。"""
+        amount = self._calc_buy_amount(date, code, price)  # 买入数量
+        commission = self._calc_commission(price, amount)
+        tax = self._calc_tax(price, amount)
+        value = price * amount + commission + tax
+        if value <= self.available_cash and amount > 0:
+            self.cash.append(self.available_cash - value)
+            self._update_history(date, code, price, amount, self.cash[-1], commission, tax, 1)
+            self._update_hold(code, price, amount)
+            if verbose > 0:
+                self._sink.emit(TradeEvent('buy', date, code, price, amount, self.cash[-1], commission, tax))
+        else:
+            if verbose > 1:
+                self._sink.emit(TradeEvent('skip_buy', date, code, price))
+
+    def _sell(self, date, code, price, verbose=0):
+        """按回调计算的数量卖出。没有持仓时跳过。"""
+        amount = self._calc_sell_amount(date, code, price)
+        if amount > 0:
+            commission = self._calc_commission(price, amount)
+            tax = self._calc_tax(price, amount)
+            value = price * amount - commission - tax
+            self.cash.append(self.available_cash + value)
+            self._update_history(date, code, price, amount, self.cash[-1], commission, tax, -1)
+            self._update_hold(code, price, -amount)
+            if verbose > 0:
+                self._sink.emit(TradeEvent('sell', date, code, price, amount, self.cash[-1], commission, tax))
+        else:
+            if verbose > 1:
+                self._sink.emit(TradeEvent('skip_sell', date, code, price))
+
+    def _process_date(self, date, rows, codes, prices, verbose=0):
+        """处理同一天的所有行情数据：先处理所有卖出，再按回调的排序处理买入。
+
+        Args:
+            rows ([int]): 行号。
+            codes (list): 股票代码。
+            prices (list): 价格。
+        """
+        candidates = []
+        for i, (row, code, price) in enumerate(zip(rows, codes, prices)):
+            if self._check_callback_sell(date, code, price, row):
+                self._sell(date, code, price, verbose)
+            if self._check_callback_buy(date, code, price, row):
+                candidates.append(i)
+        if len(candidates) > 1:
+            candidate_codes = np.array([codes[i] for i in candidates], dtype=object)
+            candidate_prices = np.array([prices[i] for i in candidates])
+            for cb in self._calbacks:
+                scores = getattr(cb, 'on_rank_buy', lambda *args: None)(date, candidate_codes, candidate_prices)
+                if scores is not None:
+                    order = np.argsort(-np.asarray(scores, dtype=np.float64), kind='mergesort')
+                    candidates = [candidates[i] for i in order]
+                    break
+        for i in candidates:
+            self._buy(date, codes[i], prices[i], verbose)
+
+    def _select_engine(self, engine, data=None):
+        """根据回调和数据类型决定 `auto` 模式实际使用的计算引擎。"""
+        if engine not in ('auto', 'array', 'iterrows', 'cross'):
+            raise ValueError('Unknown engine: {}'.format(engine))
+        if engine != 'auto':
+            return engine
+        if not all(getattr(cb, 'supports_array_engine', False) for cb in self._calbacks):
+            return 'iterrows'
+        # 全部为数值列且类型不一致时，iterrows 会把每行统一转换为同一类型（例如 int 转为 float），
+        # 这时按列读取的结果与逐行读取不一致，只能使用 iterrows 。
+        dtypes = (self.data if data is None else data).dtypes
+        if all(dt.kind in 'biuf' for dt in dtypes) and dtypes.nunique() > 1:
+            return 'iterrows'
+        return 'array'
+
+    def _prepare_batch(self, data):
+        """调用回调的批量判断，返回需要逐行处理的行号。
+
+        不支持批量判断的回调（返回 `None` ）仍然逐行调用，这时所有行都需要处理，返回 `None` 。
+        """
+        dates = data['date'].to_numpy()
+        codes = data['code'].to_numpy()
+        prices = data[self._colname].to_numpy()
+
+        def check(mask, name):
+            if mask is None:
+                return None
+            mask = np.asarray(mask, dtype=bool)
+            if mask.shape != (len(data),):
+                raise ValueError('{} returned {} values, expected {}.'.format(name, mask.size, len(data)))
+            return mask
+
+        self._buy_masks = [check(getattr(cb, 'on_check_buy_batch', lambda *args: None)(dates, codes, prices),
+                                 'on_check_buy_batch') for cb in self._calbacks]
+        self._sell_masks = [check(getattr(cb, 'on_check_sell_batch', lambda *args: None)(dates, codes, prices),
+                                  'on_check_sell_batch') for cb in self._calbacks]
+        masks = self._buy_masks + self._sell_masks
+        if not masks or any(mask is None for mask in masks):
+            return None
+        return np.flatnonzero(np.logical_or.reduce(masks))
+
+    def _clear_batch(self):
+        self._buy_masks = [None] * len(self._calbacks)
+        self._sell_masks = [None] * len(self._calbacks)
+
+    def _run_iterrows(self, data, verbose, progress):
+        self._clear_batch()
+        rows = data.iterrows()
+        for begin, end in _chunks(len(data), progress.step):
+            for index, row in itertools.islice(rows, end - begin):
+                self._process_row(row['date'], row['code'], row[self._colname], verbose)
+            progress.update(end - begin)
+
+    def _run_array(self, data, verbose, progress):
+        start = time.perf_counter()
+        rows = self._prepare_batch(data)
+        try:
+            # 一次性取出需要的列。 `tolist` 返回的元素类型与 `iterrows` 中取到的一致（例如 datetime64 列返回 Timestamp）。
+            if rows is None:
+                rows = range(len(data))
+                dates = data['date'].tolist()
+                codes = data['code'].tolist()
+                prices = data[self._colname].tolist()
+            else:
+                # 所有回调都给出了批量判断，只需要取出并处理有信号的行。
+                dates = data['date'].take(rows).tolist()
+                codes = data['code'].take(rows).tolist()
+                prices = data[self._colname].take(rows).tolist()
+                rows = rows.tolist()
+            if self.stats is not None:
+                self.stats.add('prepare', time.perf_counter() - start)
+            done = 0
+            for begin, end in _chunks(len(rows), progress.step):
+                for row, date, code, price in zip(rows[begin:end], dates[begin:end], codes[begin:end],
+                                                  prices[begin:end]):
+                    self._process_row(date, code, price, verbose, row)
+                # 进度按行情数据的行数计算，跳过的无信号行也计入
+                position = rows[end - 1] + 1
+                progress.update(position - done)
+                done = position
+            if done < len(data):
+                progress.update(len(data) - done)
+        finally:
+            self._clear_batch()
+
+    def _run_cross(self, data, verbose, progress):
+        start = time.perf_counter()
+        rows = self._prepare_batch(data)
+        try:
+            all_days = pd.to_datetime(data['date']).to_numpy()
+            if rows is None:
+                rows = np.arange(len(data))
+            # 按日期稳定排序，同一天内保持行情数据中的顺序
+            rows = rows[np.argsort(all_days[rows], kind='mergesort')]
+            days = all_days[rows]
+            dates = data['date'].take(rows).tolist()
+            codes = data['code'].take(rows).tolist()
+            prices = data[self._colname].take(rows).tolist()
+            bounds = np.r_[0, np.flatnonzero(days[1:] != days[:-1]) + 1, len(rows)] if len(rows) else np.zeros(1, int)
+            # 进度按行情数据的行数计算：处理完某一天时，当天及之前的行都视为已处理
+            positions = np.searchsorted(np.sort(all_days), days[bounds[1:] - 1], side='right').tolist()
+            bounds = bounds.tolist()
+            rows = rows.tolist()
+            if self.stats is not None:
+                self.stats.add('prepare', time.perf_counter() - start)
+            done = 0
+            for begin, end, position in zip(bounds[:-1], bounds[1:], positions):
+                self._process_date(dates[begin], rows[begin:end], codes[begin:end], prices[begin:end], verbose)
+                progress.update(position - done)
+                done = position
+            progress.update(len(data) - done)
+        finally:
+            self._clear_batch()
+
+    def _run_engine(self, data, verbose, engine, progress):
+        if engine == 'array':
+            self._run_array(data, verbose, progress)
+        elif engine == 'cross':
+            self._run_cross(data, verbose, progress)
+        else:
+            self._run_iterrows(data, verbose, progress)
+
+    def _run(self, data, verbose, engine, progress):
+        engine = self._select_engine(engine, data)
+        with self._instrumented():
+            self._run_engine(data, verbose, engine, progress)
+        if not data.empty:
+            last_date = pd.to_datetime(data['date']).max()
+            if self._last_date is None or last_date > self._last_date:
+                self._last_date = last_date
+
+    _instrumented_phases = (('_process_row', 'process_row'),
+                            ('_process_date', 'process_row'),
+                            ('_update_hold', 'ledger'),
+                            ('_update_history', 'history'))
+
+    @contextlib.contextmanager
+    def _instrumented(self):
+        """统计耗时的计算。计算期间临时替换回调及内部方法，计算完成后恢复。没有开启统计时不做任何处理。"""
+        stats = self.stats
+        if stats is None:
+            yield
+            return
+        callbacks = self._calbacks
+        self._calbacks = [_TimedCallBack(cb, stats, '{}[{}]'.format(type(cb).__name__, i))
+                          for i, cb in enumerate(callbacks)]
+        for method, phase in self._instrumented_phases:
+            setattr(self, method, stats.wrap(getattr(self, method), phase))
+        before = {name: stats.seconds.get(name, 0.0) for name in ('prepare', 'process_row')}
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._calbacks = callbacks
+            for method, phase in self._instrumented_phases:
+                del self.__dict__[method]
+            stats.add('run', elapsed)
+            stats.add('progress', elapsed - sum(stats.seconds.get(name, 0.0) - value for name, value in before.items()))
+
+    def calc_trade_history(self, verbose=0, engine='auto', progress=None, sink=None, cache=None):
         """计算交易记录
 
         Args:
-            verbose (int): 是否显示计算过程。0（不显示），1（显示部分），2（显示全部）。默认为0。
-        """
-
-        def update_history(history, date, code, price, amount, available_cash, commission, tax, toward):
-            history.append([
-                date,  # 时间
-                code,  # 代码
-                price,  # 成交价
-                amount * toward,  # 成交量
-                available_cash,  # 剩余现金
-                commission,  # 手续费
-                tax,  # 印花税
-                price * amount + commission + tax,  # 总金额
-                toward,  # 方向
-            ])
-
-        for index, row in tqdm(self.data.iterrows()):
-            date = row['date']
-            code = row['code']
-            price = row['close']  # 价格
-            if self._check_callback_buy(date, code, price):
-                amount = self._calc_buy_amount(date, code, price)  # 买入数量
-                commission = self._calc_commission(price, amount)
-                tax = self._calc_tax(price, amount)
-                value = price * amount + commission + tax
-                if value <= self.available_cash and amount > 0:
-                    self.cash.append(self.available_cash - value)
-                    update_history(self.history,
-                                   date,
-                                   code,
-                                   price,
-                                   amount,
-                                   self.cash[-1],
-                                   commission,
-                                   tax,
-                                   1, )
-                    self._update_hold_price_cur()
-                    if verbose > 0:
-                        print('{:%Y-%m-%d} {} 买入 {:.2f}/{:.2f}，剩余资金 {:.2f}'.format(date, code, price, amount,
-                                                                                   self.available_cash))
-                else:
-                    if verbose > 1:
-                        print('{:%Y-%m-%d} {} {:.2f} 可用资金不足，跳过购买。'.format(date, code, price))
-            if self._check_callback_sell(date, code, price):
-                amount = self._calc_sell_amount(date, code, price)
-                if amount > 0:
-                    commission = self._calc_commission(price, amount)
-                    tax = self._calc_tax(price, amount)
-                    value = price * amount - commission - tax
-                    self.cash.append(self.available_cash + value)
-                    update_history(self.history,
-                                   date,
-                                   code,
-                                   price,
-                                   amount,
-                                   self.cash[-1],
-                                   commission,
-                                   tax,
-                                   -1, )
-                    self._update_hold_price_cur()
-                    if verbose > 0:
-                        print('{:%Y-%m-%d} {} 卖出 {:.2f}/{:.2f}，剩余资金 {:.2f}'.format(date, code, price, amount,
-                                                                                   self.available_cash))
-                else:
-                    if verbose > 1:
-                        print('{:%Y-%m-%d} {} 没有持仓，跳过卖出。'.format(date, code))
+            verbose (int): 是否显示计算过程。0（不显示），1（显示买入、卖出），2（还显示跳过的买入、卖出）。默认为0。
+            engine (str): 计算引擎。默认为 `auto` 。
+
+                * `iterrows` : 使用 :py:meth:`pandas.DataFrame.iterrows` 逐行计算。
+                * `array` : 一次性取出 `date` 、 `code` 及价格列，按数组逐行计算。结果与 `iterrows` 相同，但速度快很多。
+                  计算前会调用回调的 :py:meth:`CallBack.on_check_buy_batch` 及 :py:meth:`CallBack.on_check_sell_batch` ，
+                  当所有回调都支持批量判断时，只处理有买入或卖出信号的行。
+                * `auto` : 当所有回调的 :py:attr:`CallBack.supports_array_engine` 都为 `True` 时使用 `array` ，
+                  否则使用 `iterrows` 。
+                * `cross` : 按日期排序后逐日处理当天的所有股票：先处理所有卖出，再处理买入。
+                  买入的顺序由回调的 :py:meth:`CallBack.on_rank_buy` 决定，可用资金不足时先买入排名靠前的股票。
+                  行情数据没有按日期排序（例如多只股票依次拼接）时，资金也会按日期先后使用。
+                  同一股票同一天既有买入又有卖出信号时，先卖后买，因此结果可能与其他引擎不同。
+            progress: 进度显示。默认为 `None` ，在终端或 Jupyter 中显示进度条，否则不显示。
+                参考 :py:func:`finance_tools_py.progress.get_progress` 。
+            sink: 交易事件的处理对象。默认为 `None` ， `verbose` 大于 `0` 时打印事件文本。
+                参考 :py:mod:`finance_tools_py.events` 。
+            cache: 结果缓存。可以是 :py:class:`finance_tools_py.cache.ResultCache` 或缓存目录。默认为 `None` ，不使用缓存。
+                行情数据、交易参数、回调配置及计算引擎都相同时直接读取上次的结果，不再调用回调。
+                只有尚未计算过并且不生成交易事件（ `verbose` 为 `0` 且没有指定 `sink` ）时才使用缓存。
+        """
+        key = None
+        if cache is not None and verbose == 0 and sink is None and self._is_initial():
+            cache = get_cache(cache)
+            key = fingerprint(self, self._select_engine(engine))
+            if key is not None and cache.load(self, key):
+                self._calced = True
+                return
+        verbose, self._sink = get_sink(sink, verbose)
+        progress = get_progress(progress)
+        progress.start(len(self.data))
+        try:
+            self._run(self.data, verbose, engine, progress)
+        finally:
+            progress.close()
         if verbose > 0:
-            print('计算完成！')
+            self._sink.emit(TradeEvent('finish'))
+        self._calced = True
+        if key is not None:
+            cache.store(self, key)
+
+    def _is_initial(self):
+        """是否尚未计算过（没有成交、持仓，资金为初始资金）。"""
+        return not self._calced and self._last_date is None and len(self.history) == 0 and \
+            len(self._ledger) == 0 and self.cash == [self.init_cash]
+
+    def calc_trade_history_stream(self, chunks, verbose=0, engine='auto', progress=None, sink=None):
+        """分块计算交易记录。
+
+        依次计算每一块行情数据，资金、持仓及成交历史在块之间延续，结果与把所有数据合并后调用
+        :py:meth:`calc_trade_history` 相同。计算过程中只保留当前块的数据，不会保存到 :py:attr:`data` 中，
+        占用的内存只与单块数据的大小及持仓、成交数量相关。
+
+        Example:
+            >>> bt = BackTest(None, init_cash=50000, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+            >>> bt.calc_trade_history_stream(pd.read_csv('market.csv', parse_dates=['date'], dtype={'code': str},
+            >>>                                          chunksize=1000000))
+            >>> print(bt.report())
+
+        Args:
+            chunks: 按时间排序的 :py:class:`pandas.DataFrame` 序列（例如 :py:func:`pandas.read_csv` 指定 `chunksize`
+                参数时返回的迭代器，或者逐块读取的 Parquet 文件）。每一块的格式与 :py:attr:`data` 相同。
+            verbose (int): 是否显示计算过程。参考 :py:meth:`calc_trade_history` 。
+            engine (str): 计算引擎。参考 :py:meth:`calc_trade_history` 。
+            progress: 进度显示。参考 :py:meth:`calc_trade_history` 。总行数未知，只显示已处理的行数。
+            sink: 交易事件的处理对象。参考 :py:meth:`calc_trade_history` 。
+        """
+        verbose, self._sink = get_sink(sink, verbose)
+        progress = get_progress(progress)
+        progress.start()
+        try:
+            for chunk in chunks:
+                if chunk.empty:
+                    continue
+                self._run(chunk, verbose, engine, progress)
+                self._update_data_info(chunk)
+        finally:
+            progress.close()
+        if verbose > 0:
+            self._sink.emit(TradeEvent('finish'))
+        self._calced = True
+
+    def _update_data_info(self, chunk):
+        """记录已经分块计算过的数据的起止时间和交易天数。"""
+        dates = set(chunk['date'].unique())
+        if self._data_info is None:
+            self._data_info = [chunk['date'].iloc[0], chunk['date'].iloc[-1], len(dates), dates]
+        else:
+            # 数据按时间排序，只有上一块的日期可能出现在当前块中
+            self._data_info[1] = chunk['date'].iloc[-1]
+            self._data_info[2] = self._data_info[2] + len(dates - self._data_info[3])
+            self._data_info[3] = dates
+
+    def _data_range(self):
+        """数据的起止时间及交易天数。"""
+        if self.data is not None:
+            return self.data.iloc[0]['date'], self.data.iloc[-1]['date'], len(self.data['date'].unique())
+        if self._data_info is None:
+            return None, None, 0
+        return tuple(self._data_info[:3])
+
+    def save_checkpoint(self, path):
+        """保存计算状态。
+
+        保存资金、持仓、成交历史及已经计算过的最后时间等状态，不保存行情数据和回调。
+        文件使用 gzip 压缩的 pickle 格式，只应读取自己保存的文件。
+
+        Args:
+            path (str): 文件路径。
+        """
+        first, last, days = self._data_range()
+        state = {
+            'version': 1,
+            'params': {
+                'init_cash': self.init_cash,
+                'tax_coeff': self.tax_coeff,
+                'commission_coeff': self.commission_coeff,
+                'min_commission': self.min_commission,
+                'col_name': self._colname,
+            },
+            'cash': self.cash,
+            'history': self.history,
+            'ledger': self._ledger,
+            'data_info': [first, last, days, {last}],
+            'last_date': self._last_date,
+            'calced': self._calced,
+        }
+        with gzip.open(path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load_checkpoint(cls, path, callbacks=[CallBack()]):
+        """从 :py:meth:`save_checkpoint` 保存的文件恢复计算状态。
+
+        恢复后 :py:attr:`data` 为 `None` ，可以通过 :py:meth:`append` 继续计算新的行情数据。
+
+        Args:
+            path (str): 文件路径。
+            callbacks ([:py:class:`finance_tools_py.backtest.CallBack`]): 回调函数集合。
+
+        Returns:
+            :py:class:`finance_tools_py.backtest.BackTest`
+        """
+        with gzip.open(path, 'rb') as f:
+            state = pickle.load(f)
+        bt = cls(None, callbacks=callbacks, **state['params'])
+        bt.cash = state['cash']
+        bt.history = state['history']
+        bt._ledger = state['ledger']
+        bt._data_info = state['data_info']
+        bt._last_date = state['last_date']
+        bt._calced = state['calced']
+        bt._restore_fill_order()
+        return bt
+
+    def append(self, new_data, verbose=0, engine='auto', progress=None, sink=None):
+        """在已有的计算结果上继续计算新的行情数据。
+
+        只计算 `new_data` 中晚于已经计算过的最后时间的数据，因此每天更新时只需要传入最新的行情数据。
+        如果 :py:attr:`data` 不为 `None` ，新数据会被追加到 :py:attr:`data` 中。
+
+        Example:
+            >>> bt = BackTest.load_checkpoint('backtest.ckpt', callbacks=[AHundredChecker(buy_dict, sell_dict)])
+            >>> bt.append(today_data)
+            >>> bt.save_checkpoint('backtest.ckpt')
+
+        Args:
+            new_data (:py:class:`pandas.DataFrame`): 新的行情数据。格式与 :py:attr:`data` 相同。
+            verbose (int): 是否显示计算过程。参考 :py:meth:`calc_trade_history` 。
+            engine (str): 计算引擎。参考 :py:meth:`calc_trade_history` 。
+            progress: 进度显示。参考 :py:meth:`calc_trade_history` 。
+            sink: 交易事件的处理对象。参考 :py:meth:`calc_trade_history` 。
+        """
+        verbose, self._sink = get_sink(sink, verbose)
+        if self._last_date is not None and not new_data.empty:
+            new_data = new_data[(pd.to_datetime(new_data['date']) > self._last_date).to_numpy()]
+        if new_data.empty:
+            return
+        if self.data is not None:
+            self.data = pd.concat([self.data, new_data], ignore_index=True)
+        else:
+            self._update_data_info(new_data)
+        progress = get_progress(progress)
+        progress.start(len(new_data))
+        try:
+            self._run(new_data, verbose, engine, progress)
+        finally:
+            progress.close()
+        if verbose > 0:
+            self._sink.emit(TradeEvent('finish'))
         self._calced = True
 
     def _calc_total_tax(self) -> float:
-        return np.asarray(self.history).T[6].sum() if len(self.history) > 0 else 0
+        return self.history.total_tax
 
     def _calc_total_commission(self) -> float:
-        return np.asarray(self.history).T[5].sum() if len(self.history) > 0 else 0
+        return self.history.total_commission
 
     def report(self):
         """获取计算结果
@@ -563,8 +1744,7 @@ class BackTest():
         if not self._calced:
             result = '没有经过计算。请先调用 `calc_trade_history` 方法进行计算。'
             return result
-        result = '数据时间:{}~{}（可交易天数{}）'.format(self.data.iloc[0]['date'], self.data.iloc[-1]['date'],
-                                              len(self.data['date'].unique()))
+        result = '数据时间:{}~{}（可交易天数{}）'.format(*self._data_range())
         result = result + '\n初始资金:{:.2f}'.format(self.init_cash)
         result = result + '\n交易次数:{} (买入/卖出各算1次)'.format(len(self.history))
         result = result + '\n可用资金:{:.2f}'.format(self.available_cash)
@@ -580,4 +1760,170 @@ class BackTest():
         result = result + '\n总印花税:{:.2f}'.format(self._calc_total_tax())
         result = result + '\n交易历史：\n'
         result = result + self.history_df.sort_values('datetime').to_string()
+        if self.stats is not None and self.stats.seconds:
+            result = result + '\n耗时统计：\n' + self.stats.to_frame().to_string()
         return result
+
+
+class MultiBackTest():
+    """在一次遍历行情数据的过程中同时计算多个相互独立的回测（账户）。
+
+    每个账户都是一个 :py:class:`BackTest` ，拥有自己的回调、资金、持仓及成交历史，计算结果与分别调用
+    :py:meth:`BackTest.calc_trade_history` 相同。行情数据只取出和遍历一次，比较多个策略时可以节省大部分遍历的耗时。
+
+    `instrument` 为 `True` 的账户同样会在 :py:attr:`BackTest.stats` 中统计耗时。所有账户共用一次遍历，
+    因此其中的 `run` 及 `progress` 也包含处理其他账户的耗时。
+
+    Example:
+        >>> mbt = MultiBackTest(data, {
+        >>>     'ahundred': {'init_cash': 50000, 'callbacks': [AHundredChecker(buy_dict, sell_dict)]},
+        >>>     'allin': {'init_cash': 50000, 'callbacks': [AllInChecker(buy_dict, sell_dict)]},
+        >>> })
+        >>> mbt.calc_trade_history()
+        >>> print(mbt.summary())
+        >>> print(mbt.books['allin'].report())
+    """
+
+    def __init__(self, data, books, col_name='close'):
+        """初始化
+
+        Args:
+            data (:py:class:`pandas.DataFrame`): 行情数据。与 :py:class:`BackTest` 相同，也可以是数组字典等按列保存的数据。
+            books (dict): 账户。key值为账户名称，value值为 :py:class:`BackTest` 或创建 :py:class:`BackTest` 的参数字典。
+                直接传入的 :py:class:`BackTest` 的 :py:attr:`BackTest.data` 会被替换为 `data` 。
+            col_name (str): 由参数字典创建账户时默认使用的价格列名。
+        """
+        if not isinstance(data, pd.DataFrame):
+            data = to_frame(data, col_name)
+        self.data = data
+        self.books = {}
+        for name, book in books.items():
+            if isinstance(book, dict):
+                book = BackTest(data, **dict({'col_name': col_name}, **book))
+            else:
+                book.data = data
+            self.books[name] = book
+
+    def calc_trade_history(self, verbose=0, engine='auto', progress=None, sink=None):
+        """计算所有账户的交易记录。
+
+        Args:
+            verbose (int): 参考 :py:meth:`BackTest.calc_trade_history` 。
+            engine (str): 参考 :py:meth:`BackTest.calc_trade_history` 。为 `auto` 时，只有所有账户都可以使用 `array`
+                才会使用 `array` 。
+            progress: 进度显示。参考 :py:meth:`BackTest.calc_trade_history` 。
+            sink: 交易事件的处理对象。参考 :py:meth:`BackTest.calc_trade_history` 。
+                也可以是以账户名称为key值的字典，为每个账户指定不同的处理对象。
+        """
+        if engine == 'cross':
+            raise ValueError('MultiBackTest does not support the cross engine.')
+        data = self.data
+        books = list(self.books.items())
+        if {book._select_engine(engine, data) for name, book in books} == {'array'}:
+            engine = 'array'
+        elif engine == 'auto':
+            engine = 'iterrows'
+        levels = []
+        for name, book in books:
+            level, book._sink = get_sink(sink.get(name) if isinstance(sink, dict) else sink, verbose)
+            levels.append(level)
+        progress = get_progress(progress)
+        progress.start(len(data))
+        try:
+            with contextlib.ExitStack() as stack:
+                for name, book in books:
+                    stack.enter_context(book._instrumented())
+                if engine == 'array':
+                    self._run_array(levels, progress)
+                else:
+                    self._run_iterrows(levels, progress)
+        finally:
+            progress.close()
+            for name, book in books:
+                book._clear_batch()
+        last_date = pd.to_datetime(data['date']).max() if not data.empty else None
+        for (name, book), level in zip(books, levels):
+            if last_date is not None and (book._last_date is None or last_date > book._last_date):
+                book._last_date = last_date
+            if level > 0:
+                book._sink.emit(TradeEvent('finish'))
+            book._calced = True
+
+    def _run_iterrows(self, levels, progress):
+        books = list(self.books.values())
+        for book in books:
+            book._clear_batch()
+        plan = list(zip(books, levels))
+        rows = self.data.iterrows()
+        for begin, end in _chunks(len(self.data), progress.step):
+            for index, row in itertools.islice(rows, end - begin):
+                date = row['date']
+                code = row['code']
+                for book, level in plan:
+                    book._process_row(date, code, row[book._colname], level)
+            progress.update(end - begin)
+
+    def _run_array(self, levels, progress):
+        data = self.data
+        books = list(self.books.values())
+        # 每个账户需要处理的行。为 None 时需要处理所有行
+        masks = []
+        for book in books:
+            start = time.perf_counter()
+            rows = book._prepare_batch(data)
+            if rows is not None:
+                rows = set(rows.tolist())
+            masks.append(rows)
+            if book.stats is not None:
+                book.stats.add('prepare', time.perf_counter() - start)
+        if any(mask is None for mask in masks):
+            rows = None
+        else:
+            rows = np.array(sorted(set().union(*masks)), dtype=np.int64)
+
+        def take(col):
+            return data[col].tolist() if rows is None else data[col].take(rows).tolist()
+
+        dates = take('date')
+        codes = take('code')
+        prices = {}
+        for book in books:
+            if book._colname not in prices:
+                prices[book._colname] = take(book._colname)
+        plan = [(book, level, mask, prices[book._colname]) for book, level, mask in zip(books, levels, masks)]
+        rows = range(len(data)) if rows is None else rows.tolist()
+        done = 0
+        for begin, end in _chunks(len(rows), progress.step):
+            for i in range(begin, end):
+                row = rows[i]
+                for book, level, mask, price in plan:
+                    if mask is None or row in mask:
+                        book._process_row(dates[i], codes[i], price[i], level, row)
+            position = rows[end - 1] + 1
+            progress.update(position - done)
+            done = position
+        if done < len(data):
+            progress.update(len(data) - done)
+
+    def summary(self):
+        """所有账户的计算结果。
+
+        Returns:
+            :py:class:`pandas.DataFrame`: 每个账户一行，以账户名称为索引。包含 `total_assets` （总资产）、
+            `cash` （可用资金）、 `trades` （交易次数）、 `commission` （总手续费）、 `tax` （总印花税）列。
+        """
+        return pd.DataFrame([[book.total_assets_cur,
+                              book.available_cash,
+                              len(book.history),
+                              book._calc_total_commission(),
+                              book._calc_total_tax()] for book in self.books.values()],
+                            index=pd.Index(list(self.books.keys()), name='book'),
+                            columns=['total_assets', 'cash', 'trades', 'commission', 'tax'])
+
+    def report(self):
+        """获取所有账户的计算结果。参考 :py:meth:`BackTest.report` 。
+
+        Returns:
+            str: 按账户依次输出的计算结果。
+        """
+        return '\n\n'.join('账户:{}\n{}'.format(name, book.report()) for name, book in self.books.items())
@@ -0,0 +1,257 @@
+"""离线性能测试。
+
+使用固定随机种子生成的模拟行情和买卖信号，测试 :py:class:`finance_tools_py.backtest.BackTest`
+及 :py:mod:`finance_tools_py.simulation` 中回调的耗时和内存峰值，结果保存为 JSON 文件，
+可以用 :py:func:`compare` 对比两个版本的结果，找出性能下降的部分。
+
+Example:
+    命令行运行::
+
+        python -m finance_tools_py.benchmark --sizes small medium --output bench.json
+        python -m finance_tools_py.benchmark --sizes small medium --output new.json --baseline bench.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import finance_tools_py
+from finance_tools_py.backtest import AHundredChecker
+from finance_tools_py.backtest import AllInChecker
+from finance_tools_py.backtest import BackTest
+
+SIZES = {
+    'tiny': (4, 250),  # 1千行
+    'small': (10, 1000),  # 1万行
+    'medium': (100, 1000),  # 10万行
+    'large': (500, 2000),  # 100万行
+    'xlarge': (5000, 2000),  # 1000万行
+}
+"""预设的数据规模。value值为 (股票数量, 交易天数) 。"""
+
+
+def make_market(n_codes=10, n_days=250, seed=0, signal_rate=0.02, start='2005-01-04'):
+    """生成模拟行情和买卖信号。
+
+    价格为对数正态的随机游走，每只股票的起始价格不同。数据按时间排序，同一天内按股票代码排序。
+    相同的参数总是生成相同的数据。
+
+    Args:
+        n_codes (int): 股票数量。
+        n_days (int): 交易天数（工作日）。
+        seed (int): 随机种子。
+        signal_rate (float): 每只股票每天出现买入信号（或卖出信号）的概率。
+        start (str): 开始日期。
+
+    Returns:
+        (:py:class:`pandas.DataFrame`, dict, dict): 行情数据（包含 `date` 、 `code` 、 `open` 、 `high` 、 `low` 、
+        `close` 、 `volume` 列）、买入信号字典、卖出信号字典。信号字典可以直接用于
+        :py:class:`finance_tools_py.backtest.AHundredChecker` 。
+    """
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range(start, periods=n_days)
+    codes = np.array(['{:06d}'.format(i) for i in range(n_codes)], dtype=object)
+    base = rng.uniform(3, 100, n_codes)[:, None]
+    close = base * np.exp(np.cumsum(rng.normal(0, 0.02, (n_codes, n_days)), axis=1))
+    prev = np.concatenate([base, close[:, :-1]], axis=1)
+    open_ = prev * (1 + rng.normal(0, 0.005, (n_codes, n_days)))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.005, (n_codes, n_days))))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.005, (n_codes, n_days))))
+    volume = rng.randint(1000, 1000000, (n_codes, n_days))
+    data = pd.DataFrame({
+        'date': np.tile(dates.values, n_codes).reshape(n_codes, n_days).T.ravel(),
+        'code': np.repeat(codes[None, :], n_days, axis=0).ravel(),
+        'open': np.round(open_.T.ravel(), 2),
+        'high': np.round(high.T.ravel(), 2),
+        'low': np.round(low.T.ravel(), 2),
+        'close': np.round(close.T.ravel(), 2),
+        'volume': volume.T.ravel(),
+    })
+    buys = rng.rand(n_codes, n_days) < signal_rate
+    sells = rng.rand(n_codes, n_days) < signal_rate
+    buy_dict = {codes[i]: dates[buys[i]] for i in range(n_codes)}
+    sell_dict = {codes[i]: dates[sells[i]] for i in range(n_codes)}
+    return data, buy_dict, sell_dict
+
+
+def _measure(func, memory):
+    """返回 (耗时, 内存峰值, 返回值)。统计内存时会重复执行一次，避免 tracemalloc 影响耗时。"""
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return seconds, peak, result
+
+
+def _backtest_phases(data, buy_dict, sell_dict, engine, checker, memory):
+    checker = {'ahundred': AHundredChecker, 'allin': AllInChecker}[checker]
+
+    def run():
+        bt = BackTest(data, init_cash=1000000, callbacks=[checker(buy_dict, sell_dict)])
+        bt.calc_trade_history(engine=engine, progress=False)
+        return bt
+
+    seconds, peak, bt = _measure(run, memory)
+    yield 'calc_trade_history', seconds, peak, {'trades': len(bt.history)}
+
+    def history_df():
+        bt._history_df = None  # 测试生成 DataFrame 的耗时，而不是读取缓存
+        return bt.history_df
+
+    seconds, peak, _ = _measure(history_df, memory)
+    yield 'history_df', seconds, peak, {}
+    seconds, peak, _ = _measure(bt.report, memory)
+    yield 'report', seconds, peak, {}
+
+
+def _simulation_phases(data, memory, max_codes=10):
+    """依次对每只股票调用 :py:class:`finance_tools_py.simulation.Simulation` 默认使用的回调。"""
+    try:
+        from finance_tools_py import simulation
+    except ImportError as e:
+        yield 'simulation', None, None, {'skipped': str(e)}
+        return
+    callbacks = [simulation.CallBack_Bolling(30, 2.6, 2.6, 0.3, 0.3),
+                 simulation.CallBack_Pandas_Rolling(30, 250),
+                 simulation.CallBack_Linear_Angle('MEAN', [60, 30, 10, 5, 3]),
+                 simulation.CallBack_CalcTradePoint()]
+    frames = [(code, df.reset_index(drop=True)) for code, df in data.groupby('code', sort=True)][:max_codes]
+    totals = {type(cb).__name__: 0.0 for cb in callbacks}
+    for code, df in frames:
+        context = {}
+        for cb in callbacks:
+            seconds, peak, _ = _measure(lambda: cb.on_preparing_data(code, df, context), False)
+            totals[type(cb).__name__] += seconds
+    for cb in callbacks:
+        name = type(cb).__name__
+        peak = None
+        if memory and frames:
+            code, df = frames[0]
+            context = {}
+            for prepare in callbacks[:callbacks.index(cb)]:
+                prepare.on_preparing_data(code, df, context)
+            _, peak, _ = _measure(lambda: cb.on_preparing_data(code, df, context), True)
+        yield 'simulation.' + name, totals[name], peak, {'codes': len(frames)}
+
+
+def run_benchmarks(sizes=('tiny', 'small'),
+                   engines=('array',),
+                   checkers=('ahundred',),
+                   seed=0,
+                   memory=True,
+                   simulation=True,
+                   output=None):
+    """运行性能测试。
+
+    Args:
+        sizes ([str or (int, int)]): 数据规模。可以是 :py:data:`SIZES` 中的名称，也可以是 (股票数量, 交易天数) 。
+        engines ([str]): 需要测试的计算引擎。参考 :py:meth:`finance_tools_py.backtest.BackTest.calc_trade_history` 。
+        checkers ([str]): 需要测试的回调。 `ahundred` （ :py:class:`finance_tools_py.backtest.AHundredChecker` ）或
+            `allin` （ :py:class:`finance_tools_py.backtest.AllInChecker` ）。
+        seed (int): 生成模拟数据的随机种子。
+        memory (bool): 是否统计内存峰值。
+        simulation (bool): 是否测试 :py:mod:`finance_tools_py.simulation` 中的回调。
+            依赖的模块无法导入时会记录为跳过。
+        output (str): 结果文件路径。为 `None` 时不保存。
+
+    Returns:
+        dict: 包含 `meta` （运行环境）和 `results` （每项测试一条记录）。
+    """
+    results = []
+    for size in sizes:
+        name, (n_codes, n_days) = (size, SIZES[size]) if isinstance(size, str) else ('{}x{}'.format(*size), size)
+        data, buy_dict, sell_dict = make_market(n_codes, n_days, seed=seed)
+        base = {'size': name, 'codes': n_codes, 'days': n_days, 'rows': len(data)}
+        for engine in engines:
+            for checker in checkers:
+                for phase, seconds, peak, extra in _backtest_phases(data, buy_dict, sell_dict, engine, checker,
+                                                                    memory):
+                    results.append(dict(base, engine=engine, checker=checker, phase=phase, seconds=seconds,
+                                        peak_memory=peak, **extra))
+        if simulation:
+            for phase, seconds, peak, extra in _simulation_phases(data, memory):
+                results.append(dict(base, engine='', checker='', phase=phase, seconds=seconds,
+                                    peak_memory=peak, **extra))
+    report = {
+        'meta': {
+            'version': finance_tools_py.__version__,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'seed': seed,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
+
+
+def compare(baseline, current, threshold=0.2):
+    """对比两次性能测试的结果。
+
+    Args:
+        baseline (dict or str): 基准结果或结果文件路径。
+        current (dict or str): 当前结果或结果文件路径。
+        threshold (float): 耗时增加超过这个比例时标记为性能下降。默认为 `0.2` 。
+
+    Returns:
+        :py:class:`pandas.DataFrame`: 每项测试一行，包含 `baseline` 、 `current` （耗时）、 `ratio` （当前/基准）
+        及 `regression` （是否性能下降）列。
+    """
+    frames = []
+    for report in (baseline, current):
+        if isinstance(report, str):
+            with open(report, encoding='utf-8') as f:
+                report = json.load(f)
+        frame = pd.DataFrame(report['results'])
+        frame = frame[frame['seconds'].notnull()]
+        frames.append(frame.set_index(['size', 'engine', 'checker', 'phase'])['seconds'])
+    result = pd.concat(frames, axis=1, keys=['baseline', 'current'], join='inner')
+    result['ratio'] = result['current'] / result['baseline']
+    result['regression'] = result['ratio'] > 1 + threshold
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='finance-tools-py benchmark')
+    parser.add_argument('--sizes', nargs='+', default=['tiny', 'small'],
+                        help='数据规模，可以是 {} 或 股票数量x交易天数'.format('/'.join(SIZES)))
+    parser.add_argument('--engines', nargs='+', default=['array'])
+    parser.add_argument('--checkers', nargs='+', default=['ahundred'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='不统计内存峰值')
+    parser.add_argument('--no-simulation', action='store_true', help='不测试 simulation 中的回调')
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--baseline', help='与指定的结果文件对比')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args(argv)
+    sizes = [s if s in SIZES else tuple(int(x) for x in s.split('x')) for s in args.sizes]
+    report = run_benchmarks(sizes, args.engines, args.checkers, args.seed, not args.no_memory,
+                            not args.no_simulation, args.output)
+    print(pd.DataFrame(report['results']).to_string())
+    if args.baseline:
+        result = compare(args.baseline, report, args.threshold)
+        print(result.to_string())
+        return 1 if result['regression'].any() else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""回测结果的本地缓存。
+
+以行情数据、交易参数及回调配置的哈希值作为键，把 :py:meth:`finance_tools_py.backtest.BackTest.calc_trade_history`
+的计算结果（资金明细、持仓、成交历史及汇总指标）保存在本地目录中。相同的回测再次计算时直接读取结果。
+
+* 行情数据按列计算哈希：数值、时间列直接使用内存中的数据，其他列使用 :py:func:`pandas.util.hash_pandas_object` 。
+* 回调配置由 :py:meth:`finance_tools_py.backtest.CallBack.cache_key` 提供，回调类（包括基类）方法的字节码及常量也会计入，
+  修改回调的代码后不会读到旧的结果。
+* 键中包含 :py:data:`finance_tools_py.__version__` ，升级后不会使用旧版本计算的结果。
+* 回调配置中出现无法确定哈希值的类型（例如函数、自定义对象）时不使用缓存。
+* 缓存文件为 gzip 压缩的 pickle 格式，只应读取自己保存的文件。
+* 超过 `max_entries` 或 `max_bytes` 时按最近使用时间删除最早的结果。
+
+Example:
+    >>> from finance_tools_py.cache import ResultCache
+    >>> cache = ResultCache('~/.cache/backtest')
+    >>> bt = BackTest(data, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    >>> bt.calc_trade_history(cache=cache)
+"""
+
+import datetime
+import gzip
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from finance_tools_py import __version__
+
+
+class Unhashable(TypeError):
+    """无法计算哈希值的类型。"""
+
+
+def _feed(h, value):
+    """把值按类型写入哈希对象。相等的值得到相同的结果，集合和字典与元素的顺序无关。
+
+    Raises:
+        Unhashable: 值中包含无法确定哈希值的类型。
+    """
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes,
+                                           datetime.date, datetime.time, datetime.timedelta)):
+        h.update('{}:{!r};'.format(type(value).__name__, value).encode('utf-8'))
+    elif isinstance(value, (list, tuple)):
+        h.update('{}[{}'.format(type(value).__name__, len(value)).encode('utf-8'))
+        for item in value:
+            _feed(h, item)
+        h.update(b']')
+    elif isinstance(value, (set, frozenset)):
+        _feed_unordered(h, 'set', [_digest(item) for item in value])
+    elif isinstance(value, dict):
+        _feed_unordered(h, 'dict', [_digest(k) + _digest(v) for k, v in value.items()])
+    elif isinstance(value, np.ndarray):
+        _feed_array(h, value)
+    elif isinstance(value, pd.DataFrame):
+        _feed_frame(h, value)
+    elif isinstance(value, (pd.Series, pd.Index, pd.Categorical, np.generic)):
+        _feed_array(h, value)
+    else:
+        raise Unhashable('{}.{}'.format(type(value).__module__, type(value).__qualname__))
+
+
+def _feed_unordered(h, name, digests):
+    h.update('{}{{{}'.format(name, len(digests)).encode('utf-8'))
+    for digest in sorted(digests):
+        h.update(digest)
+    h.update(b'}')
+
+
+def _digest(value):
+    h = hashlib.sha1()
+    _feed(h, value)
+    return h.digest()
+
+
+def _feed_array(h, values):
+    """写入一列数据。数值和时间直接使用原始字节，其他类型逐个计算哈希。"""
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.array if isinstance(values.dtype, pd.CategoricalDtype) else values.to_numpy()
+    if isinstance(values, pd.Categorical):
+        h.update(b'categorical')
+        _feed_array(h, values.codes)
+        _feed_array(h, values.categories)
+        return
+    values = np.asarray(values)
+    h.update('array:{}:{};'.format(values.dtype.str, values.shape).encode('utf-8'))
+    if values.dtype.kind in 'biufcmM':
+        h.update(np.ascontiguousarray(values).view(np.uint8))
+    else:
+        # hash_array 会把对象先转换为字符串，需要同时写入元素的类型，区分 1 和 '1'
+        h.update('{};'.format(pd.api.types.infer_dtype(values.ravel(), skipna=False)).encode('utf-8'))
+        h.update(pd.util.hash_array(values.ravel()).view(np.uint8))
+
+
+def _feed_frame(h, data):
+    h.update('frame:{};'.format(data.shape).encode('utf-8'))
+    _feed(h, [str(c) for c in data.columns])
+    index = data.index
+    if isinstance(index, pd.RangeIndex):
+        _feed(h, ('range', index.start, index.stop, index.step))
+    else:
+        h.update(pd.util.hash_pandas_object(index).to_numpy().view(np.uint8))
+    for col in data.columns:
+        _feed_array(h, data[col])
+
+
+def _feed_code(h, code):
+    h.update(code.co_code)
+    _feed(h, code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            _feed_code(h, const)
+        elif const is Ellipsis:
+            h.update(b'...;')
+        else:
+            _feed(h, const)
+
+
+def _feed_class(h, cls):
+    """写入类及其基类中所有方法的字节码和常量。"""
+    for klass in inspect.getmro(cls):
+        if klass is object:
+            continue
+        h.update('class:{}.{};'.format(klass.__module__, klass.__qualname__).encode('utf-8'))
+        for name, member in sorted(vars(klass).items()):
+            if isinstance(member, (staticmethod, classmethod)):
+                member = member.__func__
+            functions = [member.fget, member.fset, member.fdel] if isinstance(member, property) else [member]
+            for function in functions:
+                if inspect.isfunction(function):
+                    h.update('{};'.format(name).encode('utf-8'))
+                    _feed_code(h, function.__code__)
+
+
+def fingerprint(bt, engine):
+    """计算回测的缓存键。
+
+    Args:
+        bt (:py:class:`finance_tools_py.backtest.BackTest`): 尚未计算的回测。
+        engine (str): 实际使用的计算引擎。
+
+    Returns:
+        str: 十六进制的哈希值。有回调没有 :py:meth:`finance_tools_py.backtest.CallBack.cache_key` 方法、该方法返回 `None` ，
+        或其中包含无法确定哈希值的类型时返回 `None` 。
+    """
+    keys = []
+    for cb in bt._calbacks:
+        cache_key = getattr(cb, 'cache_key', None)  # 不是派生自 CallBack 的回调不缓存
+        key = cache_key() if cache_key is not None else None
+        if key is None:
+            return None
+        keys.append(key)
+    h = hashlib.sha1()
+    _feed(h, (ResultCache.VERSION, __version__, engine, bt.init_cash, bt.tax_coeff, bt.commission_coeff,
+              bt.min_commission, bt._colname, bt._min_buy_amount))
+    try:
+        _feed(h, keys)
+    except Unhashable:
+        return None
+    for cb in bt._calbacks:
+        _feed_class(h, type(cb))
+    _feed_frame(h, bt.data)
+    return h.hexdigest()
+
+
+class ResultCache():
+    """保存在本地目录中的回测结果。
+
+    Attributes:
+        path (str): 缓存目录。
+        max_entries (int): 最多保存的结果数量。为 `None` 时不限制。
+        max_bytes (int): 缓存文件的总大小上限（字节）。为 `None` 时不限制。
+        hits (int): 读取到结果的次数。
+        misses (int): 没有读取到结果的次数。
+    """
+
+    VERSION = 1
+    SUFFIX = '.bt.gz'
+
+    def __init__(self, path, max_entries=256, max_bytes=512 * 1024 * 1024):
+        """初始化
+
+        Args:
+            path (str): 缓存目录。不存在时会被创建。
+            max_entries (int): 最多保存的结果数量。默认为 `256` 。
+            max_bytes (int): 缓存文件的总大小上限（字节）。默认为 512MB 。
+        """
+        self.path = os.path.expanduser(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, key + self.SUFFIX)
+
+    def get(self, key):
+        """读取结果，并更新最近使用时间。
+
+        Args:
+            key (str): :py:func:`fingerprint` 计算的缓存键。
+
+        Returns:
+            dict: 保存的结果。不存在时返回 `None` 。
+        """
+        file = self._file(key)
+        try:
+            with gzip.open(file, 'rb') as f:
+                state = pickle.load(f)
+            os.utime(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        if state.get('version') != self.VERSION:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return state
+
+    def put(self, key, state):
+        """保存结果。先写入临时文件再替换，多个进程同时写入同一个结果时不会读到不完整的文件。
+
+        Args:
+            key (str): 缓存键。
+            state (dict): 需要保存的结果。
+        """
+        state = dict(state, version=self.VERSION)
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=1) as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._file(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def load(self, bt, key):
+        """把缓存的结果恢复到回测中。
+
+        Returns:
+            bool: 是否读取到结果。
+        """
+        state = self.get(key)
+        if state is None:
+            return False
+        bt.cash = state['cash']
+        bt.history = state['history']
+        bt._ledger = state['ledger']
+        bt._last_date = state['last_date']
+        bt._history_df = None
+        bt._fills = None
+        bt._hold_price_cur = None
+        bt._restore_fill_order()
+        return True
+
+    def store(self, bt, key):
+        """保存回测的计算结果。"""
+        self.put(key, {
+            'cash': bt.cash,
+            'history': bt.history,
+            'ledger': bt._ledger,
+            'last_date': bt._last_date,
+            'metrics': {
+                'total_assets': bt.total_assets_cur,
+                'cash': bt.available_cash,
+                'trades': len(bt.history),
+                'commission': bt._calc_total_commission(),
+                'tax': bt._calc_total_tax(),
+            },
+        })
+
+    def entries(self):
+        """所有缓存的结果。
+
+        Returns:
+            :py:class:`pandas.DataFrame`: 索引为缓存键，包含 `size` （字节）及 `last_used` （最近使用时间）列，
+            按最近使用时间排序。
+        """
+        rows = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(self.SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # 已被其他进程删除
+                    continue
+                rows.append((entry.name[:-len(self.SUFFIX)], stat.st_size, stat.st_mtime))
+        df = pd.DataFrame(rows, columns=['key', 'size', 'last_used']).set_index('key')
+        df['last_used'] = pd.to_datetime(df['last_used'], unit='s')
+        return df.sort_values('last_used')
+
+    def evict(self):
+        """删除最早使用的结果，直到数量及总大小都不超过上限。"""
+        entries = self.entries()
+        count = len(entries)
+        size = int(entries['size'].sum())
+        for key, entry_size in entries['size'].items():
+            if (self.max_entries is None or count <= self.max_entries) and \
+                    (self.max_bytes is None or size <= self.max_bytes):
+                break
+            try:
+                os.remove(self._file(key))
+            except FileNotFoundError:
+                pass
+            count -= 1
+            size -= entry_size
+
+    def clear(self):
+        """删除所有缓存的结果。"""
+        for key in self.entries().index:
+            try:
+                os.remove(self._file(key))
+            except FileNotFoundError:
+                pass
+
+
+def get_cache(cache):
+    """获取缓存对象。
+
+    Args:
+        cache: :py:class:`ResultCache` 的实例或缓存目录。
+
+    Returns:
+        :py:class:`ResultCache`
+    """
+    if isinstance(cache, ResultCache):
+        return cache
+    if isinstance(cache, str) or hasattr(cache, '__fspath__'):
+        return ResultCache(str(cache))
+    raise TypeError('Unsupported cache: {!r}'.format(cache))
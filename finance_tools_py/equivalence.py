@@ -0,0 +1,443 @@
+"""计算引擎的一致性检查。
+
+在随机生成的模拟行情、买卖信号及交易参数上，分别运行参考实现和需要检查的引擎，逐项对比 `history_df` 、
+`cash` 及 `hold_price_cur` 。
+
+参考实现默认为 :py:class:`ReferenceBackTest` ：最初版本逐行回测的冻结副本，使用列表保存成交历史、
+每次成交后按 `groupby` 重新计算持仓成本、逐手试算全仓买入数量，并在信号列表中逐个查找日期。
+它不与 :py:mod:`finance_tools_py.backtest` 共用任何持仓、成交历史或信号索引的代码，
+因此也能发现 `iterrows` 引擎本身的变化。
+
+随机参数覆盖了容易出现差异的情况：最小手续费、可用资金不足时跳过买入、
+没有持仓时的卖出信号、逐行调用 :py:meth:`finance_tools_py.backtest.CallBack.on_check_sell` 的回调、
+不同类型的信号日期及未按时间排序的行情数据等。
+
+`cross` 引擎同一天内先卖后买，结果本来就可能与其他引擎不同，不适合用这个方法检查。
+
+Example:
+    命令行运行::
+
+        python -m finance_tools_py.equivalence --cases 200 --engines iterrows array
+
+    >>> from finance_tools_py.equivalence import run_cases
+    >>> result = run_cases(100)
+    >>> result[~result['ok']]
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from finance_tools_py.backtest import AHundredChecker
+from finance_tools_py.backtest import AllInChecker
+from finance_tools_py.backtest import BackTest
+from finance_tools_py.benchmark import make_market
+
+
+class ReferenceAHundredChecker():
+    """冻结的最初版本 :py:class:`finance_tools_py.backtest.AHundredChecker` ，只用于一致性检查。
+
+    逐行在信号字典的日期列表中查找，不建立索引。不要为了性能修改这个类。
+    """
+
+    def __init__(self, buy_dict, sell_dict, **kwargs):
+        self.buy_dict = buy_dict
+        self.sell_dict = sell_dict
+        self.tax_coeff = kwargs.pop('tax_coeff', 0.001)
+        self.commission_coeff = kwargs.pop('commission_coeff', 0.001)
+        self.min_commission = kwargs.pop('min_commission', 5)
+        self.min_amount = kwargs.pop('min_amount', 100)
+
+    def on_check_buy(self, date, code, price, cash):
+        if code in self.buy_dict.keys() and date in self.buy_dict[code]:
+            return True
+        else:
+            return False
+
+    def on_check_sell(self, date, code, price, cash, hold_amount, hold_price):
+        if code in self.sell_dict.keys() and date in self.sell_dict[code]:
+            return True
+        else:
+            return False
+
+    def _calc_commission(self, price, amount):
+        return max(price * amount * self.commission_coeff, self.min_commission)
+
+    def _calc_tax(self, price, amount):
+        return price * amount * self.tax_coeff
+
+    def on_calc_buy_amount(self, date, code, price, cash):
+        amount = self.min_amount
+        if price * amount + self._calc_commission(price, amount) + self._calc_tax(price, amount) <= cash:
+            return amount
+        return 0
+
+    def on_calc_sell_amount(self, date, code, price, cash, hold_amount, hold_price):
+        if hold_amount >= self.min_amount:
+            return self.min_amount
+        return 0
+
+
+class ReferenceAllInChecker(ReferenceAHundredChecker):
+    """冻结的最初版本 :py:class:`finance_tools_py.backtest.AllInChecker` 。逐手累加计算买入数量。"""
+
+    def on_calc_buy_amount(self, date, code, price, cash):
+        amount = self.min_amount
+        while price * amount + self._calc_commission(price, amount) + self._calc_tax(price, amount) <= cash:
+            amount = amount + self.min_amount
+        amount = amount - self.min_amount
+        return amount
+
+    def on_calc_sell_amount(self, date, code, price, cash, hold_amount, hold_price):
+        return hold_amount
+
+
+class ReferenceBackTest():
+    """冻结的最初版本 :py:class:`finance_tools_py.backtest.BackTest` 的计算过程，作为一致性检查的参考结果。
+
+    使用 :py:meth:`pandas.DataFrame.iterrows` 逐行计算，成交历史保存为列表，每次成交后按时间排序的成交历史
+    分组重新计算加权平均的持仓成本。与 :py:class:`finance_tools_py.backtest.BackTest` 不共用任何持仓、
+    成交历史及回调的代码，因此后者的任何改动导致的差异都可以被发现。计算很慢，只适合小规模的数据。
+    不要为了性能修改这个类。
+    """
+
+    def __init__(self, data, init_cash=10000, tax_coeff=0.001, commission_coeff=0.001, min_commission=5,
+                 col_name='close', callbacks=()):
+        self.data = data
+        self.init_cash = init_cash
+        self.cash = [init_cash]
+        self.tax_coeff = tax_coeff
+        self.commission_coeff = commission_coeff
+        self.min_commission = min_commission
+        self.history = []
+        self._colname = col_name
+        self._calbacks = callbacks
+        self._hold_price_cur = pd.DataFrame()
+        self._history_headers = ['datetime', 'code', 'price', 'amount', 'cash', 'commission', 'tax', 'total',
+                                 'toward']
+
+    @property
+    def history_df(self):
+        lens = len(self.history[0]) if len(self.history) > 0 else len(self._history_headers)
+        return pd.DataFrame(data=self.history, columns=self._history_headers[:lens]).sort_index()
+
+    def __hold_price_cur(self):
+        def weights(x):
+            n = len(x)
+            res = 1
+            while res > 0 or res < 0:
+                res = sum(x[:n]['amount'])
+                n = n - 1
+
+            x = x[n + 1:]
+
+            if sum(x['amount']) != 0:
+                return np.average(x['price'], weights=x['amount'], returned=True)
+            else:
+                return np.nan
+
+        # 唯一与最初版本不同的地方：使用稳定排序。最初版本的 quicksort 对相同时间的成交的排序依赖 numpy 的版本及 CPU 指令集，
+        # 同一股票同一时间的买入、卖出可能被颠倒，不能作为确定的参考结果。
+        history = self.history_df.set_index('datetime', drop=False).sort_index(kind='mergesort')
+        return history.groupby('code').apply(weights).dropna()
+
+    @property
+    def hold_price_cur(self):
+        return self._hold_price_cur
+
+    @property
+    def available_cash(self):
+        return self.cash[-1]
+
+    def _calc_commission(self, price, amount):
+        return max(price * amount * self.commission_coeff, self.min_commission)
+
+    def _calc_tax(self, price, amount):
+        return price * amount * self.tax_coeff
+
+    def _check_callback_buy(self, date, code, price):
+        for cb in self._calbacks:
+            if cb.on_check_buy(date, code, price, self.available_cash):
+                return True
+        return False
+
+    def _check_callback_sell(self, date, code, price):
+        for cb in self._calbacks:
+            hold_amount, hold_price = 0, 0
+            if not self.hold_price_cur.empty and code in self.hold_price_cur.index:
+                hold_price, hold_amount = self.hold_price_cur[code]
+            if cb.on_check_sell(date, code, price, self.available_cash, hold_amount, hold_price):
+                return True
+        return False
+
+    def _calc_buy_amount(self, date, code, price):
+        for cb in self._calbacks:
+            amount = cb.on_calc_buy_amount(date, code, price, self.available_cash)
+            if amount:
+                return amount
+        return 0
+
+    def _calc_sell_amount(self, date, code, price):
+        for cb in self._calbacks:
+            if not self.hold_price_cur.empty and code in self.hold_price_cur.index:
+                hold_price, hold_amount = self.hold_price_cur[code]
+                amount = cb.on_calc_sell_amount(date, code, price, self.available_cash, hold_amount, hold_price)
+                if amount:
+                    return amount
+        return 0
+
+    def _update_history(self, date, code, price, amount, available_cash, commission, tax, toward):
+        self.history.append([date, code, price, amount * toward, available_cash, commission, tax,
+                             price * amount + commission + tax, toward])
+        self._hold_price_cur = self.__hold_price_cur()
+
+    def calc_trade_history(self):
+        for index, row in self.data.iterrows():
+            date = row['date']
+            code = row['code']
+            price = row[self._colname]
+            if self._check_callback_buy(date, code, price):
+                amount = self._calc_buy_amount(date, code, price)
+                commission = self._calc_commission(price, amount)
+                tax = self._calc_tax(price, amount)
+                value = price * amount + commission + tax
+                if value <= self.available_cash and amount > 0:
+                    self.cash.append(self.available_cash - value)
+                    self._update_history(date, code, price, amount, self.cash[-1], commission, tax, 1)
+            if self._check_callback_sell(date, code, price):
+                amount = self._calc_sell_amount(date, code, price)
+                if amount > 0:
+                    commission = self._calc_commission(price, amount)
+                    tax = self._calc_tax(price, amount)
+                    value = price * amount - commission - tax
+                    self.cash.append(self.available_cash + value)
+                    self._update_history(date, code, price, amount, self.cash[-1], commission, tax, -1)
+
+
+REFERENCE_CHECKERS = {
+    'ahundred': ReferenceAHundredChecker,
+    'allin': ReferenceAllInChecker,
+    'allin_rows': ReferenceAllInChecker,
+}
+"""参考结果使用的回调。与 :py:data:`CHECKERS` 的名称对应。"""
+
+
+class RowAllInChecker(AllInChecker):
+    """逐行判断买入、卖出的 :py:class:`finance_tools_py.backtest.AllInChecker` 。
+
+    重写了 :py:meth:`on_check_buy` 及 :py:meth:`on_check_sell` ，因此不使用批量判断，
+    `array` 引擎也会对每一行调用回调。
+    """
+
+    def on_check_buy(self, date, code, price, cash):
+        return super().on_check_buy(date, code, price, cash)
+
+    def on_check_sell(self, date, code, price, cash, hold_amount, hold_price):
+        return super().on_check_sell(date, code, price, cash, hold_amount, hold_price)
+
+
+CHECKERS = {
+    'ahundred': AHundredChecker,
+    'allin': AllInChecker,
+    'allin_rows': RowAllInChecker,
+}
+"""可以使用的回调。"""
+
+
+def random_case(seed):
+    """生成一组随机参数。相同的 `seed` 总是生成相同的参数。
+
+    Args:
+        seed (int): 随机种子。
+
+    Returns:
+        dict: 可以传递给 :py:func:`make_case` 的参数。
+    """
+    rng = np.random.RandomState(seed)
+    return {
+        'seed': seed,
+        'n_codes': int(rng.randint(1, 9)),
+        'n_days': int(rng.randint(5, 120)),
+        'signal_rate': float(rng.choice([0.02, 0.1, 0.3, 0.6])),
+        'checker': str(rng.choice(sorted(CHECKERS))),
+        'init_cash': float(rng.choice([3000, 20000, 100000, 1000000])),
+        'tax_coeff': float(rng.choice([0, 0.001, 0.002])),
+        'commission_coeff': float(rng.choice([0, 0.0003, 0.001, 0.003])),
+        'min_commission': float(rng.choice([0, 1, 5, 20])),
+        'min_amount': int(rng.choice([100, 200, 500])),
+        'date_type': str(rng.choice(['timestamp', 'date', 'datetime64'])),
+        'order': str(rng.choice(['sorted', 'by_code', 'shuffled'])),
+    }
+
+
+def make_case(seed, n_codes, n_days, signal_rate, checker, init_cash, tax_coeff, commission_coeff, min_commission,
+              min_amount, date_type='timestamp', order='sorted'):
+    """根据参数生成行情数据及创建回测的函数。
+
+    Args:
+        seed (int): 生成行情和信号的随机种子。参考 :py:func:`finance_tools_py.benchmark.make_market` 。
+        n_codes (int): 股票数量。
+        n_days (int): 交易天数。
+        signal_rate (float): 买入、卖出信号的概率。
+        checker (str): :py:data:`CHECKERS` 中的回调名称。
+        init_cash (float): 初始资金。
+        tax_coeff (float): 印花税费率。回测和回调使用相同的值。
+        commission_coeff (float): 手续费率。回测和回调使用相同的值。
+        min_commission (float): 最小手续费。回测和回调使用相同的值。
+        min_amount (int): 回调每次交易的最小数量。
+        date_type (str): 信号字典中日期的类型。 `timestamp` 、 `date` （ `datetime.date` ）或 `datetime64` 。
+        order (str): 行情数据的顺序。 `sorted` （按时间）、 `by_code` （按股票代码）或 `shuffled` （随机）。
+
+    Returns:
+        (:py:class:`pandas.DataFrame`, callable): 行情数据，以及每次返回新的回测的函数。
+        函数的参数 `reference` 为 `True` 时返回 :py:class:`ReferenceBackTest` ，
+        否则返回 :py:class:`finance_tools_py.backtest.BackTest` 。
+    """
+    data, buy_dict, sell_dict = make_market(n_codes, n_days, seed=seed, signal_rate=signal_rate)
+    convert = {
+        'timestamp': lambda dates: list(dates),
+        'date': lambda dates: [d.date() for d in dates],
+        'datetime64': lambda dates: list(dates.values),
+    }[date_type]
+    buy_dict = {code: convert(dates) for code, dates in buy_dict.items()}
+    sell_dict = {code: convert(dates) for code, dates in sell_dict.items()}
+    if order == 'by_code':
+        data = data.sort_values(['code', 'date'], kind='mergesort', ignore_index=True)
+    elif order == 'shuffled':
+        data = data.sample(frac=1, random_state=seed).reset_index(drop=True)
+    fees = {'tax_coeff': tax_coeff, 'commission_coeff': commission_coeff, 'min_commission': min_commission}
+
+    def factory(reference=False):
+        if reference:
+            callback = REFERENCE_CHECKERS[checker](buy_dict, sell_dict, min_amount=min_amount, **fees)
+            return ReferenceBackTest(data, init_cash=init_cash, callbacks=[callback], **fees)
+        callback = CHECKERS[checker](buy_dict, sell_dict, min_amount=min_amount, **fees)
+        return BackTest(data, init_cash=init_cash, callbacks=[callback], **fees)
+
+    return data, factory
+
+
+def _same(a, b, atol):
+    a = np.asarray(a)
+    b = np.asarray(b)
+    if a.dtype.kind in 'biuf' and b.dtype.kind in 'biuf':
+        a = a.astype(np.float64)
+        b = b.astype(np.float64)
+        return (np.abs(a - b) <= atol) | (np.isnan(a) & np.isnan(b))
+    return a == b
+
+
+def diff_backtests(expected, actual, atol=0):
+    """对比两个已经计算完成的回测。
+
+    Args:
+        expected (:py:class:`finance_tools_py.backtest.BackTest`): 参考结果。
+        actual (:py:class:`finance_tools_py.backtest.BackTest`): 需要检查的结果。
+        atol (float): 数值允许的绝对误差。默认为 `0` ，要求完全相同。例如 `0.005` 表示精确到分。
+
+    Returns:
+        [str]: 差异的说明。结果一致时为空列表。每一项只报告第一处不同。
+    """
+    diffs = []
+    left, right = expected.history_df, actual.history_df
+    if left.columns.tolist() != right.columns.tolist():
+        diffs.append('history_df columns: {} != {}'.format(left.columns.tolist(), right.columns.tolist()))
+    elif len(left) != len(right):
+        diffs.append('history_df rows: {} != {}'.format(len(left), len(right)))
+    else:
+        for col in left.columns:
+            same = _same(left[col].values, right[col].values, atol)
+            if not same.all():
+                i = int(np.flatnonzero(~same)[0])
+                diffs.append('history_df[{!r}] row {}: {!r} != {!r}'.format(col, i, left[col].iloc[i],
+                                                                           right[col].iloc[i]))
+                break
+    if len(expected.cash) != len(actual.cash):
+        diffs.append('cash length: {} != {}'.format(len(expected.cash), len(actual.cash)))
+    else:
+        same = _same(expected.cash, actual.cash, atol)
+        if not same.all():
+            i = int(np.flatnonzero(~same)[0])
+            diffs.append('cash[{}]: {!r} != {!r}'.format(i, expected.cash[i], actual.cash[i]))
+    left, right = expected.hold_price_cur, actual.hold_price_cur
+    if left.index.tolist() != right.index.tolist():
+        diffs.append('hold_price_cur codes: {} != {}'.format(left.index.tolist(), right.index.tolist()))
+    else:
+        for code in left.index:
+            if not _same(left[code], right[code], atol).all():
+                diffs.append('hold_price_cur[{!r}]: {!r} != {!r}'.format(code, left[code], right[code]))
+                break
+    return diffs
+
+
+def check_case(case, engines=('iterrows', 'array'), reference='baseline', atol=0):
+    """检查一组参数。
+
+    Args:
+        case (dict): :py:func:`random_case` 生成的参数。
+        engines ([str]): 需要检查的计算引擎。
+        reference (str): 参考结果。默认为 `baseline` ，使用 :py:class:`ReferenceBackTest` ；
+            也可以是 :py:class:`finance_tools_py.backtest.BackTest` 的计算引擎名称。
+        atol (float): 数值允许的绝对误差。参考 :py:func:`diff_backtests` 。
+
+    Returns:
+        [dict]: 每个引擎一条记录，包含参数及 `engine` 、 `rows` （行情数据行数）、 `trades` （参考结果的成交次数）、
+        `ok` （是否一致）、 `diff` （差异的说明）。
+    """
+    data, factory = make_case(**case)
+    if reference == 'baseline':
+        expected = factory(reference=True)
+        expected.calc_trade_history()
+    else:
+        expected = factory()
+        expected.calc_trade_history(engine=reference, progress=False)
+    records = []
+    for engine in engines:
+        actual = factory()
+        actual.calc_trade_history(engine=engine, progress=False)
+        diffs = diff_backtests(expected, actual, atol)
+        records.append(dict(case, engine=engine, rows=len(data), trades=len(expected.history), ok=not diffs,
+                            diff='; '.join(diffs)))
+    return records
+
+
+def run_cases(cases=100, seed=0, engines=('iterrows', 'array'), reference='baseline', atol=0):
+    """在多组随机参数上检查计算引擎。
+
+    Args:
+        cases (int): 参数组数。
+        seed (int): 第一组参数的随机种子，之后的参数依次加 `1` 。
+        engines ([str]): 需要检查的计算引擎。
+        reference (str): 参考结果。参考 :py:func:`check_case` 。
+        atol (float): 数值允许的绝对误差。参考 :py:func:`diff_backtests` 。
+
+    Returns:
+        :py:class:`pandas.DataFrame`: 每组参数、每个引擎一行。参考 :py:func:`check_case` 。
+    """
+    records = []
+    for i in range(cases):
+        records.extend(check_case(random_case(seed + i), engines, reference, atol))
+    return pd.DataFrame(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='finance-tools-py engine equivalence check')
+    parser.add_argument('--cases', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engines', nargs='+', default=['iterrows', 'array'])
+    parser.add_argument('--reference', default='baseline')
+    parser.add_argument('--atol', type=float, default=0)
+    args = parser.parse_args(argv)
+    result = run_cases(args.cases, args.seed, args.engines, args.reference, args.atol)
+    failed = result[~result['ok']]
+    print('{} cases, {} engines, {} mismatches'.format(args.cases, len(args.engines), len(failed)))
+    if len(failed):
+        print(failed.to_string())
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""回测过程中的交易事件。
+
+`verbose` 大于 `0` 时， :py:class:`finance_tools_py.backtest.BackTest` 会为每次买入、卖出（ `verbose` 为 `2` 时还包括
+跳过的买入、卖出）生成一个 :py:class:`TradeEvent` ，交给 `sink` 处理。事件只保存原始数值，
+只有 `sink` 需要文本时才会格式化，因此可以在正式运行时保留诊断信息。
+
+Example:
+    >>> import logging
+    >>> from finance_tools_py.events import JsonLinesSink
+    >>> bt.calc_trade_history(verbose=2, sink=logging.getLogger('backtest'))
+    >>> with JsonLinesSink('trades.jsonl') as sink:
+    >>>     bt.calc_trade_history(verbose=1, sink=sink)
+"""
+
+import datetime
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+
+
+class TradeEvent():
+    """交易事件。
+
+    Attributes:
+        kind (str): 事件类型。
+
+            * `buy` : 买入。
+            * `sell` : 卖出。
+            * `skip_buy` : 可用资金不足，跳过买入。
+            * `skip_sell` : 没有持仓，跳过卖出。
+            * `finish` : 计算完成。其他属性均为 `None` 。
+        date: 时间。
+        code (str): 股票代码。
+        price (float): 价格。
+        amount (float): 成交数量。跳过时为 `None` 。
+        cash (float): 成交后的可用资金。跳过时为 `None` 。
+        commission (float): 手续费。跳过时为 `None` 。
+        tax (float): 印花税。跳过时为 `None` 。
+    """
+
+    __slots__ = ('kind', 'date', 'code', 'price', 'amount', 'cash', 'commission', 'tax')
+
+    FIELDS = __slots__
+
+    def __init__(self, kind, date=None, code=None, price=None, amount=None, cash=None, commission=None, tax=None):
+        self.kind = kind
+        self.date = date
+        self.code = code
+        self.price = price
+        self.amount = amount
+        self.cash = cash
+        self.commission = commission
+        self.tax = tax
+
+    def message(self):
+        """格式化为文本。"""
+        if self.kind == 'buy':
+            return '{:%Y-%m-%d} {} 买入 {:.2f}/{:.2f}，剩余资金 {:.2f}'.format(self.date, self.code, self.price,
+                                                                     self.amount, self.cash)
+        if self.kind == 'sell':
+            return '{:%Y-%m-%d} {} 卖出 {:.2f}/{:.2f}，剩余资金 {:.2f}'.format(self.date, self.code, self.price,
+                                                                     self.amount, self.cash)
+        if self.kind == 'skip_buy':
+            return '{:%Y-%m-%d} {} {:.2f} 可用资金不足，跳过购买。'.format(self.date, self.code, self.price)
+        if self.kind == 'skip_sell':
+            return '{:%Y-%m-%d} {} 没有持仓，跳过卖出。'.format(self.date, self.code)
+        if self.kind == 'finish':
+            return '计算完成！'
+        return '{} {}'.format(self.kind, self.to_dict())
+
+    def __str__(self):
+        return self.message()
+
+    def __repr__(self):
+        return 'TradeEvent({})'.format(', '.join('{}={!r}'.format(k, getattr(self, k)) for k in self.FIELDS
+                                                 if getattr(self, k) is not None))
+
+    def __eq__(self, other):
+        return isinstance(other, TradeEvent) and all(getattr(self, k) == getattr(other, k) for k in self.FIELDS)
+
+    def to_dict(self):
+        """转换为可以被 :py:mod:`json` 序列化的字典。时间转换为 ISO 格式的字符串，数值转换为 Python 类型。"""
+        return {k: _to_json(getattr(self, k)) for k in self.FIELDS}
+
+
+def _to_json(value):
+    if isinstance(value, np.datetime64):
+        return str(value)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class EventSink():
+    """事件处理的基类。派生类实现 :py:meth:`emit` 。可以用作 `with` 语句的上下文管理器。"""
+
+    def emit(self, event):
+        """处理一个事件。
+
+        Args:
+            event (:py:class:`TradeEvent`): 事件。
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """释放资源。"""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PrintSink(EventSink):
+    """使用 :py:func:`print` 输出事件文本。 `verbose` 大于 `0` 且没有指定 `sink` 时的默认方式。"""
+
+    def emit(self, event):
+        print(event.message())
+
+
+class ListSink(EventSink):
+    """把事件保存在列表中。
+
+    Attributes:
+        events ([:py:class:`TradeEvent`]): 收到的事件。
+    """
+
+    def __init__(self, events=None):
+        self.events = [] if events is None else events
+
+    def emit(self, event):
+        self.events.append(event)
+
+    def to_frame(self):
+        """转换为 :py:class:`pandas.DataFrame` ，每个事件一行。"""
+        return pd.DataFrame([[getattr(e, k) for k in TradeEvent.FIELDS] for e in self.events],
+                            columns=list(TradeEvent.FIELDS))
+
+
+class LoggerSink(EventSink):
+    """使用 :py:mod:`logging` 输出事件。
+
+    事件对象作为日志参数传递，只有日志被实际输出时才会格式化。
+    """
+
+    def __init__(self, logger=None, level=logging.INFO, skip_level=logging.DEBUG):
+        """初始化
+
+        Args:
+            logger (:py:class:`logging.Logger`): 默认为 ``logging.getLogger('finance_tools_py')`` 。
+            level (int): 买入、卖出及计算完成事件的日志级别。默认为 `INFO` 。
+            skip_level (int): 跳过买入、卖出事件的日志级别。默认为 `DEBUG` 。
+        """
+        self.logger = logger or logging.getLogger('finance_tools_py')
+        self.level = level
+        self.skip_level = skip_level
+
+    def emit(self, event):
+        level = self.skip_level if event.kind.startswith('skip_') else self.level
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, '%s', event)
+
+
+class JsonLinesSink(EventSink):
+    """把事件以 JSON Lines 格式写入文件，每个事件一行。参考 :py:meth:`TradeEvent.to_dict` 。"""
+
+    def __init__(self, file, mode='w'):
+        """初始化
+
+        Args:
+            file (str or file): 文件路径或已经打开的文本文件。传入文件对象时 :py:meth:`close` 不会关闭它。
+            mode (str): 打开文件的模式。默认为 `w` ，追加时使用 `a` 。
+        """
+        if isinstance(file, str):
+            self._file = open(file, mode, encoding='utf-8')
+            self._owner = True
+        else:
+            self._file = file
+            self._owner = False
+
+    def emit(self, event):
+        self._file.write(json.dumps(event.to_dict(), ensure_ascii=False))
+        self._file.write('\n')
+
+    def close(self):
+        if self._owner:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+def get_sink(sink, verbose):
+    """获取实际使用的事件处理对象。
+
+    Args:
+        sink: 可以是 `None` （ `verbose` 大于 `0` 时使用 :py:class:`PrintSink` ）、 :py:class:`EventSink` 的实例、
+            :py:class:`logging.Logger` （使用 :py:class:`LoggerSink` ）或列表（使用 :py:class:`ListSink` ）。
+        verbose (int): 是否生成事件。0（不生成），1（买入、卖出），2（包括跳过的买入、卖出）。
+            指定了 `sink` 时， `0` 按 `1` 处理。
+
+    Returns:
+        (int, :py:class:`EventSink`): 实际使用的 `verbose` 和事件处理对象。 `verbose` 为 `0` 时事件处理对象为 `None` 。
+    """
+    if sink is None:
+        return verbose, (PrintSink() if verbose > 0 else None)
+    if isinstance(sink, logging.Logger):
+        sink = LoggerSink(sink)
+    elif isinstance(sink, list):
+        sink = ListSink(sink)
+    elif not isinstance(sink, EventSink):
+        raise TypeError('Unsupported sink: {!r}'.format(sink))
+    return max(verbose, 1), sink
@@ -0,0 +1,98 @@
+"""行情数据的读取。
+
+把按列保存的行情数据（数组字典、 :py:mod:`numpy` 结构化数组或 Arrow 表）转换为
+:py:class:`finance_tools_py.backtest.BackTest` 使用的 :py:class:`pandas.DataFrame` ，尽量直接使用原有的内存：
+
+* 价格列读取为 `float64` 。原始类型已经是 `float64` 时不复制（结构化数组中的字段为跨步视图）。
+* `code` 列转换为字典编码（ :py:class:`pandas.Categorical` ）。Arrow 的字典列直接使用原有的字典，
+  编号会转换为能容纳所有编号的最小整数类型。
+* `date` 列为 `datetime64[ns]` 时不复制，其他精度的时间会被转换为 `datetime64[ns]` 。
+
+Arrow 表需要安装 :py:mod:`pyarrow` ，只有传入 Arrow 表时才会导入。
+
+Example:
+    >>> bt = BackTest({'date': dates, 'code': codes, 'close': close}, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    >>> bt = BackTest(pyarrow.parquet.read_table('market.parquet'), callbacks=[AHundredChecker(buy_dict, sell_dict)])
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+
+def _arrow_column(column):
+    """把 Arrow 的列转换为 :py:class:`numpy.ndarray` 或 :py:class:`pandas.Categorical` 。
+
+    只有一块且没有空值的数值、时间列不复制数据。字符串列会先转换为字典编码。
+    """
+    import pyarrow as pa
+    if isinstance(column, pa.ChunkedArray):
+        column = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type) or \
+            pa.types.is_binary(column.type) or pa.types.is_large_binary(column.type):
+        column = column.dictionary_encode()
+    if pa.types.is_dictionary(column.type):
+        indices = column.indices
+        if indices.null_count:
+            indices = indices.fill_null(-1)
+        return pd.Categorical.from_codes(indices.to_numpy(zero_copy_only=False),
+                                         categories=pd.Index(column.dictionary.to_numpy(zero_copy_only=False)))
+    return column.to_numpy(zero_copy_only=False)
+
+
+def _columns(source):
+    """返回 (列名, 按列名读取列的函数)。"""
+    if isinstance(source, Mapping):
+        return list(source.keys()), source.__getitem__
+    if isinstance(source, np.ndarray) and source.dtype.names:
+        return list(source.dtype.names), source.__getitem__
+    if hasattr(source, 'column_names') and hasattr(source, 'column'):  # pyarrow.Table / pyarrow.RecordBatch
+        return list(source.column_names), lambda name: _arrow_column(source.column(name))
+    raise TypeError('Unsupported market data: {}'.format(type(source).__name__))
+
+
+def _codes(values):
+    if isinstance(values, pd.Categorical):
+        return values
+    codes, uniques = pd.factorize(np.asarray(values))
+    return pd.Categorical.from_codes(codes, categories=uniques)
+
+
+def _dates(values):
+    values = np.asarray(values)
+    if values.dtype.kind == 'M' and values.dtype != np.dtype('datetime64[ns]'):
+        values = values.astype('datetime64[ns]')
+    return values
+
+
+def to_frame(source, col_name='close', columns=None):
+    """把按列保存的行情数据转换为 :py:class:`pandas.DataFrame` 。
+
+    Args:
+        source: 数组字典（key值为列名，也可以是 :py:class:`finance_tools_py.store.PriceStore` 等映射类型）、带字段名的 :py:class:`numpy.ndarray` （结构化数组）、
+            `pyarrow.Table` 或 `pyarrow.RecordBatch` 。必须包含 `date` 、 `code` 及价格列。
+        col_name (str): 价格列名。默认为 `close` 。
+        columns ([str]): 需要读取的列。默认为所有列。 `date` 、 `code` 及价格列总是会被读取。
+
+    Returns:
+        :py:class:`pandas.DataFrame`
+    """
+    names, get = _columns(source)
+    columns = list(names if columns is None else columns)
+    for name in ('date', 'code', col_name):
+        if name not in names:
+            raise KeyError('Market data has no column: {}'.format(name))
+        if name not in columns:
+            columns.append(name)
+    data = {}
+    for name in columns:
+        values = get(name)
+        if name == 'code':
+            values = _codes(values)
+        elif name == 'date':
+            values = _dates(values)
+        elif name == col_name:
+            values = np.asarray(values, dtype=np.float64)
+        data[name] = values
+    return pd.DataFrame(data, columns=columns, copy=False)
@@ -0,0 +1,198 @@
+"""回测的进度显示。
+
+:py:meth:`finance_tools_py.backtest.BackTest.calc_trade_history` 等方法通过 `progress` 参数接收进度显示的对象。
+计算时每处理 :py:attr:`Progress.step` 行才调用一次 :py:meth:`Progress.update` ，
+显示的频率再由 `min_interval` （秒）和 `min_rows` （行数）限制，因此进度显示对计算速度几乎没有影响。
+
+Example:
+    >>> import logging
+    >>> from finance_tools_py.progress import LoggingProgress
+    >>> bt.calc_trade_history(progress=LoggingProgress(logging.getLogger('backtest'), min_interval=60))
+"""
+
+import logging
+import sys
+import time
+
+from tqdm.auto import tqdm
+
+
+class Progress():
+    """进度显示的基类。
+
+    派生类只需要实现 :py:meth:`_report` ，需要时再实现 :py:meth:`_open` 及 :py:meth:`_close` 。
+
+    Attributes:
+        step (int): 计算时每处理多少行调用一次 :py:meth:`update` 。为 `None` 时只在计算完成后调用一次。
+    """
+
+    step = 1000
+
+    def __init__(self, min_interval=0.5, min_rows=None, desc=None):
+        """初始化
+
+        Args:
+            min_interval (float): 两次显示之间的最短时间（秒）。为 `None` 时不按时间限制。
+            min_rows (int): 两次显示之间最少处理的行数。为 `None` 时不按行数限制。
+                同时设置 `min_interval` 和 `min_rows` 时满足任意一个条件就会显示。
+            desc (str): 进度的说明。
+        """
+        self.min_interval = min_interval
+        self.min_rows = min_rows
+        self.desc = desc
+        self.total = None
+        self.done = 0
+        self._last_time = None
+        self._last_rows = 0
+        self._start_time = None
+
+    def start(self, total=None):
+        """开始计算。
+
+        Args:
+            total (int): 需要处理的总行数。未知时为 `None` 。
+        """
+        self.total = total
+        self.done = 0
+        self._last_rows = 0
+        self._start_time = self._last_time = time.monotonic()
+        self._open()
+
+    def update(self, rows):
+        """增加已处理的行数，满足时间或行数间隔时显示进度。
+
+        Args:
+            rows (int): 新处理的行数。
+        """
+        self.done += rows
+        now = time.monotonic()
+        if (self.min_interval is not None and now - self._last_time >= self.min_interval) or \
+                (self.min_rows is not None and self.done - self._last_rows >= self.min_rows):
+            self._last_time = now
+            self._last_rows = self.done
+            self._report()
+
+    def close(self):
+        """计算结束。总是显示最后的进度。"""
+        if self.done != self._last_rows:
+            self._last_rows = self.done
+            self._report()
+        self._close()
+
+    @property
+    def elapsed(self):
+        """从 :py:meth:`start` 开始经过的时间（秒）。"""
+        return 0.0 if self._start_time is None else time.monotonic() - self._start_time
+
+    def _open(self):
+        pass
+
+    def _report(self):
+        pass
+
+    def _close(self):
+        pass
+
+
+class NullProgress(Progress):
+    """不显示进度。"""
+
+    step = None
+
+    def update(self, rows):
+        self.done += rows
+
+    def close(self):
+        pass
+
+
+class TqdmProgress(Progress):
+    """使用 :py:mod:`tqdm` 显示进度条。"""
+
+    def __init__(self, min_interval=0.1, min_rows=None, desc=None, **kwargs):
+        """初始化
+
+        Args:
+            min_interval (float): 两次刷新之间的最短时间（秒）。
+            min_rows (int): 两次刷新之间最少处理的行数。
+            desc (str): 进度条的说明。
+            kwargs: 其他传递给 :py:class:`tqdm.tqdm` 的参数。
+        """
+        super().__init__(min_interval, min_rows, desc)
+        self._kwargs = kwargs
+        self._bar = None
+
+    def _open(self):
+        self._bar = tqdm(total=self.total, desc=self.desc, mininterval=self.min_interval or 0, **self._kwargs)
+
+    def _report(self):
+        self._bar.update(self.done - self._bar.n)
+
+    def _close(self):
+        if self._bar is not None:
+            self._bar.close()
+            self._bar = None
+
+
+class LoggingProgress(Progress):
+    """使用 :py:mod:`logging` 输出进度。适合没有终端的批量任务。"""
+
+    def __init__(self, logger=None, level=logging.INFO, min_interval=30, min_rows=None, desc='backtest'):
+        """初始化
+
+        Args:
+            logger (:py:class:`logging.Logger`): 输出进度的 logger 。默认为 ``logging.getLogger('finance_tools_py')`` 。
+            level (int): 日志级别。默认为 `INFO` 。
+            min_interval (float): 两次输出之间的最短时间（秒）。默认为 `30` 。
+            min_rows (int): 两次输出之间最少处理的行数。
+            desc (str): 输出的说明。
+        """
+        super().__init__(min_interval, min_rows, desc)
+        self.logger = logger or logging.getLogger('finance_tools_py')
+        self.level = level
+
+    def _report(self):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if self.total:
+            self.logger.log(self.level, '%s: %d/%d rows (%.1f%%), %.1fs', self.desc, self.done, self.total,
+                            self.done * 100.0 / self.total, self.elapsed)
+        else:
+            self.logger.log(self.level, '%s: %d rows, %.1fs', self.desc, self.done, self.elapsed)
+
+
+def is_interactive():
+    """是否在交互环境（终端或 Jupyter）中运行。"""
+    if hasattr(sys, 'ps1') or 'ipykernel' in sys.modules:
+        return True
+    try:
+        return sys.stderr is not None and sys.stderr.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def get_progress(progress=None):
+    """获取进度显示的对象。
+
+    Args:
+        progress: 可以是以下值：
+
+            * `None` : 交互环境中使用 :py:class:`TqdmProgress` ，否则使用 :py:class:`NullProgress` 。
+            * `True` / `False` : :py:class:`TqdmProgress` / :py:class:`NullProgress` 。
+            * `tqdm` 、 `logging` 、 `null` : 对应类型的默认对象。
+            * :py:class:`Progress` 的实例：直接返回。
+
+    Returns:
+        :py:class:`Progress`
+    """
+    if isinstance(progress, Progress):
+        return progress
+    if progress is None:
+        progress = is_interactive()
+    if progress is True or progress == 'tqdm':
+        return TqdmProgress()
+    if progress is False or progress == 'null':
+        return NullProgress()
+    if progress == 'logging':
+        return LoggingProgress()
+    raise ValueError('Unknown progress: {!r}'.format(progress))
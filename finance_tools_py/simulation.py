@@ -162,8 +162,22 @@ class Simulation():
         >>> sim.plot_sns()
         >>> plt.show()
 
+        使用本地保存的行情数据（参考 :py:class:`finance_tools_py.store.PriceStore` ）：
+
+        >>> sim=Simulation(PriceStore('/data/market'))
+        >>> sim.simulate('300378', start='2016-01-01', end=datetime.date(2020, 3, 9))
+
     """
 
+    def __init__(self, store=None):
+        """初始化
+
+        Args:
+            store (:py:class:`finance_tools_py.store.PriceStore`): 本地保存的行情数据。
+                为 `None` 时通过 ``QA.QA_fetch_stock_day_adv`` 读取数据。
+        """
+        self.__store = store
+
     def simulate(self, symbol, start='2010-01-01', end=datetime.date.today(),
                  callbacks=[CallBack_Bolling(30, 2.6, 2.6, 0.3, 0.3),
                             CallBack_Pandas_Rolling(30, 250),
@@ -203,19 +217,23 @@ class Simulation():
     def __read_df(self, symbol, start='2010-01-01', end=datetime.date.today(), fq='01', callbacks=[]) -> pd.DataFrame:
         """读取指定股票的数据
         Args:
-            fq (str): 是否复权。`00`:不复权，`01`:前复权，`02`:后复权
+            fq (str): 是否复权。`00`:不复权，`01`:前复权，`02`:后复权。使用本地保存的行情数据时忽略此参数，
+                数据保存时是否复权决定了读取的结果。
             callbacks  :CallBack的派生类集合。
         """
-        data = QA.QA_fetch_stock_day_adv(symbol, start=start, end=end)
-        if data:
-            if fq == '00':
-                data = data.data
-            elif fq == '01':
-                data = data.to_qfq().data
-            elif fq == '02':
-                data = data.to_hfq().data
-            else:
-                raise NotImplementedError()
+        if self.__store is not None:
+            data = self.__store.code_frame(symbol, start=start, end=end).set_index(['date', 'code'])
+        else:
+            data = QA.QA_fetch_stock_day_adv(symbol, start=start, end=end)
+            if data:
+                if fq == '00':
+                    data = data.data
+                elif fq == '01':
+                    data = data.to_qfq().data
+                elif fq == '02':
+                    data = data.to_hfq().data
+                else:
+                    raise NotImplementedError()
         context = {}
         for cb in callbacks:
             cb.on_preparing_data(symbol, data, context)
@@ -0,0 +1,170 @@
+"""保存在本地磁盘上的按列存储的行情数据。
+
+每一列保存为一个 `.npy` 文件，读取时使用内存映射（只读），不需要把数据读入进程的内存。
+同一台机器上的多个进程读取同一份数据时共用操作系统的页缓存，打开数据几乎不需要时间。
+
+目录结构::
+
+    meta.json       列名、行数等信息
+    <列名>.npy      每一列的数据。 `code` 列保存为整数编号
+    codes.npy       股票代码（字符串或整数）。 `code` 列中的编号对应这里的下标
+    code_rows.npy   按股票代码分组（组内保持原有顺序）的行号
+    code_offsets.npy  每只股票在 `code_rows.npy` 中的起止位置
+
+Example:
+    >>> from finance_tools_py.store import PriceStore
+    >>> PriceStore.write('/data/market', data)
+    >>> store = PriceStore('/data/market')
+    >>> bt = BackTest(store, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    >>> df = store.code_frame('000001', start='2019-01-01')
+"""
+
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+
+class PriceStore(Mapping):
+    """按列存储的行情数据（只读）。
+
+    可以像字典一样按列名读取列：数值列为只读的内存映射数组， `code` 列为 :py:class:`pandas.Categorical` ，
+    编号直接使用内存映射的数据。因此可以直接作为 :py:class:`finance_tools_py.backtest.BackTest` 的 `data` 参数，
+    转换为 :py:class:`pandas.DataFrame` 时不复制数据。
+
+    对象序列化时只保存路径，在其他进程中反序列化后重新打开，可以传递给 :py:func:`finance_tools_py.sweep.sweep` 。
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        """打开已保存的数据。
+
+        Args:
+            path (str): :py:meth:`write` 保存数据的目录。
+        """
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != self.VERSION:
+            raise ValueError('Unsupported price store version: {}'.format(meta.get('version')))
+        self.columns = meta['columns']
+        self.length = meta['length']
+        self._arrays = {}
+        self.codes = pd.Index(self._load('codes').tolist(), name='code')
+        self._code_ids = {code: i for i, code in enumerate(self.codes)}
+
+    def _load(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            array = self._arrays[name] = np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+        return array
+
+    @classmethod
+    def write(cls, path, data, columns=None):
+        """把行情数据保存到目录中。
+
+        Args:
+            path (str): 目录。不存在时会被创建，已存在的同名文件会被覆盖。
+            data (:py:class:`pandas.DataFrame`): 行情数据。需要包含 `date` 和 `code` 列，其他列必须是数值类型。
+                `code` 列必须全部是字符串或全部是整数，读取时保持原有的类型。
+            columns ([str]): 需要保存的列。默认为所有列。 `date` 和 `code` 列总是会被保存。
+
+        Returns:
+            :py:class:`PriceStore`: 打开的数据。
+        """
+        columns = [c for c in (data.columns if columns is None else columns) if c not in ('date', 'code')]
+        for col in columns:
+            if data[col].dtype.kind not in 'biuf':
+                raise TypeError('Column {} is not numeric: {}'.format(col, data[col].dtype))
+        code_ids, codes = pd.factorize(data['code'])
+        codes = pd.Index(np.asarray(codes))
+        if codes.dtype.kind in 'iu':
+            code_values = codes.to_numpy()
+        elif all(isinstance(c, str) for c in codes):
+            code_values = np.asarray(codes.tolist(), dtype=str)
+        else:
+            raise TypeError('Codes must be all strings or all integers: {}'.format(codes.inferred_type))
+        os.makedirs(path, exist_ok=True)
+        # 与 pandas.Categorical 的编号使用相同的整数类型，读取时不需要转换
+        code_ids = pd.Categorical.from_codes(code_ids, categories=codes).codes
+        order = np.argsort(code_ids, kind='mergesort')
+        offsets = np.r_[0, np.cumsum(np.bincount(code_ids, minlength=len(codes)))]
+        arrays = {
+            'date': pd.to_datetime(data['date']).to_numpy(dtype='datetime64[ns]'),
+            'code': code_ids,
+            'codes': code_values,
+            'code_rows': order.astype(np.int64),
+            'code_offsets': offsets.astype(np.int64),
+        }
+        for col in columns:
+            arrays[col] = data[col].to_numpy()
+        for name, array in arrays.items():
+            np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'version': cls.VERSION, 'columns': ['date', 'code'] + list(columns), 'length': len(data)}, f)
+        return cls(path)
+
+    def __getitem__(self, name):
+        if name not in self.columns:
+            raise KeyError(name)
+        if name == 'code':
+            return pd.Categorical.from_codes(self._load('code'), categories=self.codes)
+        return self._load(name)
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def frame(self, columns=None):
+        """读取为 :py:class:`pandas.DataFrame` 。不复制数据。
+
+        Args:
+            columns ([str]): 需要读取的列。默认为所有列。
+        """
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame({c: self[c] for c in columns}, columns=columns, copy=False)
+
+    def code_rows(self, code):
+        """某只股票的所有行号（升序）。股票不存在时返回空数组。"""
+        i = self._code_ids.get(code)
+        if i is None:
+            return np.empty(0, dtype=np.int64)
+        offsets = self._load('code_offsets')
+        return self._load('code_rows')[offsets[i]:offsets[i + 1]]
+
+    def code_frame(self, code, start=None, end=None, columns=None):
+        """读取某只股票的数据。只读取这只股票所在的行。
+
+        Args:
+            code (str or int): 股票代码。
+            start: 开始时间（包含）。为 `None` 时不限制。
+            end: 结束时间（包含）。为 `None` 时不限制。
+            columns ([str]): 需要读取的列。默认为所有列。
+
+        Returns:
+            :py:class:`pandas.DataFrame`: `code` 列与保存时的类型相同。
+        """
+        rows = np.asarray(self.code_rows(code))
+        dates = self._load('date')[rows]
+        keep = np.ones(len(rows), dtype=bool)
+        if start is not None:
+            keep &= dates >= np.datetime64(pd.Timestamp(start))
+        if end is not None:
+            keep &= dates <= np.datetime64(pd.Timestamp(end))
+        rows = rows[keep]
+        columns = self.columns if columns is None else columns
+        data = {}
+        for c in columns:
+            data[c] = np.full(len(rows), code, dtype=self.codes.dtype) if c == 'code' else self._load(c)[rows]
+        return pd.DataFrame(data, columns=columns)
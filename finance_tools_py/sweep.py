@@ -0,0 +1,196 @@
+"""回测参数扫描。
+
+使用进程池并行计算多组参数的回测结果。行情数据只会被写入一次内存映射文件，
+各个进程直接映射同一份数据，不需要为每组参数复制一份行情数据。
+
+Example:
+    >>> from functools import partial
+    >>> from finance_tools_py.backtest import AllInChecker
+    >>> from finance_tools_py.sweep import sweep
+    >>>
+    >>> result = sweep(data,
+    >>>                {'init_cash': [10000, 50000], 'min_commission': [0, 5], 'min_amount': [100, 200]},
+    >>>                partial(AllInChecker, buy_dict, sell_dict))
+    >>> print(result)
+       init_cash  min_commission  min_amount  total_assets      cash  trades  commission   tax
+    0      10000               0         100      ...
+"""
+
+import itertools
+import os
+import shutil
+import tempfile
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from finance_tools_py.backtest import BackTest
+from finance_tools_py.store import PriceStore
+
+BACKTEST_PARAMS = ('init_cash', 'tax_coeff', 'commission_coeff', 'min_commission')
+"""由 :py:class:`finance_tools_py.backtest.BackTest` 使用的参数名。"""
+
+RESULT_COLUMNS = ['total_assets', 'cash', 'trades', 'commission', 'tax']
+"""结果中除参数以外的列。"""
+
+
+def expand_grid(param_grid):
+    """展开参数网格。
+
+    Args:
+        param_grid (dict or [dict]): 参数网格。key值为参数名，value值为参数的取值集合。
+            也可以是多个参数网格组成的列表，结果会依次合并。
+
+    Returns:
+        [dict]: 每一组参数。
+    """
+    if isinstance(param_grid, dict):
+        param_grid = [param_grid]
+    configs = []
+    for grid in param_grid:
+        names = list(grid.keys())
+        for values in itertools.product(*[list(grid[name]) for name in names]):
+            configs.append(dict(zip(names, values)))
+    return configs
+
+
+class SharedFrame():
+    """保存在内存映射文件中的行情数据。
+
+    只保存回测需要的 `date` 、 `code` 及价格列。 `date` 和 `code` 列编码为整数后保存，
+    原始值（数量较少）随对象一起序列化；价格列按原始类型直接保存。
+    文件写入临时目录（存在 ``/dev/shm`` 时写入其中），各进程以只读方式映射同一份文件，由操作系统共享内存页。
+    对象可以被序列化后传递给其他进程，在其他进程中调用 :py:meth:`frame` 读取数据。
+
+    Attributes:
+        path (str): 保存数据的临时目录。
+    """
+
+    def __init__(self, data, col_name='close'):
+        """初始化
+
+        Args:
+            data (:py:class:`pandas.DataFrame`): 行情数据。
+            col_name (str): 价格列名。
+        """
+        self.col_name = col_name
+        self._arrays = {}
+        self._specs = {}
+        self._owner = True
+        self.path = tempfile.mkdtemp(prefix='finance-tools-sweep-',
+                                     dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+        try:
+            for col in ['date', 'code']:
+                codes, uniques = pd.factorize(data[col])
+                self._put(col, codes.astype(np.int32))
+                self._specs[col] = uniques
+            self._put(col_name, data[col_name].to_numpy())
+        except Exception:
+            self.close()
+            raise
+
+    def _put(self, name, array):
+        file = os.path.join(self.path, '{}.npy'.format(len(self._specs)))  # 列名不一定能作为文件名
+        np.save(file, array, allow_pickle=False)
+        self._specs[name + '.array'] = file
+
+    def __getstate__(self):
+        return {'col_name': self.col_name, 'path': self.path, '_specs': self._specs}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._arrays = {}
+        self._owner = False
+
+    def _array(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            array = self._arrays[name] = np.load(self._specs[name + '.array'], mmap_mode='r')
+        return array
+
+    def frame(self):
+        """读取为 :py:class:`pandas.DataFrame` 。价格列直接使用映射的文件，不复制数据。"""
+        data = {}
+        for col in ['date', 'code']:
+            data[col] = pd.Categorical.from_codes(self._array(col), categories=self._specs[col])
+        data[self.col_name] = self._array(self.col_name)
+        return pd.DataFrame(data, columns=['date', 'code', self.col_name], copy=False)
+
+    def close(self):
+        """关闭映射的文件。创建数据的进程同时会删除临时目录。"""
+        self._arrays = {}
+        if self._owner:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+_worker = {}
+
+
+def _init_worker(shared, col_name, callbacks_factory, engine):
+    _worker['shared'] = shared
+    _worker['data'] = shared.frame()
+    _worker['col_name'] = col_name
+    _worker['callbacks_factory'] = callbacks_factory
+    _worker['engine'] = engine
+
+
+def _run(data, col_name, callbacks_factory, engine, params):
+    callbacks = callbacks_factory(**params)
+    if not isinstance(callbacks, (list, tuple)):
+        callbacks = [callbacks]
+    bt = BackTest(data,
+                  col_name=col_name,
+                  callbacks=list(callbacks),
+                  **{k: v for k, v in params.items() if k in BACKTEST_PARAMS})
+    bt.calc_trade_history(engine=engine, progress=False)
+    return [bt.total_assets_cur,
+            bt.available_cash,
+            len(bt.history),
+            bt._calc_total_commission(),
+            bt._calc_total_tax()]
+
+
+def _run_worker(params):
+    return _run(_worker['data'], _worker['col_name'], _worker['callbacks_factory'], _worker['engine'], params)
+
+
+def sweep(data, param_grid, callbacks_factory, col_name='close', max_workers=None, engine='auto'):
+    """按参数网格并行回测。
+
+    Args:
+        data (:py:class:`pandas.DataFrame`): 行情数据。与 :py:class:`finance_tools_py.backtest.BackTest` 相同。
+            也可以是 :py:class:`finance_tools_py.store.PriceStore` ，此时各进程直接打开磁盘上的数据，不再另外复制一份。
+        param_grid (dict or [dict]): 参数网格。参考 :py:func:`expand_grid` 。
+            其中 :py:data:`BACKTEST_PARAMS` 中的参数会传递给 :py:class:`finance_tools_py.backtest.BackTest` ；
+            所有参数都会以关键字参数的形式传递给 `callbacks_factory` 。
+        callbacks_factory (callable): 根据参数创建回调的函数。返回一个回调或回调的列表。
+            使用多进程时必须可以被序列化，例如模块级函数或 ``functools.partial(AllInChecker, buy_dict, sell_dict)`` 。
+        col_name (str): 价格列名。默认为 `close` 。
+        max_workers (int): 进程数。默认为 CPU 数量。为 `1` 时在当前进程中依次计算。
+        engine (str): 回测使用的计算引擎。参考 :py:meth:`finance_tools_py.backtest.BackTest.calc_trade_history` 。
+
+    Returns:
+        :py:class:`pandas.DataFrame`: 每组参数一行。包含参数列，以及 `total_assets` （总资产）、
+        `cash` （可用资金）、 `trades` （交易次数）、 `commission` （总手续费）、 `tax` （总印花税）列。
+    """
+    configs = expand_grid(param_grid)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(configs)))
+    if max_workers == 1:
+        if isinstance(data, PriceStore):
+            data = data.frame()
+        results = [_run(data, col_name, callbacks_factory, engine, params) for params in configs]
+    elif isinstance(data, PriceStore):
+        with Pool(max_workers, _init_worker, (data, col_name, callbacks_factory, engine)) as pool:
+            results = pool.map(_run_worker, configs)
+    else:
+        shared = SharedFrame(data, col_name)
+        try:
+            with Pool(max_workers, _init_worker, (shared, col_name, callbacks_factory, engine)) as pool:
+                results = pool.map(_run_worker, configs)
+        finally:
+            shared.close()
+    result = pd.DataFrame(configs, index=range(len(configs)))
+    return pd.concat([result, pd.DataFrame(results, columns=RESULT_COLUMNS, index=result.index)], axis=1)
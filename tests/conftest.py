@@ -0,0 +1,7 @@
+import pytest
+from finance_tools_py.benchmark import make_market
+
+
+@pytest.fixture
+def market_data():
+    return make_market(4, 50, signal_rate=0.1)
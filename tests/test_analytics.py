@@ -0,0 +1,75 @@
+from datetime import date as dt
+import numpy as np
+import pandas as pd
+from finance_tools_py import analytics
+from finance_tools_py.backtest import AHundredChecker
+from finance_tools_py.backtest import BackTest
+
+
+def test_equity_statistics():
+    index = pd.date_range('2000-01-01', periods=6)
+    equity = pd.Series([100, 110, 99, 120, 90, 130.0], index=index)
+    r = equity.pct_change().dropna()
+    assert np.isclose((1.3 ** (252 / 5)) - 1, analytics.annualized_return(equity))
+    assert np.isclose(r.std() * np.sqrt(252), analytics.annualized_volatility(equity))
+    assert np.isclose(r.mean() / r.std() * np.sqrt(252), analytics.sharpe_ratio(equity))
+    assert np.isclose(r.mean() / np.sqrt((np.minimum(r, 0) ** 2).mean()) * np.sqrt(252),
+                      analytics.sortino_ratio(equity))
+    dd, peak, trough = analytics.max_drawdown(equity)
+    assert np.isclose(90 / 120 - 1, dd)
+    assert index[3] == peak
+    assert index[4] == trough
+
+    frame = pd.DataFrame({'a': equity, 'b': equity * 2})
+    result = analytics.max_drawdown(frame)
+    assert ['a', 'b'] == result.index.tolist()
+    assert np.allclose(dd, result['drawdown'])
+    assert np.allclose(analytics.sharpe_ratio(equity), analytics.sharpe_ratio(frame))
+
+
+def test_round_trips():
+    history = pd.DataFrame({
+        'datetime': [dt(2000, 1, 1), dt(2000, 1, 2), dt(2000, 1, 3), dt(2000, 1, 5), dt(2000, 1, 6),
+                     dt(2000, 1, 8)],
+        'code': ['a', 'b', 'a', 'a', 'b', 'a'],
+        'price': [10, 20, 12, 11, 18, 9.0],
+        'amount': [100, 100, 100, -200, -100, 100],
+        'commission': [5] * 6,
+        'tax': [0.0] * 6,
+    })
+    trips = analytics.round_trips(history)
+    assert ['a', 'a', 'b'] == trips['code'].tolist()
+    assert [True, False, True] == trips['closed'].tolist()
+    assert np.allclose([-1000 - 1200 + 2200 - 15, -900 - 5, -2000 + 1800 - 10], trips['pnl'])
+    assert 0 == analytics.win_rate(history)
+    assert pd.Timedelta(days=4) == analytics.average_holding_period(history)
+
+
+def test_round_trips_fractional_amount():
+    history = pd.DataFrame({
+        'datetime': [dt(2000, 1, 1), dt(2000, 1, 2), dt(2000, 1, 3), dt(2000, 1, 4), dt(2000, 1, 5)],
+        'code': ['b', 'a', 'a', 'a', 'a'],
+        'price': [20, 10, 12, 11, 9.0],
+        'amount': [1000000.3, 0.1, 0.2, -(0.1 + 0.2), 0.3],
+        'commission': [0.0] * 5,
+        'tax': [0.0] * 5,
+    })
+    trips = analytics.round_trips(history)
+    assert ['b', 'a', 'a'] == trips['code'].tolist()
+    assert [False, True, False] == trips['closed'].tolist()
+
+
+def test_summary():
+    data = pd.DataFrame({
+        'code': ['000001' for x in range(5)],
+        'date': [dt(1998, 1, 1), dt(1999, 1, 1), dt(2000, 1, 1), dt(2001, 1, 1), dt(2002, 1, 1)],
+        'close': [4.5, 7.9, 6.7, 13.4, 15.3],
+    })
+    bt = BackTest(data, callbacks=[AHundredChecker(
+        buy_dict={'000001': [dt(1998, 1, 1), dt(2000, 1, 1)]},
+        sell_dict={'000001': [dt(1999, 1, 1), dt(2002, 1, 1)]})])
+    bt.calc_trade_history()
+    result = analytics.summary(bt, periods=1)
+    assert 1.0 == result['win_rate']
+    assert pd.Timedelta(days=(365 + 731) / 2) == result['average_holding_period']
+    assert result['turnover'] > 0
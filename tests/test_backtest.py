@@ -139,3 +139,473 @@ def test_allin():
     assert 1200 == bt.hold_price_cur['000001'][1]
     assert np.round(6.7, 2) == np.round(bt.hold_price_cur['000001'][0], 2)
     assert np.round(bt.total_assets_cur, 2) == np.round(bt.available_cash + (6.7) * 1200, 2)
+
+
+def test_engine_array_same_as_iterrows():
+    data = pd.DataFrame({
+        'code': ['000001' for x in range(5)],
+        'date': [dt(1998, 1, 1), dt(1999, 1, 1), dt(2000, 1, 1), dt(2001, 1, 1), dt(2002, 1, 1)],
+        'close': [4.5, 7.9, 6.7, 13.4, 15.3],
+    })
+    data = data.append(pd.DataFrame({
+        'code': ['000002' for x in range(5)],
+        'date': [dt(1998, 12, 31), dt(1999, 12, 31), dt(2000, 12, 31), dt(2001, 12, 31), dt(2002, 12, 31)],
+        'close': [41.5, 71.9, 61.7, 131.4, 151.3],
+    }))
+    buy_dict = {'000001': [dt(1999, 1, 1), dt(2001, 1, 1)],
+                '000002': [dt(1998, 12, 31), dt(2000, 12, 31)]}
+    sell_dict = {'000001': [dt(2000, 1, 1)], '000002': [dt(2001, 12, 31)]}
+    results = []
+    for engine in ['iterrows', 'array']:
+        bt = BackTest(data, init_cash=20000, callbacks=[AllInChecker(buy_dict=buy_dict, sell_dict=sell_dict)])
+        bt.calc_trade_history(engine=engine)
+        results.append(bt)
+    assert results[0].cash == results[1].cash
+    assert results[0].history.tolist() == results[1].history.tolist()
+    assert results[0].history_df.equals(results[1].history_df)
+    assert results[0].report() == results[1].report()
+
+
+def test_engine_auto():
+    data = pd.DataFrame({
+        'code': ['000001' for x in range(4)],
+        'date': [dt(1998, 1, 1), dt(1999, 1, 1), dt(2000, 1, 1), dt(2001, 1, 1)],
+        'close': [4.5, 7.9, 6.7, 10],
+    })
+    bt = BackTest(data, callbacks=[AHundredChecker({}, {})])
+    assert 'array' == bt._select_engine('auto')
+    checker = AHundredChecker({}, {})
+    checker.supports_array_engine = False
+    bt = BackTest(data, callbacks=[checker])
+    assert 'iterrows' == bt._select_engine('auto')
+    with pytest.raises(ValueError):
+        bt.calc_trade_history(engine='unknown')
+
+
+def test_position_ledger():
+    from finance_tools_py.backtest import PositionLedger
+    ledger = PositionLedger()
+    ledger.update('000001', 10, 100)
+    ledger.update('000001', 20, 100)
+    assert (15, 200) == ledger.get('000001')
+    ledger.update('000001', 30, -100)
+    # 与按成交历史加权平均的结果一致（卖出数量为负数）
+    assert np.average([10, 20, 30], weights=[100, 100, -100]) == ledger.get('000001')[0]
+    ledger.update('000001', 30, -100)
+    assert ledger.get('000001') is None
+    assert '000001' not in ledger
+    ledger.update('000001', 8, 100)
+    assert (8, 100) == ledger.get('000001')
+    assert 100 == ledger.amounts()['000001']
+
+
+def test_trade_history():
+    from finance_tools_py.backtest import TradeHistory
+    headers = ['datetime', 'code', 'price', 'amount', 'cash', 'commission', 'tax', 'total', 'toward']
+    history = TradeHistory(headers, capacity=2)
+    rows = []
+    for i in range(5):
+        row = [dt(2000, 1, i + 1), '000001', 4.5 + i, 100, 1000.0 - i, 5, 0.45, 460.0, 1]
+        rows.append(row)
+        history.append(row)
+    history.append([dt(2000, 1, 6), '000002', 10.0, -150.5, 2000.0, 5.5, 1.5, 10.0, -1])
+    assert 6 == len(history)
+    assert history.tolist()[:5] == rows
+    df = history.to_frame()
+    assert df.equals(pd.DataFrame(data=history.tolist(), columns=headers))
+    assert np.int64 == df['toward'].dtype
+    assert np.float64 == df['amount'].dtype
+    assert 5 * 5 + 5.5 == history.total_commission
+    assert np.isclose(0.45 * 5 + 1.5, history.total_tax)
+
+    ids, values = history.encoded('code')
+    assert np.int32 == ids.dtype
+    assert [0, 0, 0, 0, 0, 1] == ids.tolist()
+    assert ['000001', '000002'] == values.tolist()
+    assert [r[0] for r in rows] == history.column('datetime')[:5].tolist()
+    import pickle
+    assert df.equals(pickle.loads(pickle.dumps(history)).to_frame())
+
+
+def test_checker_date_types():
+    checker = AHundredChecker(
+        buy_dict={'000001': pd.DatetimeIndex(['1999-01-01', '2001-01-01'])},
+        sell_dict={'000001': [np.datetime64('2000-01-01'), datetime.datetime(2002, 1, 1)],
+                   '000002': []})
+    for d in [dt(1999, 1, 1), datetime.datetime(1999, 1, 1), pd.Timestamp('1999-01-01'),
+              np.datetime64('1999-01-01T00:00:00')]:
+        assert checker.on_check_buy(d, '000001', 1, 0)
+        assert not checker.on_check_sell(d, '000001', 1, 0, 0, 0)
+    assert checker.on_check_sell(dt(2000, 1, 1), '000001', 1, 0, 0, 0)
+    assert checker.on_check_sell(pd.Timestamp('2002-01-01'), '000001', 1, 0, 0, 0)
+    assert not checker.on_check_buy(dt(1999, 1, 1), '000002', 1, 0)
+    checker.buy_dict = {'000002': [dt(1999, 1, 1)]}
+    assert checker.on_check_buy(dt(1999, 1, 1), '000002', 1, 0)
+    assert not checker.on_check_buy(dt(1999, 1, 1), '000001', 1, 0)
+
+
+def test_allin_buy_amount():
+    def loop(checker, price, cash):
+        amount = checker.min_amount
+        while price * amount + checker._calc_commission(price, amount) + checker._calc_tax(price, amount) <= cash:
+            amount = amount + checker.min_amount
+        return amount - checker.min_amount
+
+    checker = AllInChecker({}, {})
+    rng = np.random.RandomState(0)
+    prices = np.round(rng.uniform(0.5, 50, 200), 2)
+    cashs = np.round(rng.uniform(0, 100000, 200), 2)
+    cashs[:20] = [checker._calc_buy_cost(p, 300) for p in prices[:20]]  # 恰好等于花费金额的边界
+    expected = [loop(checker, p, c) for p, c in zip(prices, cashs)]
+    assert expected == [checker.on_calc_buy_amount(None, None, p, c) for p, c in zip(prices, cashs)]
+    assert expected == checker.calc_buy_amounts(prices, cashs).tolist()
+    assert [loop(checker, p, 5000) for p in prices] == checker.calc_buy_amounts(prices, 5000).tolist()
+    assert 0 == checker.on_calc_buy_amount(None, None, 4.5, 100)
+
+
+def test_batch_callback(init_global_data):
+    from finance_tools_py.backtest import CallBack
+
+    class BatchChecker(AHundredChecker):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.calls = 0
+
+        def on_check_buy(self, *args):
+            self.calls += 1
+            return super().on_check_buy(*args)
+
+        def on_check_sell(self, *args):
+            self.calls += 1
+            return super().on_check_sell(*args)
+
+        def on_check_buy_batch(self, dates, codes, prices):
+            return np.isin(pd.to_datetime(dates), pd.to_datetime([dt(1999, 1, 1), dt(2001, 1, 1)]))
+
+        def on_check_sell_batch(self, dates, codes, prices):
+            return np.isin(pd.to_datetime(dates), pd.to_datetime([dt(2000, 1, 1)]))
+
+    buy_dict = {pytest.global_code: [dt(1999, 1, 1), dt(2001, 1, 1)]}
+    sell_dict = {pytest.global_code: [dt(2000, 1, 1)]}
+    expected = BackTest(pytest.global_data, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    expected.calc_trade_history(engine='iterrows')
+
+    checker = BatchChecker(buy_dict, sell_dict)
+    bt = BackTest(pytest.global_data, callbacks=[checker])
+    bt.calc_trade_history()
+    assert 0 == checker.calls
+    assert expected.history_df.equals(bt.history_df)
+    assert expected.report() == bt.report()
+
+    # 混合不支持批量判断的回调时，逐行调用该回调
+    checker = BatchChecker(buy_dict, sell_dict)
+    bt = BackTest(pytest.global_data, callbacks=[checker, CallBack()])
+    bt.calc_trade_history()
+    assert 0 == checker.calls
+    assert expected.history_df.equals(bt.history_df)
+
+
+def test_checker_batch_mask():
+    data = pd.DataFrame({
+        'code': ['000001', '000002', '000001', '000002', '000003'],
+        'date': pd.to_datetime(['1999-01-01', '1999-01-01', '2000-01-01', '2000-01-01', '2000-01-01']),
+        'close': [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+    checker = AHundredChecker(buy_dict={'000001': [dt(1999, 1, 1)], '000002': [dt(2000, 1, 1)], '000009': []},
+                              sell_dict={'000003': pd.DatetimeIndex(['2000-01-01'])})
+    args = data['date'].to_numpy(), data['code'].to_numpy(), data['close'].to_numpy()
+    assert [True, False, False, True, False] == checker.on_check_buy_batch(*args).tolist()
+    assert [False, False, False, False, True] == checker.on_check_sell_batch(*args).tolist()
+    assert [checker.on_check_buy(d, c, p, 0) for d, c, p in zip(*args)] == checker.on_check_buy_batch(*args).tolist()
+
+    class CustomChecker(AHundredChecker):
+        def on_check_buy(self, date, code, price, cash):
+            return price > 2
+
+    checker = CustomChecker(buy_dict={}, sell_dict={})
+    assert checker.on_check_buy_batch(*args) is None
+    assert not checker.on_check_sell_batch(*args).any()
+
+
+def test_equity_curve(init_global_data):
+    data = pd.DataFrame({
+        'code': ['000001' for x in range(5)],
+        'date': [dt(1998, 1, 1), dt(1999, 1, 1), dt(2000, 1, 1), dt(2001, 1, 1), dt(2002, 1, 1)],
+        'close': [4.5, 7.9, 6.7, 13.4, 15.3],
+    })
+    data = data.append(pd.DataFrame({
+        'code': ['000002' for x in range(4)],
+        'date': [dt(1998, 12, 31), dt(1999, 12, 31), dt(2000, 12, 31), dt(2002, 1, 1)],
+        'close': [41.5, 71.9, 61.7, 131.4],
+    }))
+    bt = BackTest(data, callbacks=[AHundredChecker(
+        buy_dict={'000001': [dt(1999, 1, 1), dt(2001, 1, 1)],
+                  '000002': [dt(1998, 12, 31)]},
+        sell_dict={'000001': [dt(2000, 1, 1)]}, )])
+    bt.calc_trade_history()
+    curve = bt.equity_curve()
+    assert 8 == len(curve)
+    assert curve.index.is_monotonic_increasing
+    assert 10000 == curve['total'].iloc[0]
+    assert np.isclose(bt.available_cash, curve['cash'].iloc[-1])
+    assert np.isclose(15.3 * 100 + 131.4 * 100, curve['holdings'].iloc[-1])
+    # 1999-12-31 持有 000001 （1999-01-01 买入）和 000002 （1998-12-31 买入），000001 使用 1999-01-01 的价格
+    assert np.isclose(7.9 * 100 + 71.9 * 100, curve.loc['1999-12-31', 'holdings'])
+    bt = BackTest(data, callbacks=[AHundredChecker({}, {})])
+    bt.calc_trade_history()
+    assert (bt.equity_curve()['total'] == 10000).all()
+
+
+def test_stream():
+    dates = pd.date_range('2000-01-01', periods=30)
+    rng = np.random.RandomState(0)
+    data = pd.DataFrame({
+        'date': np.repeat(dates, 3),
+        'code': ['000001', '000002', '000003'] * 30,
+        'close': np.round(rng.uniform(5, 20, 90), 2),
+    })
+    buy_dict = {code: list(dates[rng.rand(30) < 0.3]) for code in ['000001', '000002', '000003']}
+    sell_dict = {code: list(dates[rng.rand(30) < 0.3]) for code in ['000001', '000002', '000003']}
+    expected = BackTest(data, init_cash=5000, callbacks=[AllInChecker(buy_dict, sell_dict)])
+    expected.calc_trade_history()
+    for engine in ['array', 'iterrows']:
+        bt = BackTest(None, init_cash=5000, callbacks=[AllInChecker(buy_dict, sell_dict)])
+        bt.calc_trade_history_stream((data.iloc[i:i + 7] for i in range(0, len(data), 7)), engine=engine)
+        assert expected.cash == bt.cash
+        assert expected.history_df.equals(bt.history_df)
+        assert expected.report() == bt.report()
+    with pytest.raises(ValueError):
+        bt.equity_curve()
+
+
+def test_unordered_fills(tmpdir):
+    from finance_tools_py.benchmark import make_market
+    data, buy_dict, sell_dict = make_market(4, 80, signal_rate=0.3)
+    expected = BackTest(data, init_cash=1e6, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    expected.calc_trade_history(progress=False)
+    # 按股票代码排序时，每只股票的成交仍然按时间发生，直接使用持仓账本
+    bt = BackTest(data.sort_values(['code', 'date'], ignore_index=True), init_cash=1e6,
+                  callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history(progress=False)
+    assert {} == bt._unordered_fills
+    assert expected.hold_price_cur.equals(bt.hold_price_cur)
+
+    bt = BackTest(data.sample(frac=1, random_state=0, ignore_index=True), init_cash=1e6,
+                  callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history(progress=False)
+    assert bt._unordered_fills
+    history = bt.history_df.sort_values('datetime', kind='mergesort')
+    for code, (price, amount) in bt.hold_price_cur.items():
+        fills = history[history['code'] == code]
+        flat = np.flatnonzero(fills['amount'].cumsum().values[:-1] == 0)
+        fills = fills.iloc[flat[-1] + 1 if len(flat) else 0:]
+        assert (price, amount) == np.average(fills['price'], weights=fills['amount'], returned=True)
+
+    path = str(tmpdir.join('bt.ckpt'))
+    bt.save_checkpoint(path)
+    loaded = BackTest.load_checkpoint(path, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    assert bt._unordered_fills.keys() == loaded._unordered_fills.keys()
+    assert bt.hold_price_cur.equals(loaded.hold_price_cur)
+
+
+def test_checkpoint(tmpdir):
+    dates = pd.date_range('2000-01-01', periods=30)
+    rng = np.random.RandomState(1)
+    data = pd.DataFrame({
+        'date': np.repeat(dates, 2),
+        'code': ['000001', '000002'] * 30,
+        'close': np.round(rng.uniform(5, 20, 60), 2),
+    })
+    buy_dict = {code: list(dates[rng.rand(30) < 0.3]) for code in ['000001', '000002']}
+    sell_dict = {code: list(dates[rng.rand(30) < 0.3]) for code in ['000001', '000002']}
+    expected = BackTest(data, init_cash=5000, callbacks=[AllInChecker(buy_dict, sell_dict)])
+    expected.calc_trade_history()
+
+    path = str(tmpdir.join('bt.ckpt'))
+    bt = BackTest(data.iloc[:40], init_cash=5000, callbacks=[AllInChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history()
+    bt.save_checkpoint(path)
+    for day in range(20, 30):
+        bt = BackTest.load_checkpoint(path, callbacks=[AllInChecker(buy_dict, sell_dict)])
+        bt.append(data.iloc[:(day + 1) * 2])  # 已经计算过的数据会被跳过
+        bt.save_checkpoint(path)
+    assert expected.cash == bt.cash
+    assert expected.history_df.equals(bt.history_df)
+    assert expected.report() == bt.report()
+
+    bt = BackTest(data.iloc[:40], init_cash=5000, callbacks=[AllInChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history()
+    bt.append(data)
+    assert expected.report() == bt.report()
+    assert expected.equity_curve().equals(bt.equity_curve())
+
+
+def test_instrument(init_global_data):
+    bt = BackTest(pytest.global_data, instrument=True, callbacks=[AHundredChecker(
+        buy_dict={pytest.global_code: [dt(1999, 1, 1), dt(2001, 1, 1)]},
+        sell_dict={pytest.global_code: [dt(2000, 1, 1)]})])
+    bt.calc_trade_history(engine='iterrows')
+    assert 1 == bt.stats.calls['run']
+    assert 5 == bt.stats.calls['process_row']
+    assert 5 == bt.stats.calls['AHundredChecker[0].on_check_buy']
+    assert 3 == bt.stats.calls['history'] == bt.stats.calls['ledger']
+    assert bt.stats.seconds['run'] >= bt.stats.seconds['process_row']
+    assert '耗时统计' in bt.report()
+    assert 'history_df' in bt.stats.to_frame().index
+    assert '_process_row' not in bt.__dict__
+
+    bt.stats.reset()
+    bt.calc_trade_history(engine='array')
+    assert 3 == bt.stats.calls['process_row']  # 只处理有信号的行
+    assert 1 == bt.stats.calls['AHundredChecker[0].on_check_buy_batch']
+    assert 'prepare' in bt.stats.seconds
+
+    bt = BackTest(pytest.global_data, callbacks=[AHundredChecker({}, {})])
+    bt.calc_trade_history()
+    assert bt.stats is None
+    assert '耗时统计' not in bt.report()
+
+
+def test_snapshot(init_global_data):
+    bt = BackTest(pytest.global_data, callbacks=[AHundredChecker(
+        buy_dict={pytest.global_code: [dt(1999, 1, 1), dt(2001, 1, 1), dt(2002, 1, 1)]},
+        sell_dict={pytest.global_code: [dt(2000, 1, 1)]})])
+    bt.calc_trade_history()
+    snap = bt.snapshot()
+    assert ['000001'] == snap.index.tolist()
+    assert 200 == snap.loc['000001', 'amount']
+    assert np.isclose((13.4 + 15.3) / 2, snap.loc['000001', 'price'])
+    assert pd.Timestamp(2002, 1, 1) == snap.loc['000001', 'last_trade']
+    assert bt.snapshot(dt(1998, 6, 1)).empty
+    assert bt.snapshot('2000-01-01').empty  # 当天卖出后空仓
+    assert 7.9 == bt.snapshot(dt(1999, 6, 1)).loc['000001', 'price']
+
+    snaps = bt.snapshot(pd.to_datetime(['1998-06-01', '1999-06-01', '2000-06-01', '2001-06-01', '2002-06-01']))
+    assert ['date', 'code'] == snaps.index.names
+    assert [100, 100, 200] == snaps['amount'].tolist()
+    assert snaps.loc[(pd.Timestamp(2002, 6, 1), '000001')].equals(snap.loc['000001'].rename(snaps.index[-1]))
+
+    hold_time = bt.hold_time(dt(2000, 6, 1))
+    assert hold_time.empty
+    assert ['000001'] == bt.hold_time().index.tolist()
+    assert pd.Timestamp.today() - pd.Timestamp(2001, 1, 1) <= bt.hold_time(dt(2001, 6, 1))['000001']
+
+
+def test_trade_matrix():
+    from finance_tools_py.benchmark import make_market
+    data, buy_dict, sell_dict = make_market(6, 60, signal_rate=0.2)
+    bt = BackTest(data, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history(progress=False)
+    m = bt.trade_matrix()
+    history = bt.history_df.copy()
+    history['datetime'] = pd.to_datetime(history['datetime'])
+    expected = history.pivot_table(index='datetime', columns='code', values='amount', aggfunc=np.sum).fillna(0)
+    assert expected.astype(float).equals(m.to_dense())
+    assert m.nnz < m.shape[0] * m.shape[1]
+    assert np.allclose(history.groupby('code')['amount'].sum(), m.sum(axis=0))
+    value = bt.trade_matrix('value').abs().sum(axis=1)
+    net = (history['price'] * history['amount']).groupby([history['datetime'], history['code']]).sum()
+    assert np.allclose(net.abs().groupby(level=0).sum(), value[value.index.isin(history['datetime'])])
+    assert (0, 0) == BackTest(data, callbacks=[AHundredChecker({}, {})]).trade_matrix().shape
+
+
+def test_trade_matrix_scipy():
+    pytest.importorskip('scipy')
+    from finance_tools_py.benchmark import make_market
+    data, buy_dict, sell_dict = make_market(6, 60, signal_rate=0.2)
+    bt = BackTest(data, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history(progress=False)
+    m = bt.trade_matrix()
+    assert np.array_equal(m.to_dense().values, m.to_scipy('csr').toarray())
+
+
+def test_multi_backtest():
+    from finance_tools_py.backtest import MultiBackTest
+    from finance_tools_py.benchmark import make_market
+
+    class RowChecker(AHundredChecker):
+        supports_array_engine = False
+
+    data, buy_dict, sell_dict = make_market(5, 80, signal_rate=0.1)
+    _, other_buy, other_sell = make_market(5, 80, seed=1, signal_rate=0.1)
+    books = {
+        'ahundred': dict(callbacks=[AHundredChecker(buy_dict, sell_dict)]),
+        'allin': dict(init_cash=50000, callbacks=[AllInChecker(other_buy, other_sell)]),
+        'open': dict(col_name='open', callbacks=[AHundredChecker(other_buy, sell_dict)]),
+    }
+    row_books = dict(books, rows=dict(callbacks=[RowChecker(buy_dict, other_sell)]))
+    for engine, specs in [('auto', books), ('iterrows', books), ('auto', row_books)]:
+        mbt = MultiBackTest(data, specs)
+        mbt.calc_trade_history(engine=engine, progress=False)
+        summary = mbt.summary()
+        assert list(specs.keys()) == summary.index.tolist()
+        for name, spec in specs.items():
+            bt = BackTest(data, **spec)
+            bt.calc_trade_history(engine='iterrows', progress=False)
+            book = mbt.books[name]
+            assert bt.history_df.equals(book.history_df)
+            assert bt.report() == book.report()
+            assert summary.loc[name, 'trades'] == len(bt.history)
+    assert '账户:allin' in mbt.report()
+
+
+def test_multi_backtest_instrument():
+    from finance_tools_py.backtest import MultiBackTest
+    from finance_tools_py.benchmark import make_market
+    data, buy_dict, sell_dict = make_market(3, 40, signal_rate=0.1)
+    for engine in ['array', 'iterrows']:
+        mbt = MultiBackTest(data, {
+            'timed': dict(instrument=True, callbacks=[AHundredChecker(buy_dict, sell_dict)]),
+            'plain': dict(callbacks=[AllInChecker(buy_dict, sell_dict)]),
+        })
+        mbt.calc_trade_history(engine=engine, progress=False)
+        book = mbt.books['timed']
+        bt = BackTest(data, instrument=True, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+        bt.calc_trade_history(engine=engine, progress=False)
+        assert bt.history_df.equals(book.history_df)
+        assert 1 == book.stats.calls['run']
+        for name in ['process_row', 'history', 'ledger', 'AHundredChecker[0].on_calc_buy_amount']:
+            assert bt.stats.calls[name] == book.stats.calls[name]
+        assert ('prepare' in book.stats.seconds) == (engine == 'array')
+        assert '_process_row' not in book.__dict__
+        assert mbt.books['plain'].stats is None
+
+
+def test_cross_engine():
+    data = pd.DataFrame({
+        'code': ['000001', '000001', '000001', '000002', '000002', '000002'],
+        'date': [dt(1999, 1, 1), dt(1999, 1, 2), dt(1999, 1, 3), dt(1999, 1, 1), dt(1999, 1, 2), dt(1999, 1, 3)],
+        'close': [10.0, 11.0, 12.0, 20.0, 21.0, 22.0],
+    })
+    buy_dict = {'000001': [dt(1999, 1, 2)], '000002': [dt(1999, 1, 1), dt(1999, 1, 2)]}
+    sell_dict = {'000002': [dt(1999, 1, 2)]}
+    # 资金只够买入一次。按行顺序时 000001 的行先被处理；按日期时 000002 在第一天先买入
+    bt = BackTest(data, init_cash=2200, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history(engine='iterrows', progress=False)
+    assert ['000001'] == bt.history_df['code'].tolist()
+
+    bt = BackTest(data, init_cash=2200, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history(engine='cross', progress=False)
+    history = bt.history_df
+    # 第二天先卖出 000002 ，再按顺序买入 000001 和 000002 ，第二笔资金不足
+    assert ['000002', '000002', '000001'] == history['code'].tolist()
+    assert [1, -1, 1] == history['toward'].tolist()
+
+    class Ranker(AHundredChecker):
+        def on_rank_buy(self, date, codes, prices):
+            return prices  # 价格高的先买
+
+    bt = BackTest(data, init_cash=2200, callbacks=[Ranker(buy_dict, sell_dict)])
+    bt.calc_trade_history(engine='cross', progress=False)
+    assert ['000002', '000002', '000002'] == bt.history_df['code'].tolist()
+
+
+def test_cross_engine_sorted_data():
+    from finance_tools_py.benchmark import make_market
+    data, buy_dict, sell_dict = make_market(5, 60, signal_rate=0.1)
+    checker = AHundredChecker(buy_dict, {code: [] for code in sell_dict})
+    bt = BackTest(data, callbacks=[checker])
+    bt.calc_trade_history(engine='array', progress=False)
+    cross = BackTest(data, callbacks=[checker])
+    cross.calc_trade_history(engine='cross', progress=False)
+    assert bt.history_df.equals(cross.history_df)
@@ -0,0 +1,32 @@
+import json
+from finance_tools_py import benchmark
+
+
+def test_make_market():
+    data, buy_dict, sell_dict = benchmark.make_market(5, 20, seed=1)
+    assert 100 == len(data)
+    assert data['date'].is_monotonic_increasing
+    assert (data['high'] >= data[['open', 'close']].max(axis=1)).all()
+    assert (data['low'] <= data[['open', 'close']].min(axis=1)).all()
+    assert 5 == len(buy_dict) == len(sell_dict)
+    again, _, _ = benchmark.make_market(5, 20, seed=1)
+    assert data.equals(again)
+
+
+def test_run_benchmarks(tmpdir):
+    path = str(tmpdir.join('bench.json'))
+    report = benchmark.run_benchmarks(sizes=[(3, 30)], engines=['array', 'iterrows'], output=path)
+    with open(path, encoding='utf-8') as f:
+        assert report == json.load(f)
+    phases = {(r['engine'], r['phase']) for r in report['results']}
+    assert ('array', 'calc_trade_history') in phases
+    assert ('iterrows', 'report') in phases
+    assert all(r['peak_memory'] > 0 for r in report['results'] if r['seconds'] is not None)
+
+    slower = json.loads(json.dumps(report))
+    for r in slower['results']:
+        if r['seconds'] is not None:
+            r['seconds'] = r['seconds'] * 2
+    result = benchmark.compare(path, slower)
+    assert result['regression'].all()
+    assert not benchmark.compare(report, report)['regression'].any()
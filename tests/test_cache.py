@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+import pytest
+from finance_tools_py import cache
+from finance_tools_py.backtest import AHundredChecker
+from finance_tools_py.backtest import AllInChecker
+from finance_tools_py.backtest import BackTest
+from finance_tools_py.cache import fingerprint
+from finance_tools_py.cache import ResultCache
+
+
+def _run(data, buy_dict, sell_dict, cache=None, **kwargs):
+    bt = BackTest(data, callbacks=[AllInChecker(buy_dict, sell_dict)], **kwargs)
+    bt.calc_trade_history(progress=False, cache=cache)
+    return bt
+
+
+def test_cache_hit(tmpdir, market_data):
+    data, buy_dict, sell_dict = market_data
+    cache = ResultCache(str(tmpdir))
+    expected = _run(data, buy_dict, sell_dict)
+    first = _run(data, buy_dict, sell_dict, cache)
+    assert (0, 1) == (cache.hits, cache.misses)
+    assert 1 == len(cache.entries())
+    second = _run(data, buy_dict, sell_dict, cache)
+    assert (1, 1) == (cache.hits, cache.misses)
+    for bt in (first, second):
+        assert expected.report() == bt.report()
+        assert expected.history_df.equals(bt.history_df)
+        assert expected.cash == bt.cash
+        assert expected.snapshot().equals(bt.snapshot())
+    # 缓存目录也可以直接传入
+    assert expected.report() == _run(data, buy_dict, sell_dict, str(tmpdir)).report()
+
+
+def test_cache_key(market_data):
+    data, buy_dict, sell_dict = market_data
+    key = fingerprint(BackTest(data, callbacks=[AllInChecker(buy_dict, sell_dict)]), 'array')
+    assert key == fingerprint(BackTest(data.copy(), callbacks=[AllInChecker(dict(buy_dict), sell_dict)]), 'array')
+    assert key != fingerprint(BackTest(data, callbacks=[AllInChecker(buy_dict, sell_dict)]), 'iterrows')
+    assert key != fingerprint(BackTest(data, callbacks=[AHundredChecker(buy_dict, sell_dict)]), 'array')
+    assert key != fingerprint(BackTest(data, init_cash=20000, callbacks=[AllInChecker(buy_dict, sell_dict)]), 'array')
+    assert key != fingerprint(BackTest(data, callbacks=[AllInChecker(buy_dict, sell_dict, min_amount=200)]), 'array')
+    changed = data.copy()
+    changed.loc[changed.index[-1], 'volume'] += 1
+    assert key != fingerprint(BackTest(changed, callbacks=[AllInChecker(buy_dict, sell_dict)]), 'array')
+    codes = list(sell_dict)
+    fewer = dict(sell_dict, **{codes[0]: list(sell_dict[codes[0]])[1:]})
+    assert key != fingerprint(BackTest(data, callbacks=[AllInChecker(buy_dict, fewer)]), 'array')
+
+
+def _frame(codes):
+    return pd.DataFrame({'date': pd.to_datetime(['2005-01-03'] * len(codes)), 'code': codes, 'close': 1.0})
+
+
+def test_cache_key_codes():
+    dates = ['2005-01-03', '2005-01-04']
+    key = fingerprint(BackTest(_frame(['1']), callbacks=[AHundredChecker({'1': dates}, {})]), 'array')
+    assert key != fingerprint(BackTest(_frame(['1']), callbacks=[AHundredChecker({1: dates}, {})]), 'array')
+    assert key != fingerprint(BackTest(_frame([1]), callbacks=[AHundredChecker({'1': dates}, {})]), 'array')
+
+
+def _fixed_checker(amount):
+    namespace = {'AllInChecker': AllInChecker}
+    exec('class Fixed(AllInChecker):\n'
+         '    def on_calc_buy_amount(self, date, code, price, cash):\n'
+         '        return {}\n'.format(amount), namespace)
+    return namespace['Fixed']
+
+
+def test_cache_key_code(monkeypatch, market_data):
+    data, buy_dict, sell_dict = market_data
+    key = fingerprint(BackTest(data, callbacks=[_fixed_checker(100)(buy_dict, sell_dict)]), 'array')
+    assert key == fingerprint(BackTest(data, callbacks=[_fixed_checker(100)(buy_dict, sell_dict)]), 'array')
+    assert key != fingerprint(BackTest(data, callbacks=[_fixed_checker(200)(buy_dict, sell_dict)]), 'array')
+    monkeypatch.setattr(cache, '__version__', 'other')
+    assert key != fingerprint(BackTest(data, callbacks=[_fixed_checker(100)(buy_dict, sell_dict)]), 'array')
+
+
+def test_cache_key_unhashable(market_data):
+    data, buy_dict, sell_dict = market_data
+
+    class Filtered(AllInChecker):
+        def __init__(self, buy_dict, sell_dict, rule):
+            super().__init__(buy_dict, sell_dict)
+            self.rule = rule
+
+    assert fingerprint(BackTest(data, callbacks=[Filtered(buy_dict, sell_dict, 1.5)]), 'array')
+    assert fingerprint(BackTest(data, callbacks=[Filtered(buy_dict, sell_dict, lambda x: x)]), 'array') is None
+    assert fingerprint(BackTest(data, callbacks=[Filtered(buy_dict, sell_dict, object())]), 'array') is None
+
+
+def test_cache_bypass(tmpdir, market_data):
+    data, buy_dict, sell_dict = market_data
+    cache = ResultCache(str(tmpdir))
+    bt = BackTest(data, callbacks=[AllInChecker(buy_dict, sell_dict)])
+    events = []
+    bt.calc_trade_history(progress=False, sink=events, cache=cache)
+    assert events
+    assert 0 == len(cache.entries())
+
+    class Uncached(AllInChecker):
+        def cache_key(self):
+            return None
+
+    bt = BackTest(data, callbacks=[Uncached(buy_dict, sell_dict)])
+    bt.calc_trade_history(progress=False, cache=cache)
+    assert 0 == len(cache.entries())
+
+    class DuckTyped():
+        """没有派生自 CallBack 的回调。"""
+
+        def on_check_buy(self, date, code, price, cash):
+            return date in buy_dict.get(code, [])
+
+        def on_check_sell(self, date, code, price, cash, hold_amount, hold_price):
+            return date in sell_dict.get(code, [])
+
+        def on_calc_buy_amount(self, date, code, price, cash):
+            return 100
+
+        def on_calc_sell_amount(self, date, code, price, cash, hold_amount, hold_price):
+            return hold_amount
+
+    expected = BackTest(data, callbacks=[DuckTyped()])
+    expected.calc_trade_history(progress=False)
+    bt = BackTest(data, callbacks=[DuckTyped()])
+    bt.calc_trade_history(progress=False, cache=cache)
+    assert 0 == len(cache.entries())
+    assert len(expected.history) > 0
+    assert expected.history_df.equals(bt.history_df)
+
+
+def test_cache_evict(tmpdir, market_data):
+    data, buy_dict, sell_dict = market_data
+    cache = ResultCache(str(tmpdir), max_entries=2)
+    for init_cash in (10000, 20000, 30000):
+        _run(data, buy_dict, sell_dict, cache, init_cash=init_cash)
+    assert 2 == len(cache.entries())
+    _run(data, buy_dict, sell_dict, cache, init_cash=30000)
+    assert 1 == cache.hits
+    _run(data, buy_dict, sell_dict, cache, init_cash=10000)
+    assert 1 == cache.hits
+    cache.max_bytes = int(cache.entries()['size'].max())
+    cache.evict()
+    assert 1 == len(cache.entries())
+    cache.clear()
+    assert cache.entries().empty
+    assert np.isclose(_run(data, buy_dict, sell_dict, cache).total_assets_cur,
+                      _run(data, buy_dict, sell_dict).total_assets_cur)
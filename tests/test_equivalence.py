@@ -0,0 +1,72 @@
+from finance_tools_py import equivalence
+from finance_tools_py.backtest import PositionLedger
+
+
+def test_random_case():
+    assert equivalence.random_case(3) == equivalence.random_case(3)
+    assert equivalence.random_case(3) != equivalence.random_case(4)
+    for seed in range(20):
+        case = equivalence.random_case(seed)
+        assert case['checker'] in equivalence.CHECKERS
+        data, factory = equivalence.make_case(**case)
+        assert case['n_codes'] * case['n_days'] == len(data)
+        assert factory() is not factory()
+        assert isinstance(factory(reference=True), equivalence.ReferenceBackTest)
+
+
+def test_engines_same_as_baseline():
+    result = equivalence.run_cases(24, engines=['iterrows', 'array'])
+    assert 48 == len(result)
+    assert (result['trades'] > 0).any()
+    assert set(equivalence.CHECKERS) == set(result['checker'])
+    assert {'sorted', 'by_code', 'shuffled'} == set(result['order'])
+    assert result['ok'].all(), result.loc[~result['ok'], 'diff'].tolist()
+
+
+def test_array_engine_same_as_iterrows():
+    result = equivalence.run_cases(40, engines=['array', 'auto'], reference='iterrows')
+    assert 80 == len(result)
+    assert result['ok'].all(), result.loc[~result['ok'], 'diff'].tolist()
+
+
+def test_baseline_finds_changed_hold_price(monkeypatch):
+    # 两个引擎共用的持仓成本发生变化时，只有与最初版本对比才能发现
+    get = PositionLedger.get
+
+    def changed(self, code):
+        hold = get(self, code)
+        return None if hold is None else (round(hold[0], 1), hold[1])
+
+    monkeypatch.setattr(PositionLedger, 'get', changed)
+    case = dict(equivalence.random_case(0), checker='ahundred', order='sorted', signal_rate=0.3)
+    assert all(r['ok'] for r in equivalence.check_case(case, engines=['array'], reference='iterrows'))
+    assert not any(r['ok'] for r in equivalence.check_case(case, engines=['iterrows', 'array']))
+
+
+def test_diff_backtests():
+    case = dict(equivalence.random_case(0), checker='allin', init_cash=100000, signal_rate=0.3)
+    _, factory = equivalence.make_case(**case)
+    expected = factory()
+    expected.calc_trade_history(engine='iterrows', progress=False)
+    actual = factory()
+    actual.calc_trade_history(engine='array', progress=False)
+    assert [] == equivalence.diff_backtests(expected, actual)
+
+    actual.cash[-1] += 0.001
+    diffs = equivalence.diff_backtests(expected, actual)
+    assert 1 == len(diffs)
+    assert diffs[0].startswith('cash[')
+    assert [] == equivalence.diff_backtests(expected, actual, atol=0.005)
+
+    other = factory()
+    other.init_cash = 50000
+    other.cash = [50000]
+    other.calc_trade_history(engine='array', progress=False)
+    diffs = equivalence.diff_backtests(expected, other)
+    assert any(d.startswith('history_df') for d in diffs)
+    assert any(d.startswith('cash') for d in diffs)
+
+
+def test_main(capsys):
+    assert 0 == equivalence.main(['--cases', '3', '--engines', 'array'])
+    assert '0 mismatches' in capsys.readouterr().out
@@ -0,0 +1,60 @@
+import json
+from datetime import date as dt
+import logging
+from finance_tools_py import events
+from finance_tools_py.backtest import AHundredChecker
+from finance_tools_py.backtest import BackTest
+from finance_tools_py.benchmark import make_market
+
+
+def _backtest():
+    data, buy_dict, sell_dict = make_market(3, 40, signal_rate=0.2)
+    return BackTest(data, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+
+
+def test_list_sink():
+    bt = _backtest()
+    sink = events.ListSink()
+    bt.calc_trade_history(verbose=2, progress=False, sink=sink)
+    kinds = [e.kind for e in sink.events]
+    assert 'finish' == kinds[-1]
+    assert len(bt.history) == kinds.count('buy') + kinds.count('sell')
+    assert kinds.count('skip_sell') > 0
+    trades = [e for e in sink.events if e.kind in ('buy', 'sell')]
+    assert bt.history_df['cash'].tolist() == [e.cash for e in trades]
+    assert (len(sink.events), len(events.TradeEvent.FIELDS)) == sink.to_frame().shape
+
+    found = []
+    _backtest().calc_trade_history(progress=False, sink=found)  # 指定 sink 时 verbose 至少为 1
+    assert [e.kind for e in found] == [k for k in kinds if not k.startswith('skip_')]
+
+
+def test_message(capsys):
+    e = events.TradeEvent('buy', dt(2000, 1, 3), '000001', 10.0, 100, 8995.0, 5, 0)
+    assert '2000-01-03 000001 买入 10.00/100.00，剩余资金 8995.00' == str(e)
+    assert '计算完成！' == events.TradeEvent('finish').message()
+    _backtest().calc_trade_history(verbose=1, progress=False)
+    lines = capsys.readouterr().out.splitlines()
+    assert '计算完成！' == lines[-1]
+    assert all('剩余资金' in line for line in lines[:-1])
+
+
+def test_logger_sink(caplog):
+    logger = logging.getLogger('test_events')
+    with caplog.at_level(logging.INFO, 'test_events'):
+        _backtest().calc_trade_history(verbose=2, progress=False, sink=logger)
+    messages = [r.getMessage() for r in caplog.records]
+    assert '计算完成！' == messages[-1]
+    assert not any('跳过' in m for m in messages)  # 跳过事件默认为 DEBUG 级别
+
+
+def test_json_lines_sink(tmpdir):
+    path = str(tmpdir.join('trades.jsonl'))
+    bt = _backtest()
+    with events.JsonLinesSink(path) as sink:
+        bt.calc_trade_history(progress=False, sink=sink)
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert len(bt.history) + 1 == len(records)
+    assert records[0]['kind'] in ('buy', 'sell')
+    assert str(bt.history_df['datetime'].iloc[0].date()) == records[0]['date'][:10]
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from finance_tools_py import market
+from finance_tools_py.backtest import AHundredChecker
+from finance_tools_py.backtest import BackTest
+
+
+def _expected(data, buy_dict, sell_dict):
+    bt = BackTest(data, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history(progress=False)
+    return bt
+
+
+def test_dict_of_arrays(market_data):
+    data, buy_dict, sell_dict = market_data
+    arrays = {col: data[col].to_numpy() for col in ['date', 'code', 'close']}
+    bt = BackTest(arrays, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    assert np.shares_memory(bt.data['close'].values, arrays['close'])
+    assert np.shares_memory(bt.data['date'].values, arrays['date'])
+    assert 'category' == bt.data['code'].dtype.name
+    bt.calc_trade_history(progress=False)
+    expected = _expected(data, buy_dict, sell_dict)
+    assert expected.report() == bt.report()
+    assert expected.history_df.equals(bt.history_df)
+
+
+def test_structured_array(market_data):
+    data, buy_dict, sell_dict = market_data
+    records = np.zeros(len(data), dtype=[('date', 'M8[ns]'), ('code', 'U6'), ('close', 'f8'), ('volume', 'i8')])
+    for col in records.dtype.names:
+        records[col] = data[col].to_numpy()
+    frame = market.to_frame(records, columns=['date', 'code', 'close'])
+    assert ['date', 'code', 'close'] == frame.columns.tolist()
+    assert np.shares_memory(frame['close'].values, records)
+    bt = BackTest(records, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history(progress=False)
+    assert _expected(data, buy_dict, sell_dict).history_df.equals(bt.history_df)
+    with pytest.raises(KeyError):
+        market.to_frame(records, col_name='open')
+    with pytest.raises(TypeError):
+        market.to_frame([1, 2, 3])
+
+
+def test_arrow_table(market_data):
+    pa = pytest.importorskip('pyarrow')
+    data, buy_dict, sell_dict = market_data
+    table = pa.table({'date': pa.array(data['date'].to_numpy()),
+                      'code': pa.array(data['code'].tolist()).dictionary_encode(),
+                      'close': pa.array(data['close'].to_numpy()),
+                      'volume': pa.array(data['volume'].to_numpy())})
+    frame = market.to_frame(table)
+    assert np.shares_memory(frame['close'].values, table.column('close').chunk(0).to_numpy())
+    assert list(table.column('code').chunk(0).dictionary.to_pylist()) == frame['code'].cat.categories.tolist()
+    bt = BackTest(table, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history(progress=False)
+    assert _expected(data, buy_dict, sell_dict).history_df.equals(bt.history_df)
+    plain = pa.table({'date': pa.array(data['date'].dt.date.tolist()),
+                      'code': pa.array(data['code'].tolist()),
+                      'close': pa.array(data['close'].to_numpy())})
+    assert 'datetime64[ns]' == str(market.to_frame(plain)['date'].dtype)
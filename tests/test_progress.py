@@ -0,0 +1,56 @@
+import logging
+import pytest
+from finance_tools_py import progress
+from finance_tools_py.backtest import AHundredChecker
+from finance_tools_py.backtest import BackTest
+from finance_tools_py.benchmark import make_market
+
+
+class RecordProgress(progress.Progress):
+    step = 7
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.reports = []
+
+    def _report(self):
+        self.reports.append(self.done)
+
+
+def test_get_progress(monkeypatch):
+    assert isinstance(progress.get_progress(False), progress.NullProgress)
+    assert isinstance(progress.get_progress('logging'), progress.LoggingProgress)
+    assert isinstance(progress.get_progress(True), progress.TqdmProgress)
+    p = RecordProgress()
+    assert p is progress.get_progress(p)
+    monkeypatch.setattr(progress, 'is_interactive', lambda: False)
+    assert isinstance(progress.get_progress(), progress.NullProgress)
+    with pytest.raises(ValueError):
+        progress.get_progress('unknown')
+
+
+def test_throttle():
+    p = RecordProgress(min_interval=None, min_rows=10)
+    p.start(25)
+    for _ in range(25):
+        p.update(1)
+    p.close()
+    assert [10, 20, 25] == p.reports
+
+
+@pytest.mark.parametrize('engine', ['array', 'iterrows'])
+def test_backtest_progress(engine):
+    data, buy_dict, sell_dict = make_market(3, 20)
+    p = RecordProgress(min_interval=None, min_rows=1)
+    bt = BackTest(data, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history(engine=engine, progress=p)
+    assert len(data) == p.done == p.reports[-1]
+    assert p.reports == sorted(p.reports)
+
+
+def test_logging_progress(caplog):
+    data, buy_dict, sell_dict = make_market(3, 20)
+    p = progress.LoggingProgress(logging.getLogger('test_progress'), min_interval=None)
+    with caplog.at_level(logging.INFO, 'test_progress'):
+        BackTest(data, callbacks=[AHundredChecker(buy_dict, sell_dict)]).calc_trade_history(progress=p)
+    assert ['backtest: 60/60 rows (100.0%)'] == [r.getMessage().rsplit(',', 1)[0] for r in caplog.records]
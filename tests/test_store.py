@@ -0,0 +1,157 @@
+import importlib
+import pickle
+import sys
+import types
+from functools import partial
+import numpy as np
+import pandas as pd
+import pytest
+import finance_tools_py
+from finance_tools_py.backtest import AHundredChecker
+from finance_tools_py.backtest import BackTest
+from finance_tools_py.benchmark import make_market
+from finance_tools_py.store import PriceStore
+from finance_tools_py.sweep import sweep
+
+
+def test_write_and_read(tmpdir, market_data):
+    data, buy_dict, sell_dict = market_data
+    store = PriceStore.write(str(tmpdir), data)
+    assert data.columns.tolist() == list(store)
+    assert isinstance(store['close'], np.memmap)
+    assert not store['close'].flags.writeable
+    frame = store.frame()
+    assert np.shares_memory(frame['close'].values, store['close'])
+    assert np.shares_memory(frame['code'].values.codes, store._load('code'))
+    assert data['code'].tolist() == frame['code'].tolist()
+    assert data['date'].tolist() == frame['date'].tolist()
+    assert data['volume'].tolist() == frame['volume'].tolist()
+    with pytest.raises(KeyError):
+        store['open_interest']
+    with pytest.raises(TypeError):
+        PriceStore.write(str(tmpdir.join('bad')), data.assign(name='x'))
+
+    other = pickle.loads(pickle.dumps(store))
+    assert store.path == other.path
+    assert frame.equals(other.frame())
+
+
+def test_backtest(tmpdir, market_data):
+    data, buy_dict, sell_dict = market_data
+    store = PriceStore.write(str(tmpdir), data)
+    bt = BackTest(store, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    assert np.shares_memory(bt.data['close'].values, store['close'])
+    bt.calc_trade_history(progress=False)
+    expected = BackTest(data, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    expected.calc_trade_history(progress=False)
+    assert expected.report() == bt.report()
+    assert expected.history_df.equals(bt.history_df)
+
+
+def test_code_frame(tmpdir, market_data):
+    data, buy_dict, sell_dict = market_data
+    store = PriceStore.write(str(tmpdir), data)
+    code = data['code'].iloc[-1]
+    expected = data[(data['code'] == code) & (data['date'] >= '2005-02-01') & (data['date'] <= '2005-02-10')]
+    frame = store.code_frame(code, start='2005-02-01', end='2005-02-10')
+    pd.testing.assert_frame_equal(expected.reset_index(drop=True), frame)
+    assert len(data[data['code'] == code]) == len(store.code_frame(code))
+    assert ['date', 'close'] == store.code_frame(code, columns=['date', 'close']).columns.tolist()
+    assert store.code_frame('999999').empty
+
+
+def test_sweep(tmpdir, market_data):
+    data, buy_dict, sell_dict = market_data
+    store = PriceStore.write(str(tmpdir), data)
+    grid = {'init_cash': [10000, 50000], 'min_amount': [100, 200]}
+    factory = partial(AHundredChecker, buy_dict, sell_dict)
+    expected = sweep(data, grid, factory, max_workers=1)
+    pd.testing.assert_frame_equal(expected, sweep(store, grid, factory, max_workers=1))
+    pd.testing.assert_frame_equal(expected, sweep(store, grid, factory, max_workers=2))
+
+
+def test_int_codes(tmpdir, market_data):
+    data, buy_dict, sell_dict = market_data
+    data = data.assign(code=data['code'].astype(int))
+    buy_dict = {int(k): v for k, v in buy_dict.items()}
+    sell_dict = {int(k): v for k, v in sell_dict.items()}
+    store = PriceStore.write(str(tmpdir), data)
+    assert data['code'].unique().tolist() == store.codes.tolist()
+    assert 'i' == store.codes.dtype.kind
+    assert data['code'].tolist() == store.frame()['code'].tolist()
+    code = data['code'].iloc[-1]
+    pd.testing.assert_frame_equal(data[data['code'] == code].reset_index(drop=True), store.code_frame(code))
+    assert store.code_frame(str(code)).empty
+    bt = BackTest(store, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    bt.calc_trade_history(progress=False)
+    expected = BackTest(data, callbacks=[AHundredChecker(buy_dict, sell_dict)])
+    expected.calc_trade_history(progress=False)
+    assert len(expected.history) > 0
+    assert expected.history_df.equals(bt.history_df)
+    with pytest.raises(TypeError):
+        PriceStore.write(str(tmpdir.join('mixed')), data.assign(code=[1, '2'] * (len(data) // 2)))
+
+
+def _stub(monkeypatch, name, **attrs):
+    """缺少依赖时使用只包含指定属性的模块代替。"""
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        monkeypatch.setitem(sys.modules, name, module)
+        return module
+
+
+def _bbands(values, timeperiod, nbdevup, nbdevdn):
+    rolling = pd.Series(values).rolling(timeperiod)
+    mean, std = rolling.mean().values, rolling.std(ddof=0).values
+    return mean + std * nbdevup, mean, mean - std * nbdevdn
+
+
+def _linearreg_angle(series, timeperiod):
+    x = np.arange(timeperiod)
+    slope = series.rolling(timeperiod).apply(lambda y: np.polyfit(x, y, 1)[0], raw=True)
+    return np.degrees(np.arctan(slope))
+
+
+def test_simulation(tmpdir, monkeypatch):
+    data, _, _ = make_market(2, 400, signal_rate=0)
+    store = PriceStore.write(str(tmpdir), data)
+    _stub(monkeypatch, 'QUANTAXIS')
+    _stub(monkeypatch, 'seaborn')
+    _stub(monkeypatch, 'talib', BBANDS=_bbands, LINEARREG_ANGLE=_linearreg_angle)
+    pyplot = _stub(monkeypatch, 'matplotlib.pyplot', axes=object)
+    if pyplot is not None:
+        _stub(monkeypatch, 'matplotlib', pyplot=pyplot)
+    # 使用替代模块导入的 simulation 只在这个测试中使用：记录原来的状态，测试结束后恢复（原来没有导入时删除）
+    monkeypatch.setitem(sys.modules, 'finance_tools_py.simulation', None)
+    monkeypatch.setattr(finance_tools_py, 'simulation', None, raising=False)
+    del sys.modules['finance_tools_py.simulation']
+    simulation = importlib.import_module('finance_tools_py.simulation')
+
+    frames = []
+
+    class Record(simulation.CallBack):
+        def on_preparing_data(self, symbol, data, context):
+            frames.append(data.copy())
+
+    code = data['code'].iloc[-1]
+    sim = simulation.Simulation(store)
+    callbacks = [Record(),
+                 simulation.CallBack_Bolling(30, 2.6, 2.6, 0.3, 0.3),
+                 simulation.CallBack_Pandas_Rolling(30, 250),
+                 simulation.CallBack_Linear_Angle('MEAN', [30, 10, 5]),
+                 simulation.CallBack_CalcTradePoint()]
+    sim.simulate(code, start='2005-03-01', end='2006-03-01', callbacks=callbacks)
+    frame = frames[0]
+    assert ['date', 'code'] == frame.index.names
+    assert ['open', 'high', 'low', 'close', 'volume'] == frame.columns.tolist()
+    expected = data[(data['code'] == code) & (data['date'] >= '2005-03-01') & (data['date'] <= '2006-03-01')]
+    assert expected.set_index(['date', 'code']).equals(frame)
+    signals = sim.signaldf
+    assert not signals.empty
+    assert {code} == set(signals['code'])
+    assert set(signals['opt']) <= {1, 2}
+    is_buy, date = sim.lastest_signal
+    assert date == signals['date'].max()
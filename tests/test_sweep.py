@@ -0,0 +1,50 @@
+import os
+import pickle
+from datetime import date as dt
+from functools import partial
+import pandas as pd
+from finance_tools_py.backtest import AllInChecker
+from finance_tools_py.sweep import expand_grid
+from finance_tools_py.sweep import SharedFrame
+from finance_tools_py.sweep import sweep
+
+data = pd.DataFrame({
+    'code': ['000001' for x in range(4)] + ['000002' for x in range(4)],
+    'date': [dt(1998, 1, 1), dt(1999, 1, 1), dt(2000, 1, 1), dt(2001, 1, 1)] * 2,
+    'close': [4.5, 7.9, 6.7, 10, 41.5, 71.9, 61.7, 131.4],
+})
+buy_dict = {'000001': [dt(1998, 1, 1), dt(2000, 1, 1)], '000002': [dt(1999, 1, 1)]}
+sell_dict = {'000001': [dt(1999, 1, 1)], '000002': [dt(2001, 1, 1)]}
+
+
+def test_expand_grid():
+    assert [{'a': 1, 'b': 3}, {'a': 1, 'b': 4}, {'a': 2, 'b': 3}, {'a': 2, 'b': 4}, {'a': 5}] == expand_grid(
+        [{'a': [1, 2], 'b': [3, 4]}, {'a': [5]}])
+
+
+def test_shared_frame():
+    shared = SharedFrame(data)
+    try:
+        frame = shared.frame()
+        assert data['date'].tolist() == frame['date'].tolist()
+        assert data['code'].tolist() == frame['code'].tolist()
+        assert data['close'].tolist() == frame['close'].tolist()
+        other = pickle.loads(pickle.dumps(shared))
+        pd.testing.assert_frame_equal(frame, other.frame())
+        other.close()
+        assert os.path.isdir(shared.path)
+    finally:
+        shared.close()
+    assert not os.path.exists(shared.path)
+
+
+def test_sweep():
+    grid = {'init_cash': [5000, 20000], 'min_commission': [0, 5], 'min_amount': [100, 200]}
+    factory = partial(AllInChecker, buy_dict, sell_dict)
+    serial = sweep(data, grid, factory, max_workers=1)
+    assert 8 == len(serial)
+    assert ['init_cash', 'min_commission', 'min_amount', 'total_assets', 'cash', 'trades', 'commission',
+            'tax'] == serial.columns.tolist()
+    assert (serial['trades'] > 0).all()
+    parallel = sweep(data, grid, factory, max_workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)